@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define utilities to maintain and query a cube of aggregated trips."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import json
+import numbers
+import os
+from typing import Any, Dict, List, Optional
+
+import duckdb
+import pandas as pd
+
+import trip_dedup as tdd
+
+# cube dimensions, and how they are derived from processed trips, for trips
+# counted as departures from, and arrivals at, a station
+CUBE_DIMS_SQL = {
+    "station_id": {
+        "departures": "start_station_id",
+        "arrivals": "end_station_id",
+    },
+    "year": "YEAR(started_at)",
+    "month": "MONTH(started_at)",
+    "day_of_week": "ISODOW(started_at)-1",
+    "hour": "HOUR(started_at)",
+    "user_type": "user_type",
+}
+CUBE_MANIFEST_FNAME = "cube__manifest.json"
+
+
+def get_cube_dims_sql(direction: str) -> str:
+    """Get SQL to derive every cube dimension from processed trips."""
+    dims = ",\n".join(
+        f"{(sql[direction] if isinstance(sql, dict) else sql)} AS {dim}"
+        for dim, sql in CUBE_DIMS_SQL.items()
+    )
+    return dims
+
+
+def get_cube_select_sql(
+    source: str, direction: str, count_sql: str = "COUNT(DISTINCT(trip_id))"
+) -> str:
+    """Get SQL to count trips in a source by every cube dimension."""
+    dims = get_cube_dims_sql(direction)
+    station_col = CUBE_DIMS_SQL["station_id"][direction]
+    query = f"""
+            SELECT '{direction}' AS direction,
+                   {dims},
+                   {count_sql} AS trips
+            FROM {source}
+            WHERE {station_col} IS NOT NULL
+            GROUP BY ALL
+            """  # nosec
+    return query
+
+
+def get_partition_fpath(cube_dir: str, fpath: str) -> str:
+    """Get filepath to cube partition built from single processed file."""
+    fname = os.path.basename(fpath).split(".")[0]
+    return os.path.join(cube_dir, f"cube__{fname}.parquet")
+
+
+def get_file_fingerprint(fpath: str) -> Dict[str, int]:
+    """Get size and modification time of file."""
+    stat = os.stat(fpath)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_cube_manifest(cube_dir: str) -> Dict[str, Dict]:
+    """Load source file fingerprints of every partition in the cube."""
+    fpath = os.path.join(cube_dir, CUBE_MANIFEST_FNAME)
+    if not os.path.exists(fpath):
+        return {}
+    with open(fpath) as f:
+        return json.load(f)
+
+
+def build_cube_partition(fpath: str, cube_dir: str) -> str:
+    """Aggregate single processed file into a cube partition."""
+    source = f"read_parquet('{fpath}')"
+    count_sql = tdd.get_trips_count_sql([fpath])
+    query = "\nUNION ALL\n".join(
+        get_cube_select_sql(source, direction, count_sql)
+        for direction in ["departures", "arrivals"]
+    )
+    fpath_partition = get_partition_fpath(cube_dir, fpath)
+    duckdb.sql(
+        f"COPY ({query}) TO '{fpath_partition}' (FORMAT PARQUET)"
+    )  # nosec
+    return fpath_partition
+
+
+def update_aggregate_cube(
+    fpaths: List[str], cube_dir: str, verbose: bool = False
+) -> List[str]:
+    """Update cube partitions of new or changed processed files.
+
+    Parameters
+    ----------
+    fpaths: List[str]
+        filepaths to processed trips, one cube partition per file
+    cube_dir: str
+        directory in which cube partitions and manifest are stored
+    verbose: bool
+        whether to show the number of (re-)computed partitions
+
+    Returns
+    -------
+    List[str]
+        processed files whose partitions were (re-)computed
+    """
+    manifest = load_cube_manifest(cube_dir)
+    fingerprints = {
+        os.path.abspath(f): get_file_fingerprint(f) for f in fpaths
+    }
+    updated = []
+    for f, fingerprint in fingerprints.items():
+        if manifest.get(f) != fingerprint:
+            build_cube_partition(f, cube_dir)
+            updated.append(f)
+    # drop partitions whose processed file no longer exists
+    for f in set(manifest) - set(fingerprints):
+        fpath_partition = get_partition_fpath(cube_dir, f)
+        if os.path.exists(fpath_partition):
+            os.remove(fpath_partition)
+    with open(os.path.join(cube_dir, CUBE_MANIFEST_FNAME), "w") as fm:
+        json.dump(fingerprints, fm, indent=2)
+    if verbose:
+        print(
+            f"Updated {len(updated):,} of {len(fingerprints):,} cube "
+            f"partitions in {os.path.abspath(cube_dir)}"
+        )
+    return updated
+
+
+def get_cube_fpaths(cube_dir: str) -> List[str]:
+    """Get filepaths to all cube partitions."""
+    manifest = load_cube_manifest(cube_dir)
+    return [get_partition_fpath(cube_dir, f) for f in sorted(manifest)]
+
+
+def get_literal_sql(value: Any) -> str:
+    """Get SQL literal of number or string (eg. a NumPy or pandas scalar)."""
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    if isinstance(value, numbers.Real):
+        return repr(float(value))
+    escaped = str(value).replace("'", "''")
+    return f"'{escaped}'"
+
+
+def get_where_sql(filters: Dict[str, List]) -> str:
+    """Get SQL WHERE clause to select values of cube dimensions."""
+    conditions = [
+        f"{dim} IN ({', '.join(get_literal_sql(v) for v in values)})"
+        for dim, values in filters.items()
+        if values is not None
+    ]
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+
+def query_aggregate_cube(
+    cube_dir: str, by: List[str], filters: Dict[str, List] = {}
+) -> pd.DataFrame:
+    """Get departures and arrivals grouped by one or more dimensions.
+
+    Parameters
+    ----------
+    cube_dir: str
+        directory in which cube partitions are stored
+    by: List[str]
+        dimensions to group trips by
+    filters: Dict[str, List]
+        values of dimensions to be selected (eg. day_of_week=[5, 6])
+
+    Returns
+    -------
+    pd.DataFrame
+        total departures and arrivals, per combination of the dimensions
+    """
+    group_by = ", ".join(by)
+    query = f"""
+            SELECT {group_by},
+                   SUM(trips) FILTER (direction = 'departures') AS departures,
+                   SUM(trips) FILTER (direction = 'arrivals') AS arrivals
+            FROM read_parquet({get_cube_fpaths(cube_dir)})
+            {get_where_sql(filters)}
+            GROUP BY {group_by}
+            ORDER BY {group_by}
+            """  # nosec
+    df = (
+        duckdb.sql(query)
+        .df()
+        .fillna({"departures": 0, "arrivals": 0})
+        .astype({"departures": "int64", "arrivals": "int64"})
+    )
+    return df
+
+
+def query_trips_like_cube(
+    fpaths: List[str], by: List[str], filters: Dict[str, List] = {}
+) -> pd.DataFrame:
+    """Get departures and arrivals, by dimensions, from processed trips."""
+    group_by = ", ".join(by)
+    queries = []
+    for direction in ["departures", "arrivals"]:
+        dims = get_cube_dims_sql(direction)
+        station_col = CUBE_DIMS_SQL["station_id"][direction]
+        queries.append(
+            f"""
+            SELECT {group_by},
+                   COUNT(DISTINCT(trip_id)) AS {direction}
+            FROM (
+                SELECT trip_id,
+                       {dims}
+                FROM read_parquet({fpaths})
+                WHERE {station_col} IS NOT NULL
+            )
+            {get_where_sql(filters)}
+            GROUP BY {group_by}
+            """  # nosec
+        )
+    query = f"""
+            SELECT *
+            FROM ({queries[0]})
+            FULL OUTER JOIN ({queries[1]}) USING ({group_by})
+            ORDER BY {group_by}
+            """  # nosec
+    df = (
+        duckdb.sql(query)
+        .df()
+        .fillna({"departures": 0, "arrivals": 0})
+        .astype({"departures": "int64", "arrivals": "int64"})
+    )
+    return df
+
+
+def check_aggregate_cube(
+    cube_dir: str,
+    fpaths: List[str],
+    by: List[str] = ["station_id"],
+    filters: Dict[str, List] = {},
+) -> pd.DataFrame:
+    """Get groups whose cube totals differ from totals in processed trips."""
+    df = query_aggregate_cube(cube_dir, by, filters).merge(
+        query_trips_like_cube(fpaths, by, filters),
+        on=by,
+        how="outer",
+        suffixes=("_cube", "_trips"),
+        indicator=True,
+    )
+    df_mismatch = df.loc[
+        (df["_merge"] != "both")
+        | (df["departures_cube"] != df["departures_trips"])
+        | (df["arrivals_cube"] != df["arrivals_trips"])
+    ]
+    print(
+        f"Found {len(df_mismatch):,} of {len(df):,} groups with totals that "
+        "do not match processed trips"
+    )
+    return df_mismatch
+
+
+def get_station_trips_by_period(
+    cube_dir: str,
+    last_year: int,
+    years: List[int],
+    days_of_week: Optional[List[int]] = None,
+) -> pd.DataFrame:
+    """Get station departures and arrivals in last year and last N years.
+
+    Parameters
+    ----------
+    cube_dir: str
+        directory in which cube partitions are stored
+    last_year: int
+        most recent full year (eg. 2022)
+    years: List[int]
+        N most recent full years (eg. 2018 to 2022)
+    days_of_week: Optional[List[int]]
+        days of week (Monday=0, Sunday=6) to select, or all days if None
+
+    Returns
+    -------
+    pd.DataFrame
+        departures and arrivals (during last year and last N years) per
+        station, as used to rank stations in 04_get_top_stations
+    """
+    filters = {"day_of_week": days_of_week}
+    df_last_year, df_last_n_years = [
+        query_aggregate_cube(
+            cube_dir, ["station_id"], {"year": year_list, **filters}
+        ).rename(
+            columns={
+                "departures": f"departures_{suffix}",
+                "arrivals": f"arrivals_{suffix}",
+            }
+        )
+        for year_list, suffix in zip(
+            [[last_year], years], ["last_year", "last_n_years"]
+        )
+    ]
+    df = df_last_n_years.merge(df_last_year, on="station_id", how="left")
+    df = df.fillna(0).astype({c: "int64" for c in df.columns})
+    return df
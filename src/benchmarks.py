@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define a suite of benchmarks of the stages of the trips pipeline."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import argparse
+import contextlib
+import gc
+import io
+import os
+import platform
+import subprocess  # nosec
+import tempfile
+import tracemalloc
+from glob import glob
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import duckdb
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from contexttimer import Timer
+
+import clean as cl
+import etl
+import file_utils as flut
+import geopandas_helpers as gpu
+import instrumentation as instr
+import read
+import synthetic_trips as st
+import trip_datetimes as tdt
+import trips_layout as tl
+
+# raw trips file (year, and quarter or month) of every layout era of raw
+# trips files (see etl.ETL_MEMORY_PER_CSV_BYTE), of which files of 2021 and
+# 2023 have a header starting with a byte-order mark
+BENCHMARK_ERAS = {
+    "2018": (2018, 1),
+    "2019": (2019, 1),
+    "2020": (2020, 1),
+    "2020-10": (2020, 10),
+    "2021": (2021, 2),
+    "2022": (2022, 1),
+    "2023": (2023, 1),
+}
+# bounding box (min. longitude, min. latitude, max. longitude, max.
+# latitude) of Toronto, covered by a grid of synthetic neighbourhoods
+TORONTO_BOUNDS = (-79.64, 43.58, -79.11, 43.86)
+NEIGHBOURHOODS_PER_SIDE = 12
+# seconds between samples of resident memory while a benchmark is run
+RSS_SAMPLE_SECONDS = 0.005
+BENCHMARKS_PREFIX = "benchmarks"
+RESULTS_DIR = os.path.join("reports", "benchmarks")
+
+
+def get_neighbourhoods(
+    bounds: Tuple[float, float, float, float] = TORONTO_BOUNDS,
+    n_side: int = NEIGHBOURHOODS_PER_SIDE,
+) -> gpd.GeoDataFrame:
+    """Get grid of synthetic neighbourhood polygons covering a bounding box."""
+    xs = np.linspace(bounds[0], bounds[2], n_side + 1)
+    ys = np.linspace(bounds[1], bounds[3], n_side + 1)
+    x0, y0 = [a.ravel() for a in np.meshgrid(xs[:-1], ys[:-1])]
+    x1, y1 = [a.ravel() for a in np.meshgrid(xs[1:], ys[1:])]
+    gdf = gpd.GeoDataFrame(
+        {"AREA_NAME": [f"Neighbourhood {k}" for k in range(len(x0))]},
+        geometry=shapely.box(x0, y0, x1, y1),
+        crs=4326,
+    )
+    return gdf
+
+
+def get_stations(
+    n_stations: int,
+    bounds: Tuple[float, float, float, float] = TORONTO_BOUNDS,
+    seed: int = 42,
+) -> pd.DataFrame:
+    """Get synthetic stations at random locations within a bounding box."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "station_id": np.arange(n_stations),
+            "lat": rng.uniform(bounds[1], bounds[3], n_stations),
+            "lon": rng.uniform(bounds[0], bounds[2], n_stations),
+        }
+    )
+    return df
+
+
+def get_benchmark_data(
+    data_dir: str, scale: float = 1.0, seed: int = 42
+) -> Dict[str, Any]:
+    """Get inputs of benchmarks, from synthetic raw trips of every era.
+
+    Parameters
+    ----------
+    data_dir: str
+        directory to which synthetic raw trips files and processed trips
+        are written
+    scale: float
+        number of synthetic trips as a multiple of the approximate number of
+        trips per year (see synthetic_trips)
+    seed: int
+        seed of the random number generator of synthetic data
+
+    Returns
+    -------
+    Dict[str, Any]
+        filepaths to raw trips files, raw trips (with station names), and
+        processed trips, by layout era, as well as queries of processed
+        trips (with a filter on the busiest start station), synthetic
+        neighbourhoods and directory to which benchmarks export data
+    """
+    raw_dir, proc_dir, export_dir = [
+        os.path.join(data_dir, d) for d in ["raw", "processed", "export"]
+    ]
+    for d in [proc_dir, export_dir]:
+        os.makedirs(d, exist_ok=True)
+    raw_fpaths = {
+        era: st.write_synthetic_trips(
+            raw_dir, [year], [period], scale=scale, seed=seed
+        )[0]
+        for era, (year, period) in BENCHMARK_ERAS.items()
+    }
+    raw_trips = {
+        era: read.read_csv_file(*read.get_read_csv_inputs(f))
+        for era, f in raw_fpaths.items()
+    }
+    proc_fpaths = {
+        era: etl.run_trips_etl_pipeline(
+            f, proc_dir, ["trip_duration"], export_raw=False
+        )["proc_fpath"]
+        for era, f in raw_fpaths.items()
+    }
+    query_station = f"""
+            SELECT start_station_id
+            FROM read_parquet({list(proc_fpaths.values())})
+            GROUP BY ALL
+            ORDER BY COUNT(*) DESC
+            LIMIT 1
+            """  # nosec
+    station_id = duckdb.sql(query_station).fetchone()[0]
+    year, month = BENCHMARK_ERAS["2022"]
+    data = {
+        "raw_fpaths": raw_fpaths,
+        "raw_trips": raw_trips,
+        "proc_fpaths": proc_fpaths,
+        "proc_trips": {
+            era: pd.read_parquet(f) for era, f in proc_fpaths.items()
+        },
+        "queries": {
+            name: query.format(
+                station_id=station_id,
+                month_filter=tdt.get_period_filter_sql([year], [month]),
+            )
+            for name, query in tl.BENCHMARK_QUERIES.items()
+        },
+        "neighbourhoods": get_neighbourhoods(),
+        "export_dir": export_dir,
+    }
+    return data
+
+
+def bench_read_csv_file(data: Dict[str, Any], era: str) -> int:
+    """Read raw trips file of a layout era."""
+    fpath = data["raw_fpaths"][era]
+    return len(read.read_csv_file(*read.get_read_csv_inputs(fpath)))
+
+
+def bench_clean_station_names(data: Dict[str, Any], era: str) -> int:
+    """Clean start and end station names of raw trips of a layout era."""
+    df = data["raw_trips"][era]
+    columns = [
+        c for c in df if c.lower().replace(" ", "_").endswith("station_name")
+    ]
+    df = df[columns].copy()
+    return len(cl.clean_status_station_names(df, columns))
+
+
+def bench_neighbourhood_join(data: Dict[str, Any], n_stations: int) -> int:
+    """Add name of neighbourhood containing stations to stations."""
+    df = get_stations(n_stations).assign(row_id=lambda df: range(len(df)))
+    with contextlib.redirect_stdout(io.StringIO()):
+        gpu.get_data_with_neighbourhood(
+            data["neighbourhoods"],
+            df,
+            "lat",
+            "lon",
+            "row_id",
+            ["row_id", "AREA_NAME", "geometry"],
+            "AREA_NAME",
+        )
+    return n_stations
+
+
+def bench_load(data: Dict[str, Any], era: str) -> int:
+    """Export processed trips of a layout era to a Parquet file."""
+    df = data["proc_trips"][era]
+    os.remove(flut.load(df, data["export_dir"], "processed__trips"))
+    return len(df)
+
+
+def bench_duckdb_query(data: Dict[str, Any], name: str) -> int:
+    """Run query of processed trips of all layout eras with DuckDB."""
+    fpaths = list(data["proc_fpaths"].values())
+    query = f"""
+            WITH trips AS (SELECT * FROM read_parquet({fpaths}))
+            {data["queries"][name]}
+            """  # nosec
+    duckdb.sql(query).fetchall()
+    return sum(len(df) for df in data["proc_trips"].values())
+
+
+# benchmarks, as (function taking the inputs of benchmarks and a parameter,
+# which returns the number of rows processed, and the parameters with which
+# the function is benchmarked)
+BENCHMARKS = {
+    "read_csv_file": (bench_read_csv_file, list(BENCHMARK_ERAS)),
+    "clean_station_names": (bench_clean_station_names, list(BENCHMARK_ERAS)),
+    "neighbourhood_join": (bench_neighbourhood_join, [1_000, 100_000]),
+    "load": (bench_load, list(BENCHMARK_ERAS)),
+    "duckdb_query": (bench_duckdb_query, list(tl.BENCHMARK_QUERIES)),
+}
+
+
+def get_peak_memory(fn: Callable[[], Any]) -> Tuple[int, int]:
+    """Get peak memory used while running a function.
+
+    Returns the peak memory (in bytes) allocated by Python (and NumPy), as
+    traced by tracemalloc, and the peak increase in resident memory, which
+    is sampled from a separate thread and includes memory allocated by
+    Arrow and DuckDB that is not traced.
+    """
+    with instr.sample_peak_rss(RSS_SAMPLE_SECONDS) as rss, instr.tracing():
+        tracemalloc.reset_peak()
+        try:
+            fn()
+        finally:
+            _, peak_traced = tracemalloc.get_traced_memory()
+    return peak_traced, rss["peak"] - rss["start"]
+
+
+def run_benchmarks(
+    data: Dict[str, Any],
+    names: Optional[List[str]] = None,
+    repeats: int = 3,
+    benchmarks: Dict[str, Tuple[Callable, List[Any]]] = BENCHMARKS,
+) -> pd.DataFrame:
+    """Run benchmarks with every one of their parameters.
+
+    Parameters
+    ----------
+    data: Dict[str, Any]
+        inputs of benchmarks (see get_benchmark_data)
+    names: Optional[List[str]]
+        names of benchmarks to be run, or all benchmarks if None
+    repeats: int
+        number of timed runs of every benchmark and parameter (the fastest
+        run is reported)
+    benchmarks: Dict[str, Tuple[Callable, List[Any]]]
+        benchmark functions and their parameters, by name
+
+    Returns
+    -------
+    pd.DataFrame
+        rows processed, seconds, throughput (rows per second) and peak
+        memory (see get_peak_memory) of every benchmark and parameter
+
+    Notes
+    -----
+    Peak memory is measured in a separate (untimed) run, since tracing
+    memory allocations slows down the benchmarked function.
+    """
+    records = []
+    for name, (fn, params) in benchmarks.items():
+        if names and name not in names:
+            continue
+        for param in params:
+            seconds = []
+            for _ in range(repeats):
+                gc.collect()
+                with Timer() as t:
+                    rows = fn(data, param)
+                seconds.append(t.elapsed)
+            gc.collect()
+            peak_traced, peak_rss = get_peak_memory(lambda: fn(data, param))
+            records.append(
+                {
+                    "benchmark": name,
+                    "param": str(param),
+                    "rows": rows,
+                    "seconds": min(seconds),
+                    "rows_per_second": rows / min(seconds),
+                    "peak_traced_mb": peak_traced / 1024**2,
+                    "peak_rss_mb": peak_rss / 1024**2,
+                }
+            )
+    df = pd.DataFrame.from_records(records)
+    return df
+
+
+def get_git_commit(repo_dir: str = os.path.dirname(__file__)) -> str:
+    """Get short hash of checked out commit, marked dirty if modified."""
+    try:
+        commit = subprocess.run(  # nosec
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=repo_dir,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+        status = subprocess.run(  # nosec
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=repo_dir,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if status else commit
+
+
+def save_benchmark_results(
+    df: pd.DataFrame,
+    results_dir: str = RESULTS_DIR,
+    commit: Optional[str] = None,
+    scale: float = 1.0,
+) -> str:
+    """Export results of benchmarks of a commit, with the environment."""
+    commit = commit or get_git_commit()
+    os.makedirs(results_dir, exist_ok=True)
+    df = df.assign(
+        commit=commit,
+        scale=scale,
+        machine=platform.node(),
+        python=platform.python_version(),
+        pandas=pd.__version__,
+        duckdb=duckdb.__version__,
+    )
+    return flut.load(df, results_dir, f"{BENCHMARKS_PREFIX}__{commit}")
+
+
+def read_benchmark_results(
+    commit: str, results_dir: str = RESULTS_DIR
+) -> pd.DataFrame:
+    """Read most recently exported results of benchmarks of a commit."""
+    fpaths = sorted(
+        glob(os.path.join(results_dir, f"{BENCHMARKS_PREFIX}__{commit}__*"))
+    )
+    if not fpaths:
+        raise FileNotFoundError(f"No benchmark results of commit {commit}")
+    return pd.read_parquet(fpaths[-1])
+
+
+def compare_benchmark_results(
+    baseline: str,
+    contender: str,
+    results_dir: str = RESULTS_DIR,
+    threshold: float = 1.1,
+) -> pd.DataFrame:
+    """Compare results of benchmarks of two commits.
+
+    Parameters
+    ----------
+    baseline: str
+        (short hash of) commit whose results are compared against
+    contender: str
+        (short hash of) commit whose results are compared
+    results_dir: str
+        directory containing results of benchmarks
+    threshold: float
+        ratio of seconds (or of peak memory) of contender to baseline above
+        which a benchmark is slower (or uses more memory), and below whose
+        inverse a benchmark is faster (or uses less memory)
+
+    Returns
+    -------
+    pd.DataFrame
+        seconds and peak memory (traced by tracemalloc) of both commits,
+        with their ratios and the change of every benchmark and parameter
+        found in the results of both commits
+    """
+    columns = ["benchmark", "param", "seconds", "peak_traced_mb"]
+    df = read_benchmark_results(baseline, results_dir)[columns].merge(
+        read_benchmark_results(contender, results_dir)[columns],
+        on=["benchmark", "param"],
+        suffixes=("_baseline", "_contender"),
+    )
+    for metric, changes in [
+        ("seconds", ["slower", "faster"]),
+        ("peak_traced_mb", ["more memory", "less memory"]),
+    ]:
+        ratio = df[f"{metric}_contender"] / df[f"{metric}_baseline"]
+        df[f"{metric}_ratio"] = ratio
+        df[f"{metric}_change"] = np.select(
+            [ratio > threshold, ratio < 1 / threshold], changes, ""
+        )
+    return df
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark stages of the trips pipeline."
+    )
+    parser.add_argument(
+        "--benchmarks",
+        nargs="+",
+        choices=list(BENCHMARKS),
+        default=None,
+        help="benchmarks to be run (default: all benchmarks)",
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="multiple of current number of trips in synthetic trips",
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=3,
+        help="timed runs of every benchmark",
+    )
+    parser.add_argument(
+        "--results-dir",
+        default=RESULTS_DIR,
+        help="directory to which results of benchmarks are exported",
+    )
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BASELINE", "CONTENDER"),
+        default=None,
+        help="compare results of two commits instead of running benchmarks",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Run benchmarks, or compare results of benchmarks of two commits."""
+    args = parse_args()
+    if args.compare:
+        df = compare_benchmark_results(*args.compare, args.results_dir)
+        print(df.round(3).to_string(index=False))
+        return
+    with tempfile.TemporaryDirectory() as data_dir:
+        with Timer() as t:
+            data = get_benchmark_data(data_dir, args.scale)
+        print(f"Prepared synthetic data in {t.elapsed:.3f}s")
+        df = run_benchmarks(data, args.benchmarks, args.repeats)
+    fpath = save_benchmark_results(df, args.results_dir, scale=args.scale)
+    print(df.round(3).to_string(index=False))
+    print(f"Exported results of benchmarks to {fpath}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define a calendar dimension of daily weather and holidays."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import os
+from glob import glob
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from contexttimer import Timer
+
+import file_utils as flut
+import recommendation_schedule as rs
+
+# nanoseconds per day, used to get integer day keys (days since 1970-01-01)
+# of (naive, local) datetimes of trips
+NS_PER_DAY = 86_400 * 10**9
+# daily weather (Meteostat) columns added to the calendar dimension
+WEATHER_COLUMNS = [
+    "tavg",
+    "tmin",
+    "tmax",
+    "prcp",
+    "snow",
+    "wdir",
+    "wspd",
+    "wpgt",
+    "pres",
+    "tsun",
+]
+# meteorological seasons, by month
+SEASONS = {
+    **dict.fromkeys([12, 1, 2], "Winter"),
+    **dict.fromkeys([3, 4, 5], "Spring"),
+    **dict.fromkeys([6, 7, 8], "Summer"),
+    **dict.fromkeys([9, 10, 11], "Fall"),
+}
+# columns (and datatypes) of the calendar dimension
+CALENDAR_DTYPES = {
+    "day_key": "int32",
+    "date": "datetime64[ns]",
+    "year": "int16",
+    "month": "int8",
+    "day": "int8",
+    "day_of_week": "int8",
+    "is_weekend": "bool",
+    "is_holiday": "bool",
+    "holiday_name": "str",
+    "season": pd.CategoricalDtype(["Winter", "Spring", "Summer", "Fall"]),
+    "is_prime_season": "bool",
+    **{c: "float32" for c in WEATHER_COLUMNS},
+}
+# nullable datatypes of calendar attributes joined to trips whose day is not
+# in the calendar dimension
+NULLABLE_DTYPES = {
+    "int32": "Int32",
+    "int16": "Int16",
+    "int8": "Int8",
+    "bool": "boolean",
+}
+CALENDAR_DIMENSION_PREFIX = "calendar_dimension"
+
+
+def get_day_keys(values: pd.Series) -> pd.Series:
+    """Get day keys (days since 1970-01-01) of naive local datetimes.
+
+    Day keys are found with integer arithmetic on nanoseconds, and are
+    missing where datetimes are missing.
+    """
+    ns = values.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    keys = pd.Series(ns // NS_PER_DAY, index=values.index, dtype="Int32")
+    return keys.mask(values.isna())
+
+
+def get_day_key_sql(column: str) -> str:
+    """Get SQL expression of day keys of datetime column (see get_day_keys)."""
+    return f"CAST(CAST({column} AS DATE) - DATE '1970-01-01' AS INTEGER)"
+
+
+def get_calendar(years: List[int]) -> pd.DataFrame:
+    """Get day keys and attributes (without weather) of every day of years."""
+    dates = pd.date_range(f"{min(years)}-01-01", f"{max(years)}-12-31")
+    mmdd = dates.month * 100 + dates.day
+    first, last = [int(d.replace("-", "")) for d in rs.PRIME_SEASON]
+    df = pd.DataFrame(
+        {
+            "day_key": get_day_keys(dates.to_series()).to_numpy(),
+            "date": dates,
+            "year": dates.year,
+            "month": dates.month,
+            "day": dates.day,
+            "day_of_week": dates.dayofweek,
+            "is_weekend": dates.dayofweek >= 5,
+            "season": dates.month.map(SEASONS),
+            "is_prime_season": (mmdd >= first) & (mmdd <= last),
+        }
+    )
+    return df
+
+
+def get_daily_weather(fpath_weather: str) -> pd.DataFrame:
+    """Get daily weather, by date, from Meteostat weather file."""
+    df = (
+        pd.read_parquet(fpath_weather)
+        .rename(columns={"time": "date"})
+        .astype({"date": "datetime64[ns]"})
+        .drop_duplicates(subset=["date"], keep="last")
+    )
+    return df[["date"] + [c for c in WEATHER_COLUMNS if c in df]]
+
+
+def get_holidays(fpath_holidays: str) -> pd.DataFrame:
+    """Get public holidays, by date, joining names of holidays on a date."""
+    df = (
+        pd.read_parquet(fpath_holidays, columns=["date", "holiday_name"])
+        .astype({"date": "datetime64[ns]", "holiday_name": "str"})
+        .groupby("date", as_index=False)
+        .agg(holiday_name=("holiday_name", "; ".join))
+        .assign(is_holiday=True)
+    )
+    return df
+
+
+def get_calendar_dimension(
+    years: List[int],
+    fpath_weather: Optional[str] = None,
+    fpath_holidays: Optional[str] = None,
+) -> pd.DataFrame:
+    """Get calendar dimension of every day of years.
+
+    Parameters
+    ----------
+    years: List[int]
+        years covered by the calendar dimension (every day from the start of
+        the first year to the end of the last year is included)
+    fpath_weather: Optional[str]
+        filepath to daily weather, or None if weather is not available
+    fpath_holidays: Optional[str]
+        filepath to public holidays, or None if holidays are not available
+
+    Returns
+    -------
+    pd.DataFrame
+        one row per day (see CALENDAR_DTYPES), sorted by consecutive day keys
+        so that the row of a day is found at the position of its day key
+        relative to the first day key
+    """
+    df = get_calendar(years)
+    df_holidays = (
+        get_holidays(fpath_holidays)
+        if fpath_holidays
+        else pd.DataFrame(columns=["date", "holiday_name", "is_holiday"])
+    )
+    df_weather = (
+        get_daily_weather(fpath_weather)
+        if fpath_weather
+        else pd.DataFrame(columns=["date"])
+    )
+    df = (
+        df.merge(
+            df_holidays.astype({"date": "datetime64[ns]"}),
+            on="date",
+            how="left",
+        )
+        .merge(
+            df_weather.astype({"date": "datetime64[ns]"}),
+            on="date",
+            how="left",
+        )
+        .fillna({"is_holiday": False, "holiday_name": ""})
+        .reindex(columns=list(CALENDAR_DTYPES))
+        .astype(CALENDAR_DTYPES)
+    )
+    return df
+
+
+def build_calendar_dimension(
+    data_dir: str,
+    fpath_weather: Optional[str] = None,
+    fpath_holidays: Optional[str] = None,
+    verbose: bool = False,
+) -> str:
+    """Build calendar dimension covering all years of processed trips.
+
+    Parameters
+    ----------
+    data_dir: str
+        directory containing processed trips, to which the calendar
+        dimension is exported
+    fpath_weather: Optional[str]
+        filepath to daily weather, or None if weather is not available
+    fpath_holidays: Optional[str]
+        filepath to public holidays, or None if holidays are not available
+    verbose: bool
+        whether to show the number of days, holidays and days with weather
+
+    Returns
+    -------
+    str
+        filepath to calendar dimension (see get_calendar_dimension)
+    """
+    years = sorted(
+        {
+            int(os.path.basename(f).split("_")[3])
+            for f in glob(os.path.join(data_dir, "processed__trips_*"))
+        }
+    )
+    df = get_calendar_dimension(years, fpath_weather, fpath_holidays)
+    if verbose:
+        print(
+            f"Found {len(df):,} days from {years[0]} to {years[-1]}, with "
+            f"{df['is_holiday'].sum():,} holidays and "
+            f"{df['tavg'].notna().sum():,} days of weather"
+        )
+    return flut.load(df, data_dir, CALENDAR_DIMENSION_PREFIX)
+
+
+def join_calendar_attributes(
+    df: pd.DataFrame,
+    df_calendar: pd.DataFrame,
+    column: str = "started_at",
+    columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """Add calendar attributes of the day of a datetime column to trips.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        processed trips
+    df_calendar: pd.DataFrame
+        calendar dimension (see get_calendar_dimension)
+    column: str
+        datetime column of trips whose day is looked up
+    columns: Optional[List[str]]
+        calendar attributes added to trips, or all attributes (other than
+        day_key and date) if None
+
+    Returns
+    -------
+    pd.DataFrame
+        trips with calendar attributes, which are missing (with nullable
+        datatypes) for trips whose day is not in the calendar dimension
+
+    Notes
+    -----
+    The calendar dimension holds consecutive days, so the row of the day of
+    every trip is found at the position of its day key, without a merge of
+    trips on datetimes (or dates).
+    """
+    columns = columns or [
+        c for c in df_calendar if c not in ["day_key", "date"]
+    ]
+    keys = get_day_keys(df[column])
+    pos = (keys - int(df_calendar["day_key"].iloc[0])).to_numpy(
+        dtype=np.int64, na_value=-1
+    )
+    is_valid = (pos >= 0) & (pos < len(df_calendar))
+    df_attrs = (
+        df_calendar[columns]
+        .iloc[np.where(is_valid, pos, 0)]
+        .set_axis(df.index, axis=0)
+    )
+    if not is_valid.all():
+        df_attrs = df_attrs.astype(
+            {
+                c: NULLABLE_DTYPES[str(dtype)]
+                for c, dtype in df_attrs.dtypes.items()
+                if str(dtype) in NULLABLE_DTYPES
+            }
+        ).mask(np.broadcast_to(~is_valid[:, None], df_attrs.shape))
+    return pd.concat([df, df_attrs], axis=1)
+
+
+def get_calendar_join_sql(
+    trips: str,
+    calendar: str,
+    column: str = "started_at",
+    columns: Optional[List[str]] = None,
+) -> str:
+    """Get SQL to add calendar attributes of the day of trips to trips.
+
+    Parameters
+    ----------
+    trips: str
+        table (or table function) of processed trips
+    calendar: str
+        table (or table function) of the calendar dimension
+    column: str
+        datetime column of trips whose day is looked up
+    columns: Optional[List[str]]
+        calendar attributes added to trips, or all attributes (other than
+        day_key and date) if None
+
+    Returns
+    -------
+    str
+        query joining trips to the calendar dimension on integer day keys
+    """
+    selected = (
+        ", ".join(f"c.{col}" for col in columns)
+        if columns
+        else "c.* EXCLUDE (day_key, date)"
+    )
+    query = f"""
+            SELECT t.*, {selected}
+            FROM {trips} AS t
+            LEFT JOIN {calendar} AS c
+            ON c.day_key = {get_day_key_sql(f't.{column}')}
+            """  # nosec
+    return query
+
+
+def benchmark_calendar_join(
+    df: pd.DataFrame,
+    df_calendar: pd.DataFrame,
+    column: str = "started_at",
+    repeats: int = 3,
+) -> pd.DataFrame:
+    """Compare day-key lookups of calendar attributes with merges on dates.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        processed trips (eg. a month of trips)
+    df_calendar: pd.DataFrame
+        calendar dimension (see get_calendar_dimension)
+    column: str
+        datetime column of trips whose day is looked up
+    repeats: int
+        number of times every method is run (the fastest run is reported)
+
+    Returns
+    -------
+    pd.DataFrame
+        seconds taken by every method, and whether its calendar attributes
+        are identical to those of the day-key lookup
+    """
+    columns = [c for c in df_calendar if c not in ["day_key", "date"]]
+    df = (
+        df[[column]]
+        .dropna()
+        .astype({column: "datetime64[ns]"})
+        .reset_index(drop=True)
+    )
+    methods = {
+        "day_key": lambda: join_calendar_attributes(
+            df, df_calendar, column, columns
+        ),
+        "merge_on_date": lambda: df.assign(
+            date=df[column].dt.normalize()
+        ).merge(df_calendar.drop(columns=["day_key"]), on="date", how="left"),
+        "merge_asof": lambda: pd.merge_asof(
+            df.assign(row=np.arange(len(df))).sort_values(by=[column]),
+            df_calendar.drop(columns=["day_key"]),
+            left_on=column,
+            right_on="date",
+        ).sort_values(by=["row"]),
+    }
+    records, results = [], {}
+    for name, method in methods.items():
+        seconds = []
+        for _ in range(repeats):
+            with Timer() as t:
+                results[name] = method()
+            seconds.append(t.elapsed)
+        records.append(
+            {"method": name, "rows": len(df), "seconds": min(seconds)}
+        )
+    expected = results["day_key"][columns].reset_index(drop=True)
+    df_results = pd.DataFrame.from_records(records)
+    df_results["identical"] = [
+        results[name][columns].reset_index(drop=True).equals(expected)
+        for name in methods
+    ]
+    return df_results
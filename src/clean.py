@@ -12,104 +12,136 @@ from typing import List
 
 import pandas as pd
 
+# rules used to clean station names, applied in order, as (kind, pattern,
+# replacement) where kind is one of
+# - regex: replace all matches of the regular expression pattern
+# - literal: replace all occurrences of the pattern
+# - rstrip: remove trailing characters found in the pattern
+# - strip: remove leading and trailing whitespace
+STATION_NAME_RULES = [
+    ("regex", " - SMART", ""),
+    ("regex", " SMART", ""),
+    ("regex", "  SMART", ""),
+    ("regex", " -SMART", ""),
+    ("regex", "WEST", "West"),
+    ("regex", r"\.", ""),
+    ("regex", r" \(Green P\)", ""),
+    ("regex", " Green P", ""),
+    ("regex", r"\.", ""),
+    ("regex", r"\?", "-"),
+    ("regex", "–", "-"),
+    ("regex", "GÃÃ´", ""),
+    ("regex", "GÇô", ""),
+    ("regex", "â", ""),
+    ("regex", "GÃÃ", ""),
+    ("regex", "GÇÖ", ""),
+    ("regex", r"\(West Side\)", "(West)"),
+    (
+        "regex",
+        "York St / Lakeshore St W - South",
+        "York St / Lake Shore Blvd W",
+    ),
+    ("regex", "[^A-z0-9 / ]", ""),
+    ("literal", "  ", " "),
+    ("rstrip", "-", ""),
+    ("strip", "", ""),
+    ("literal", "/", " / "),
+    ("literal", "  ", " "),
+    ("literal", "Lakeshore", "Lake Shore"),
+    ("literal", "King s", "Kings"),
+    ("literal", " East Side", ""),
+    ("literal", " West Side", ""),
+    ("literal", " North Side", ""),
+    ("literal", " South Side", ""),
+    ("literal", " East", ""),
+    ("literal", "/ern Ave", "Eastern Ave"),
+    ("literal", "W West", "W"),
+    ("literal", "(East ", "East"),
+    ("literal", "(West ", "West"),
+    ("literal", "(South ", "South"),
+    ("literal", "(North ", "North"),
+    ("literal", "(East", "East"),
+    ("literal", "(West", "West"),
+    ("literal", "(South", "South"),
+    ("literal", "(North", "North"),
+    ("literal", "(Allan ", "Allan"),
+    ("literal", "(Ferry ", "Ferry"),
+    ("literal", "(Bus ", "Bus"),
+    ("literal", "(City ", "City"),
+    ("literal", "(Hockey ", "Hockey"),
+    ("literal", "(Broadview ", "Broadview"),
+    ("literal", "(Queen ", "Queen"),
+    ("literal", "(Queens", "Queens"),
+    ("literal", "(Riverdale ", "Riverdale"),
+    ("literal", "(Wychwood ", "Wychwood"),
+    ("literal", "(Dufferin ", "Dufferin"),
+    ("literal", "(Marilyn ", "Marilyn"),
+    ("literal", "(Green ", "Green"),
+    ("literal", "(High ", "High"),
+    ("literal", "(Sheridan ", "Sheridan"),
+    ("literal", "(Yonge ", "Yonge"),
+    ("literal", "(1010 ", "1010"),
+    ("literal", "(Greenwood ", "Greenwood"),
+    ("literal", "(Sandown ", "Sandown"),
+    ("literal", "(Leslie ", "Leslie"),
+    ("literal", "(Jane ", "Jane"),
+    ("literal", "(Highland ", "Highland"),
+    ("literal", "(Rouge ", "Rouge"),
+    ("literal", "(Glendon ", "Glendon"),
+    ("literal", "(Eglinton ", "Eglinton"),
+    ("literal", "(Harbord ", "Harbord"),
+    ("literal", "(Atlantic ", "Atlantic"),
+    ("literal", "(Arena ", "Arena"),
+    ("literal", "(Monarch ", "Monarch"),
+    ("literal", "(Love ", "Love"),
+    ("literal", "(Aberfoyle ", "Aberfoyle"),
+    ("literal", "(Martin ", "Martin"),
+    ("literal", "(TMU", "TMU"),
+    ("literal", "Quay(Billy ", "Quay Billy "),
+    ("literal", "QuayBilly ", "Quay Billy "),
+    ("literal", "(1", "1"),
+    ("literal", "(2", "2"),
+    ("literal", "(5", "5"),
+    ("literal", "PBSCOPS", ""),
+    ("literal", " - SMART", ""),
+    ("literal", "  ", " "),
+    ("literal", ". ", " "),
+    ("literal", ")", ""),
+    ("literal", " 1", ""),
+    ("literal", " 2", ""),
+]
+
 
 def clean_status_station_names(
     df: pd.DataFrame, columns: List[str]
 ) -> pd.DataFrame:
     """Clean station names using Pandas."""
     for c in columns:
-        df[c] = (
-            df[c]
-            .str.replace(" - SMART", "", regex=True)
-            .str.replace(" SMART", "", regex=True)
-            .str.replace("  SMART", "", regex=True)
-            .str.replace(" -SMART", "", regex=True)
-            .str.replace("WEST", "West", regex=True)
-            .str.replace(r"\.", "", regex=True)
-            .str.replace(r" \(Green P\)", "", regex=True)
-            .str.replace(" Green P", "", regex=True)
-            .str.replace(r"\.", "", regex=True)
-            .str.replace(r"\?", "-", regex=True)
-            .str.replace(r"–", "-", regex=True)
-            .str.replace(r"GÃÃ´", "", regex=True)
-            .str.replace(r"GÇô", "", regex=True)
-            .str.replace(r"â", "", regex=True)
-            .str.replace(r"GÃÃ", "", regex=True)
-            .str.replace(r"GÇÖ", "", regex=True)
-            .str.replace(r"\(West Side\)", "(West)", regex=True)
-            .str.replace(
-                r"York St / Lakeshore St W - South",
-                r"York St / Lake Shore Blvd W",
-                regex=True,
-            )
-            .str.replace("[^A-z0-9 / ]", "", regex=True)
-            .str.replace("  ", " ")
-            .str.rstrip("-")
-            .str.strip()
-            .str.replace("/", " / ")
-            .str.replace("  ", " ")
-            .str.replace("Lakeshore", "Lake Shore")
-            .str.replace("King s", "Kings")
-            .str.replace(" East Side", "")
-            .str.replace(" West Side", "")
-            .str.replace(" North Side", "")
-            .str.replace(" South Side", "")
-            .str.replace(" East", "")
-            .str.replace("/ern Ave", "Eastern Ave")
-            .str.replace("W West", "W")
-            # added
-            .str.replace("(East ", "East")
-            .str.replace("(West ", "West")
-            .str.replace("(South ", "South")
-            .str.replace("(North ", "North")
-            .str.replace("(East", "East")
-            .str.replace("(West", "West")
-            .str.replace("(South", "South")
-            .str.replace("(North", "North")
-            .str.replace("(Allan ", "Allan")
-            .str.replace("(Ferry ", "Ferry")
-            .str.replace("(Bus ", "Bus")
-            .str.replace("(City ", "City")
-            .str.replace("(Hockey ", "Hockey")
-            .str.replace("(Broadview ", "Broadview")
-            .str.replace("(Queen ", "Queen")
-            .str.replace("(Queens", "Queens")
-            .str.replace("(Riverdale ", "Riverdale")
-            .str.replace("(Wychwood ", "Wychwood")
-            .str.replace("(Dufferin ", "Dufferin")
-            .str.replace("(Marilyn ", "Marilyn")
-            .str.replace("(Green ", "Green")
-            .str.replace("(High ", "High")
-            .str.replace("(Sheridan ", "Sheridan")
-            .str.replace("(Yonge ", "Yonge")
-            .str.replace("(1010 ", "1010")
-            .str.replace("(Greenwood ", "Greenwood")
-            .str.replace("(Sandown ", "Sandown")
-            .str.replace("(Leslie ", "Leslie")
-            .str.replace("(Jane ", "Jane")
-            .str.replace("(Highland ", "Highland")
-            .str.replace("(Rouge ", "Rouge")
-            .str.replace("(Glendon ", "Glendon")
-            .str.replace("(Eglinton ", "Eglinton")
-            .str.replace("(Harbord ", "Harbord")
-            .str.replace("(Atlantic ", "Atlantic")
-            .str.replace("(Arena ", "Arena")
-            .str.replace("(Monarch ", "Monarch")
-            .str.replace("(Love ", "Love")
-            .str.replace("(Aberfoyle ", "Aberfoyle")
-            .str.replace("(Martin ", "Martin")
-            .str.replace("(TMU", "TMU")
-            .str.replace("Quay(Billy ", "Quay Billy ")
-            .str.replace("QuayBilly ", "Quay Billy ")
-            .str.replace("(1", "1")
-            .str.replace("(2", "2")
-            .str.replace("(5", "5")
-            .str.replace("PBSCOPS", "")
-            .str.replace(" - SMART", "")
-            .str.replace("  ", " ")
-            .str.replace(". ", " ")
-            .str.replace(")", "")
-            .str.replace(" 1", "")
-            .str.replace(" 2", "")
-        )
+        for kind, pattern, replacement in STATION_NAME_RULES:
+            if kind == "regex":
+                df[c] = df[c].str.replace(pattern, replacement, regex=True)
+            elif kind == "literal":
+                df[c] = df[c].str.replace(pattern, replacement, regex=False)
+            elif kind == "rstrip":
+                df[c] = df[c].str.rstrip(pattern)
+            else:
+                df[c] = df[c].str.strip()
     return df
+
+
+def get_clean_station_name_sql(column: str) -> str:
+    """Get DuckDB SQL expression to clean station names."""
+    sql = column
+    for kind, pattern, replacement in STATION_NAME_RULES:
+        pattern, replacement = [
+            s.replace("'", "''") for s in [pattern, replacement]
+        ]
+        if kind == "regex":
+            sql = f"regexp_replace({sql}, '{pattern}', '{replacement}', 'g')"
+        elif kind == "literal":
+            sql = f"replace({sql}, '{pattern}', '{replacement}')"
+        elif kind == "rstrip":
+            sql = f"rtrim({sql}, '{pattern}')"
+        else:
+            sql = f"trim({sql})"
+    return sql
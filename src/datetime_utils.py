@@ -7,7 +7,48 @@
 # pylint: disable=invalid-name,dangerous-default-value
 # pylint: disable=too-many-locals,unused-argument
 
+import argparse
+import os
 from datetime import datetime
+from functools import lru_cache
+from glob import glob
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from contexttimer import Timer
+
+import import_utils as iu
+
+# only needed to benchmark localization of datetimes
+pytz = iu.lazy_import("pytz")
+
+# fields of fixed-width datetime formats, as (name, number of digits)
+FIXED_WIDTH_FIELDS = {
+    "%Y": ("year", 4),
+    "%m": ("month", 2),
+    "%d": ("day", 2),
+    "%H": ("hour", 2),
+    "%M": ("minute", 2),
+    "%S": ("second", 2),
+}
+# nanoseconds per hour, minute and second
+NS_PER_UNIT = {"hour": 3_600 * 10**9, "minute": 60 * 10**9, "second": 10**9}
+# formats tried (as strptime formats) for datetimes that do not have the
+# expected fixed width, such as fields without zero-padding (eg. 1/5/2018
+# 7:03) or with seconds, as found in some years
+FALLBACK_FORMATS = ["%m/%d/%Y %H:%M:%S"]
+# how local times that occur twice, when clocks are set back at the end of
+# daylight saving time (DST), are localized: as the first (DST) or second
+# (standard time) occurrence, as NaT, or by raising an error
+AMBIGUOUS_TIMES = ["earliest", "latest", "NaT", "raise"]
+# how local times that do not occur, when clocks are set forward at the
+# start of DST, are localized: shifted forward by the DST gap (eg. 02:30
+# becomes 03:30, as with tz_localize(nonexistent=pd.Timedelta("1h")), unlike
+# nonexistent="shift_forward" which gives 03:00), as NaT, or by raising an
+# error
+NONEXISTENT_TIMES = ["shift_by_gap", "NaT", "raise"]
 
 
 def conv2dtime(date_time: datetime, fmt: str = "%Y-%m-%d %H:%M:%S") -> str:
@@ -18,3 +59,458 @@ def conv2dtime(date_time: datetime, fmt: str = "%Y-%m-%d %H:%M:%S") -> str:
 def dtime2str(date_time: str, fmt: str = "%Y-%m-%d %H:%M:%S") -> datetime:
     """."""
     return date_time.strftime(fmt)
+
+
+def get_fixed_width_layout(
+    fmt: str,
+) -> Tuple[Dict[str, Tuple[int, int]], List[Tuple[int, int]], int]:
+    """Get offsets of fields and separators of a fixed-width format.
+
+    Returns the (offset, width) of every field, the (offset, byte) of every
+    separator and the width of formatted datetimes.
+    """
+    fields, separators = {}, []
+    offset, k = 0, 0
+    while k < len(fmt):
+        if fmt[k] == "%":
+            name, width = FIXED_WIDTH_FIELDS[fmt[k:][:2]]
+            fields[name] = (offset, width)
+            offset, k = offset + width, k + 2
+        else:
+            separators.append((offset, ord(fmt[k])))
+            offset, k = offset + 1, k + 1
+    return fields, separators, offset
+
+
+def get_string_array(
+    values: Union[pd.Series, np.ndarray, pa.Array, pa.ChunkedArray],
+) -> pa.LargeStringArray:
+    """Get strings as a single (contiguous) Arrow array."""
+    arr = values
+    if not isinstance(arr, (pa.Array, pa.ChunkedArray)):
+        arr = pa.array(values, type=pa.large_string())
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+    return arr.cast(pa.large_string())
+
+
+def get_string_buffers(
+    arr: pa.LargeStringArray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Get byte offsets, bytes and validity of an Arrow array of strings."""
+    _, offsets, data = arr.buffers()
+    offsets = np.frombuffer(
+        offsets, dtype=np.int64, count=len(arr) + 1, offset=arr.offset * 8
+    )
+    data = (
+        np.frombuffer(data, dtype=np.uint8)
+        if data is not None
+        else np.zeros(0, dtype=np.uint8)
+    )
+    is_valid = arr.is_valid().to_numpy(zero_copy_only=False)
+    return offsets, data, is_valid
+
+
+def parse_fixed_width_bytes(
+    data: np.ndarray, starts: np.ndarray, fmt: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Parse datetimes of a fixed-width format from their digits.
+
+    Returns datetimes (as nanoseconds since the epoch) and whether every
+    datetime was parsed (ie. had the expected separators and valid fields).
+    """
+    fields, separators, width = get_fixed_width_layout(fmt)
+    chars = data[starts[:, None] + np.arange(width)]
+    is_parsed = np.ones(len(starts), dtype=bool)
+    for offset, char in separators:
+        is_parsed &= chars[:, offset] == char
+    digits = chars.astype(np.int64) - ord("0")
+    values = {}
+    for name, (offset, n) in fields.items():
+        field_digits = digits[:, slice(offset, offset + n)]
+        is_parsed &= ((field_digits >= 0) & (field_digits <= 9)).all(axis=1)
+        values[name] = field_digits @ (10 ** np.arange(n - 1, -1, -1))
+    month, day = values["month"], values["day"]
+    is_parsed &= (month >= 1) & (month <= 12) & (day >= 1)
+    for name, upper in [("hour", 24), ("minute", 60), ("second", 60)]:
+        if name in values:
+            is_parsed &= values[name] < upper
+    months = (values["year"] - 1970) * 12 + np.clip(month, 1, 12) - 1
+    months = months.astype("datetime64[M]")
+    month_start = months.astype("datetime64[D]")
+    days_in_month = (months + 1).astype("datetime64[D]") - month_start
+    is_parsed &= day <= days_in_month.astype(np.int64)
+    ns = month_start.astype("datetime64[ns]").astype(np.int64)
+    ns += (day - 1) * 24 * NS_PER_UNIT["hour"]
+    for name, ns_per_unit in NS_PER_UNIT.items():
+        if name in values:
+            ns += values[name] * ns_per_unit
+    return ns, is_parsed
+
+
+def parse_datetimes(
+    values: Union[pd.Series, np.ndarray, pa.Array, pa.ChunkedArray],
+    fmt: str = "%m/%d/%Y %H:%M",
+    fallback_formats: List[str] = FALLBACK_FORMATS,
+    errors: str = "raise",
+) -> Union[pd.Series, np.ndarray]:
+    """Parse strings of a fixed-width datetime format.
+
+    Parameters
+    ----------
+    values: Union[pd.Series, np.ndarray, pa.Array, pa.ChunkedArray]
+        strings of datetimes, with missing values
+    fmt: str
+        fixed-width format (using %Y, %m, %d, %H, %M and %S) of datetimes
+    fallback_formats: List[str]
+        formats tried (after fmt) for datetimes that cannot be parsed by
+        their fixed digit offsets, using pd.to_datetime
+    errors: str
+        whether to raise an error ('raise'), or return NaT ('coerce'), if a
+        non-missing datetime cannot be parsed
+
+    Returns
+    -------
+    Union[pd.Series, np.ndarray]
+        parsed datetimes (datetime64[ns]), as a pd.Series with the same
+        index and name if values is a pd.Series
+
+    Notes
+    -----
+    Datetimes with the expected width are parsed from their bytes (in an
+    Arrow buffer) by the fixed offsets of their digits, using vectorized
+    NumPy arithmetic. All other datetimes, and those with invalid fields
+    (eg. 02/30/2022), are parsed with pd.to_datetime, which is only used
+    for these (usually few) rows.
+    """
+    arr = get_string_array(values)
+    offsets, data, is_valid = get_string_buffers(arr)
+    width = get_fixed_width_layout(fmt)[2]
+    is_fixed = is_valid & (np.diff(offsets) == width)
+    idx_fixed = np.flatnonzero(is_fixed)
+    ns, is_parsed = parse_fixed_width_bytes(data, offsets[idx_fixed], fmt)
+    parsed = np.full(len(is_valid), np.datetime64("NaT"), "datetime64[ns]")
+    parsed[idx_fixed[is_parsed]] = ns[is_parsed].view("datetime64[ns]")
+
+    # fall back to pd.to_datetime
+    idx_odd = np.flatnonzero(is_valid & np.isnat(parsed))
+    if len(idx_odd) > 0:
+        odd = pd.Series(arr.take(idx_odd).to_numpy(zero_copy_only=False))
+        for f in [fmt] + fallback_formats:
+            is_nat = np.isnat(parsed[idx_odd])
+            if not is_nat.any():
+                break
+            parsed[idx_odd[is_nat]] = pd.to_datetime(
+                odd[is_nat], format=f, errors="coerce"
+            ).to_numpy(dtype="datetime64[ns]")
+        idx_failed = idx_odd[np.isnat(parsed[idx_odd])]
+        if len(idx_failed) > 0 and errors == "raise":
+            example = odd[np.isnat(parsed[idx_odd])].iloc[0]
+            raise ValueError(
+                f"Could not parse {len(idx_failed):,} datetimes with format "
+                f"{fmt} (eg. '{example}')"
+            )
+    if isinstance(values, pd.Series):
+        return pd.Series(parsed, index=values.index, name=values.name)
+    return parsed
+
+
+@lru_cache(maxsize=None)
+def get_hourly_utc_offsets(tz: str, year: int) -> pd.DataFrame:
+    """Get UTC offsets (in minutes) of every local hour of a year.
+
+    Returns the offset of the first (earliest) and second (latest)
+    occurrence of every hour, which differ for ambiguous hours, and whether
+    every hour does not occur (nonexistent hours use the offset of the
+    preceding hour). The offsets are cached, since all trips of a year use
+    the same (at most 8,784) hours.
+    """
+    hours = pd.date_range(
+        datetime(year, 1, 1), datetime(year + 1, 1, 1), freq="h"
+    )[:-1]
+    offsets = {}
+    for name, is_dst in [("earliest", True), ("latest", False)]:
+        localized = hours.tz_localize(
+            tz, ambiguous=np.full(len(hours), is_dst), nonexistent="NaT"
+        )
+        offsets[name] = pd.Series(
+            (hours - localized.tz_convert(None)) / pd.Timedelta(minutes=1)
+        )
+    df = pd.DataFrame(offsets).assign(
+        is_nonexistent=lambda df: df["earliest"].isna()
+    )
+    df[["earliest", "latest"]] = df[["earliest", "latest"]].ffill().bfill()
+    return df.astype({"earliest": "int16", "latest": "int16"}).set_axis(hours)
+
+
+def get_utc_offsets(
+    values: Union[pd.Series, np.ndarray],
+    tz: str = "America/Toronto",
+    ambiguous: str = "earliest",
+    nonexistent: str = "shift_by_gap",
+) -> pd.Series:
+    """Get UTC offsets (in minutes) of naive local datetimes.
+
+    Parameters
+    ----------
+    values: Union[pd.Series, np.ndarray]
+        naive local datetimes, with missing values
+    tz: str
+        timezone of local datetimes
+    ambiguous: str
+        how ambiguous local datetimes are localized (see AMBIGUOUS_TIMES)
+    nonexistent: str
+        how nonexistent local datetimes are localized (see
+        NONEXISTENT_TIMES)
+
+    Returns
+    -------
+    pd.Series
+        UTC offsets (Int16, missing for missing or NaT-localized datetimes),
+        with the same index as values if values is a pd.Series
+
+    Notes
+    -----
+    Offsets are looked up (by position) from the cached offsets of every
+    hour of the years of the datetimes (see get_hourly_utc_offsets), so
+    datetimes are not localized one at a time.
+    """
+    assert ambiguous in AMBIGUOUS_TIMES, f"Unknown ambiguous: {ambiguous}"
+    assert (
+        nonexistent in NONEXISTENT_TIMES
+    ), f"Unknown nonexistent: {nonexistent}"
+    times = pd.Series(values).to_numpy(dtype="datetime64[ns]")
+    is_valid = ~np.isnat(times)
+    # hours since the epoch
+    hours = times[is_valid].view(np.int64) // NS_PER_UNIT["hour"]
+    offsets = np.zeros(len(times), dtype=np.int16)
+    is_missing = ~is_valid
+    if len(hours) > 0:
+        first, last = [
+            np.datetime64(int(h), "h").astype(object).year
+            for h in [hours.min(), hours.max()]
+        ]
+        df = pd.concat(
+            [get_hourly_utc_offsets(tz, y) for y in range(first, last + 1)]
+        )
+        pos = hours - np.datetime64(f"{first}-01-01T00", "h").astype(np.int64)
+        earliest = df["earliest"].to_numpy()[pos]
+        latest = df["latest"].to_numpy()[pos]
+        checks = {
+            "ambiguous": (ambiguous, earliest != latest),
+            "nonexistent": (
+                nonexistent,
+                df["is_nonexistent"].to_numpy()[pos],
+            ),
+        }
+        offsets[is_valid] = earliest if ambiguous != "latest" else latest
+        for name, (how, is_odd) in checks.items():
+            if how == "raise" and is_odd.any():
+                example = pd.Timestamp(times[is_valid][is_odd][0])
+                raise ValueError(
+                    f"Found {is_odd.sum():,} {name} datetimes in {tz} "
+                    f"(eg. {example})"
+                )
+            if how == "NaT":
+                is_missing[is_valid] |= is_odd
+    offsets = pd.Series(
+        pd.arrays.IntegerArray(offsets, is_missing),
+        index=values.index if isinstance(values, pd.Series) else None,
+        name=values.name if isinstance(values, pd.Series) else None,
+    )
+    return offsets
+
+
+def localize_datetimes(
+    values: Union[pd.Series, np.ndarray],
+    tz: str = "America/Toronto",
+    ambiguous: str = "earliest",
+    nonexistent: str = "shift_by_gap",
+    utc_offsets: Optional[pd.Series] = None,
+) -> pd.Series:
+    """Localize naive local datetimes to a timezone (see get_utc_offsets).
+
+    UTC offsets (eg. stored with processed trips) are used if provided,
+    rather than being looked up.
+    """
+    if utc_offsets is None:
+        utc_offsets = get_utc_offsets(values, tz, ambiguous, nonexistent)
+    times = pd.Series(values).to_numpy(dtype="datetime64[ns]")
+    minutes = pd.Series(utc_offsets).astype("Int64")
+    utc = times.view(np.int64) - (
+        minutes.fillna(0).to_numpy(dtype=np.int64) * NS_PER_UNIT["minute"]
+    )
+    utc = utc.view("datetime64[ns]")
+    utc[np.isnat(times) | minutes.isna().to_numpy()] = np.datetime64("NaT")
+    localized = pd.Series(
+        pd.DatetimeIndex(utc).tz_localize("UTC").tz_convert(tz),
+        index=values.index if isinstance(values, pd.Series) else None,
+        name=values.name if isinstance(values, pd.Series) else None,
+    )
+    return localized
+
+
+def benchmark_datetime_parsing(
+    fpath: str,
+    columns: List[str],
+    fmt: str = "%m/%d/%Y %H:%M",
+    repeats: int = 3,
+) -> pd.DataFrame:
+    """Compare parse_datetimes and pd.to_datetime on raw trips file.
+
+    Parameters
+    ----------
+    fpath: str
+        filepath to raw trips CSV file
+    columns: List[str]
+        datetime columns (start and end times) of raw trips
+    fmt: str
+        format of datetimes
+    repeats: int
+        number of times every parser is run (the fastest run is reported)
+
+    Returns
+    -------
+    pd.DataFrame
+        seconds taken by every parser, per column and string datatype, and
+        whether parsed datetimes are identical
+    """
+    df = pd.read_csv(fpath, usecols=columns, dtype="str", encoding="latin1")
+    parsers = {
+        "pd_to_datetime": lambda s: pd.to_datetime(s, format=fmt),
+        "parse_datetimes": lambda s: parse_datetimes(s, fmt),
+    }
+    records = []
+    for c in columns:
+        for dtype in ["object", "str"]:
+            values = df[c].astype(dtype)
+            record = {"column": c, "dtype": dtype, "rows": len(values)}
+            results = {}
+            for name, parser in parsers.items():
+                seconds = []
+                for _ in range(repeats):
+                    with Timer() as t:
+                        results[name] = parser(values)
+                    seconds.append(t.elapsed)
+                record[name] = min(seconds)
+            record["speedup"] = (
+                record["pd_to_datetime"] / record["parse_datetimes"]
+            )
+            # pd.to_datetime can use a different resolution (eg. us)
+            record["identical"] = (
+                results["pd_to_datetime"]
+                .astype("datetime64[ns]")
+                .equals(results["parse_datetimes"])
+            )
+            records.append(record)
+    df_benchmark = pd.DataFrame.from_records(records)
+    return df_benchmark
+
+
+def benchmark_datetime_localization(
+    values: pd.Series,
+    tz: str = "America/Toronto",
+    repeats: int = 3,
+    rowwise_sample: int = 10_000,
+) -> pd.DataFrame:
+    """Compare localize_datetimes, tz_localize and row-wise localization.
+
+    Parameters
+    ----------
+    values: pd.Series
+        naive local datetimes (eg. start times of a month of trips)
+    tz: str
+        timezone of local datetimes
+    repeats: int
+        number of times every method is run (the fastest run is reported)
+    rowwise_sample: int
+        number of datetimes localized one at a time (with pytz), whose
+        seconds are scaled to all datetimes
+
+    Returns
+    -------
+    pd.DataFrame
+        seconds taken by every method, and whether localized datetimes are
+        identical to those of tz_localize (ambiguous datetimes are localized
+        as their earliest occurrence, and nonexistent datetimes are shifted
+        forward by one hour)
+    """
+    tzinfo = pytz.timezone(tz)
+    values = values.astype("datetime64[ns]")
+    sample = values.dropna().iloc[:rowwise_sample]
+    methods = {
+        "localize_datetimes": lambda: localize_datetimes(values, tz),
+        "tz_localize": lambda: values.dt.tz_localize(
+            tz,
+            ambiguous=np.ones(len(values), dtype=bool),
+            nonexistent=pd.Timedelta(hours=1),
+        ),
+        "pytz_rowwise": lambda: [
+            tzinfo.localize(t, is_dst=True) for t in sample.dt.to_pydatetime()
+        ],
+    }
+    records, results = [], {}
+    for name, method in methods.items():
+        seconds = []
+        for _ in range(repeats if name != "pytz_rowwise" else 1):
+            with Timer() as t:
+                results[name] = method()
+            seconds.append(t.elapsed)
+        scale = len(values) / len(sample) if name == "pytz_rowwise" else 1
+        records.append(
+            {
+                "method": name,
+                "rows": len(values),
+                "seconds": min(seconds) * scale,
+            }
+        )
+    df = pd.DataFrame.from_records(records)
+    localized, expected = results["localize_datetimes"], results["tz_localize"]
+    identical = (
+        (localized == expected) | (localized.isna() & expected.isna())
+    ).all()
+    # row-wise localization of a sample is not compared
+    df["identical"] = df["method"].map(
+        {"localize_datetimes": identical, "tz_localize": True}
+    )
+    return df
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Compare parsers and localizers of datetimes of trips."
+    )
+    parser.add_argument(
+        "--raw-data-dir",
+        default=os.path.join("data", "raw", "systems", "toronto"),
+        help="directory containing raw trips CSV files",
+    )
+    parser.add_argument(
+        "--fname",
+        default="Bike share ridership 2022-07.csv",
+        help="name of raw trips CSV file",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Benchmark parsing and localizing datetimes of a month of raw trips."""
+    args = parse_args()
+    fpath = glob(os.path.join(args.raw_data_dir, args.fname))[0]
+    columns = (
+        ["trip_start_time", "trip_stop_time"]
+        if "2018" in args.fname
+        else ["Start Time", "End Time"]
+    )
+    df = benchmark_datetime_parsing(fpath, columns)
+    print(df.round(4).to_string(index=False))
+    df = pd.read_csv(
+        fpath, usecols=columns[:1], dtype="str", encoding="latin1"
+    )
+    df = benchmark_datetime_localization(parse_datetimes(df[columns[0]]))
+    print(df.round(4).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
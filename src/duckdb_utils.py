@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define a shared DuckDB connection, catalog of views and query cache."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import hashlib
+import inspect
+import json
+import os
+import re
+import time
+import warnings
+from glob import glob
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+import calendar_dimension as cd
+import instrumentation as instr
+import station_dimension as stdim
+import trip_datetimes as tdt
+import trips_schema as ts
+
+DATA_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, "data"
+)
+# datasets exposed as views, as (sub-directory of data directory, filename
+# pattern), of which only the most recently exported file of every prefix is
+# used
+DATASETS = {
+    "trips": ("processed", "processed__trips_*.parquet.gzip"),
+    "raw_trips": ("processed", "raw__trips_*.parquet.gzip"),
+    "trips_quality": ("processed", "quality__trips_*.parquet.gzip"),
+    "stations": (
+        "processed",
+        f"{stdim.STATION_DIMENSION_PREFIX}__*.parquet.gzip",
+    ),
+    "calendar": (
+        "processed",
+        f"{cd.CALENDAR_DIMENSION_PREFIX}__*.parquet.gzip",
+    ),
+    "run_log": ("processed", f"{instr.RUN_LOG_PREFIX}__*.parquet.gzip"),
+    "stations_info": (
+        os.path.join("raw", "systems", "toronto"),
+        "stations_info__*.parquet.gzip",
+    ),
+    "station_attributes": (
+        "processed",
+        "station_attributes_behavioural_data__*.parquet.gzip",
+    ),
+    "stations_performance": (
+        "processed",
+        "stations_performance__*.parquet.gzip",
+    ),
+    "recommendations_temporal": (
+        "processed",
+        "recommendations_temporal__*.parquet.gzip",
+    ),
+    "recommendations_geospatial": (
+        "processed",
+        "recommendations_geospatial__*.parquet.gzip",
+    ),
+}
+# table functions whose string arguments are filepaths (or glob patterns)
+FILE_TABLE_FUNCTIONS = [
+    tdt.TRIPS_MACRO,
+    "read_parquet",
+    "parquet_scan",
+    "read_csv",
+    "read_csv_auto",
+    "read_json",
+    "read_json_auto",
+]
+CACHE_INDEX_FNAME = "query_cache__index.json"
+
+_CONNECTION: Dict[str, Any] = {}
+
+
+def get_latest_fpaths(pattern: str) -> List[str]:
+    """Get most recently exported file, per filename prefix, matching glob."""
+    latest = {}
+    # timestamp suffix (__YYYYmmdd_HHMMSS) sorts in order of export
+    for f in sorted(glob(pattern)):
+        latest[os.path.basename(f).rsplit("__", 1)[0]] = f
+    return sorted(latest.values())
+
+
+def get_dataset_fpaths(
+    data_dir: str = DATA_DIR, datasets: Dict[str, Tuple[str, str]] = DATASETS
+) -> Dict[str, List[str]]:
+    """Get filepaths to all datasets that are found on disk."""
+    fpaths = {
+        name: get_latest_fpaths(os.path.join(data_dir, sub_dir, pattern))
+        for name, (sub_dir, pattern) in datasets.items()
+    }
+    return {name: fps for name, fps in fpaths.items() if fps}
+
+
+def register_datasets(
+    con: duckdb.DuckDBPyConnection,
+    views: Dict[str, List[str]],
+    data_dir: str = DATA_DIR,
+    datasets: Dict[str, Tuple[str, str]] = DATASETS,
+) -> Dict[str, List[str]]:
+    """Create (or replace) views over datasets whose files have changed."""
+    fpaths = get_dataset_fpaths(data_dir, datasets)
+    for name, fps in fpaths.items():
+        if views.get(name) != fps:
+            source = f"read_parquet({fps}, union_by_name=true)"
+            # enforce compact datatypes of processed trips, which older
+            # processed trips files do not use, and derive their datetime
+            # attributes
+            selected = (
+                ts.get_trips_select_sql(con, source)
+                if name == "trips"
+                else "*"
+            )
+            query = f"""
+                    CREATE OR REPLACE VIEW {name} AS
+                    SELECT {selected}
+                    FROM {source}
+                    """  # nosec
+            con.sql(query)
+    # trips with names of their start and end stations (as they were named
+    # at the time of the trip) from the station dimension
+    if "trips" in fpaths and "stations" in fpaths:
+        fps = fpaths["trips"] + fpaths["stations"]
+        if views.get("trips_with_stations") != fps:
+            query = f"""
+                    CREATE OR REPLACE VIEW trips_with_stations AS
+                    {stdim.get_station_join_sql("trips", "stations")}
+                    """  # nosec
+            con.sql(query)
+        fpaths["trips_with_stations"] = fps
+    # trips with calendar attributes (weather, holidays, season) of the day
+    # they started on, from the calendar dimension
+    if "trips" in fpaths and "calendar" in fpaths:
+        fps = fpaths["trips"] + fpaths["calendar"]
+        if views.get("trips_with_calendar") != fps:
+            query = f"""
+                    CREATE OR REPLACE VIEW trips_with_calendar AS
+                    {cd.get_calendar_join_sql("trips", "calendar")}
+                    """  # nosec
+            con.sql(query)
+        fpaths["trips_with_calendar"] = fps
+    for name in set(views) - set(fpaths):
+        con.sql(f"DROP VIEW IF EXISTS {name}")  # nosec
+    return fpaths
+
+
+def get_connection(
+    database: Optional[str] = None,
+    threads: Optional[int] = None,
+    memory_limit: Optional[str] = None,
+    data_dir: str = DATA_DIR,
+    reset: bool = False,
+) -> duckdb.DuckDBPyConnection:
+    """Get shared connection to DuckDB database with views over datasets.
+
+    Parameters
+    ----------
+    database: Optional[str]
+        filepath to persistent database, or catalog.duckdb in the processed
+        data directory if None
+    threads: Optional[int]
+        number of threads used by DuckDB, or the number of CPUs if None
+    memory_limit: Optional[str]
+        memory that DuckDB can use (eg. '4GB'), or 80% of RAM if None
+    data_dir: str
+        directory containing raw and processed datasets
+    reset: bool
+        whether to close and re-open the shared connection
+
+    Returns
+    -------
+    duckdb.DuckDBPyConnection
+        shared connection, with a view per dataset found on disk and the
+        read_trips table macro (see trip_datetimes.get_trips_macro_sql)
+
+    Notes
+    -----
+    The connection is opened once per process. If the database is locked by
+    another process (eg. a different notebook), an in-memory database is
+    used instead.
+    """
+    if reset and _CONNECTION:
+        _CONNECTION.pop("con").close()
+        _CONNECTION.clear()
+    if not _CONNECTION:
+        database = database or os.path.join(
+            data_dir, "processed", "catalog.duckdb"
+        )
+        config = {
+            k: v
+            for k, v in {
+                "threads": threads,
+                "memory_limit": memory_limit,
+            }.items()
+            if v is not None
+        }
+        try:
+            con = duckdb.connect(database, config=config)
+        except duckdb.IOException:
+            warnings.warn(f"Database {database} is locked, using in-memory")
+            con = duckdb.connect(":memory:", config=config)
+        # table macro reading processed trips with datetime attributes
+        con.sql(tdt.get_trips_macro_sql())
+        _CONNECTION.update({"con": con, "data_dir": data_dir, "views": {}})
+    _CONNECTION["views"] = register_datasets(
+        _CONNECTION["con"], _CONNECTION["views"], _CONNECTION["data_dir"]
+    )
+    return _CONNECTION["con"]
+
+
+def get_parsed_sql(
+    con: duckdb.DuckDBPyConnection, query: str
+) -> Optional[Dict]:
+    """Get parse tree of single SELECT statement, or None if not possible."""
+    parsed = json.loads(
+        con.execute(
+            "SELECT json_serialize_sql(?::VARCHAR)", [query]
+        ).fetchone()[0]
+    )
+    if parsed["error"] or len(parsed["statements"]) != 1:
+        return None
+    return parsed["statements"][0]
+
+
+def get_sql_constants(node: Any) -> List[str]:
+    """Get string constants in parse tree node."""
+    if isinstance(node, dict):
+        if node.get("class") == "CONSTANT" and isinstance(
+            node["value"].get("value"), str
+        ):
+            return [node["value"]["value"]]
+        return [c for v in node.values() for c in get_sql_constants(v)]
+    if isinstance(node, list):
+        return [c for v in node for c in get_sql_constants(v)]
+    return []
+
+
+def walk_sql_tree(node: Any) -> Iterator[Dict]:
+    """Get every (dictionary) node of parse tree, depth-first."""
+    if isinstance(node, dict):
+        yield node
+        children = node.values()
+    elif isinstance(node, list):
+        children = node
+    else:
+        return
+    for v in children:
+        yield from walk_sql_tree(v)
+
+
+def get_sql_references(tree: Any) -> Tuple[Set[str], Set[str]]:
+    """Get tables and files (or glob patterns) referenced in parse tree."""
+    tables, ctes, files = set(), set(), set()
+    for node in walk_sql_tree(tree):
+        if node.get("type") == "BASE_TABLE":
+            tables.add(node["table_name"])
+        elif node.get("type") == "TABLE_FUNCTION" and (
+            node["function"]["function_name"] in FILE_TABLE_FUNCTIONS
+        ):
+            files.update(get_sql_constants(node["function"]["children"]))
+        if "cte_map" in node:
+            ctes.update(c["key"] for c in node["cte_map"]["map"])
+    return tables - ctes, files
+
+
+def get_view_definitions(
+    con: duckdb.DuckDBPyConnection, tables: Set[str]
+) -> Dict[str, str]:
+    """Get SQL of views, and of the views that these views read from."""
+    views = dict(
+        con.execute(
+            "SELECT view_name, sql FROM duckdb_views() WHERE NOT internal"
+        ).fetchall()
+    )
+    definitions, pending = {}, [t for t in tables if t in views]
+    while pending:
+        name = pending.pop()
+        if name not in definitions:
+            definitions[name] = views[name]
+            pending.extend(
+                set(re.findall(r"\b\w+\b", views[name])) & set(views)
+            )
+    return dict(sorted(definitions.items()))
+
+
+def get_file_fingerprints(patterns: List[str]) -> Dict[str, List[int]]:
+    """Get size and modification time of all files matching glob patterns."""
+    fingerprints = {}
+    for pattern in sorted(patterns):
+        for f in sorted(glob(pattern)):
+            stat = os.stat(f)
+            fingerprints[os.path.abspath(f)] = [stat.st_size, stat.st_mtime_ns]
+    return fingerprints
+
+
+def get_cache_key(
+    con: duckdb.DuckDBPyConnection, query: str, views: Dict[str, List[str]]
+) -> Optional[str]:
+    """Get key of query in result cache, or None if query cannot be cached.
+
+    A query can be cached if it is a single SELECT statement that only reads
+    from views over datasets and from files. The key is a hash of the parse
+    tree of the query (without whitespace and comments), the definitions of
+    the views that the query reads from (eg. the datatypes of processed
+    trips, see trips_schema) and the size and modification time of every
+    file that the query reads from.
+    """
+    tree = get_parsed_sql(con, query)
+    if tree is None:
+        return None
+    tables, patterns = get_sql_references(tree)
+    if not tables <= set(views):
+        return None
+    patterns |= {f for t in tables for f in views[t]}
+    normalized_sql = re.sub(r'"query_location": \d+, ', "", json.dumps(tree))
+    key_data = json.dumps(
+        [
+            normalized_sql,
+            get_view_definitions(con, tables),
+            get_file_fingerprints(patterns),
+        ]
+    )
+    return hashlib.sha256(key_data.encode()).hexdigest()[:32]
+
+
+def load_cache_index(cache_dir: str) -> Dict[str, Dict]:
+    """Load filepath, size and time of last use of every cached result."""
+    fpath = os.path.join(cache_dir, CACHE_INDEX_FNAME)
+    if not os.path.exists(fpath):
+        return {}
+    with open(fpath) as f:
+        return json.load(f)
+
+
+def save_cache_index(
+    cache_dir: str,
+    index: Dict[str, Dict],
+    max_entries: int = 256,
+    max_bytes: int = 2 * 1024**3,
+) -> Dict[str, Dict]:
+    """Evict least recently used results beyond cache limits, and save."""
+    total_bytes = sum(v["bytes"] for v in index.values())
+    for key in sorted(index, key=lambda k: index[k]["last_used"]):
+        if len(index) <= max_entries and total_bytes <= max_bytes:
+            break
+        entry = index.pop(key)
+        total_bytes -= entry["bytes"]
+        if os.path.exists(entry["fpath"]):
+            os.remove(entry["fpath"])
+    with open(os.path.join(cache_dir, CACHE_INDEX_FNAME), "w") as f:
+        json.dump(index, f, indent=2)
+    return index
+
+
+def register_caller_frames(
+    con: duckdb.DuckDBPyConnection,
+    query: str,
+    frame_vars: Dict[str, Any],
+    views: Dict[str, List[str]],
+) -> List[str]:
+    """Register DataFrames from caller's namespace that are used in query."""
+    names = [
+        name
+        for name in set(re.findall(r"\b[A-Za-z_]\w*\b", query))
+        if name not in views
+        and isinstance(frame_vars.get(name), (pd.DataFrame, pa.Table))
+    ]
+    for name in names:
+        con.register(name, frame_vars[name])
+    return names
+
+
+def run_sql_query(
+    query: str,
+    verbose: bool = False,
+    cache: bool = True,
+    cache_dir: Optional[str] = None,
+    max_entries: int = 256,
+    max_bytes: int = 2 * 1024**3,
+) -> pd.DataFrame:
+    """Run SQL query using the shared DuckDB connection and result cache.
+
+    Parameters
+    ----------
+    query: str
+        SQL query, which can read from views over datasets (eg. trips),
+        from files and from DataFrames in the caller's namespace
+    verbose: bool
+        whether to show the number of rows returned and if it was cached
+    cache: bool
+        whether to look up and store the result in the cache
+    cache_dir: Optional[str]
+        directory in which results are cached, or query_cache in the
+        processed data directory if None
+    max_entries: int
+        maximum number of cached results
+    max_bytes: int
+        maximum size (in bytes) of all cached results
+
+    Returns
+    -------
+    pd.DataFrame
+        result of query
+
+    Notes
+    -----
+    Queries that read from DataFrames are not cached, since DataFrames can
+    change without a change to the query. Queries with non-deterministic
+    functions (eg. random() or now()) should be run with cache=False.
+    """
+    con = get_connection()
+    views = _CONNECTION["views"]
+    cache_dir = cache_dir or os.path.join(
+        _CONNECTION["data_dir"], "processed", "query_cache"
+    )
+    caller = inspect.currentframe().f_back
+    frame_vars = {**caller.f_globals, **caller.f_locals}
+    del caller
+    names = register_caller_frames(con, query, frame_vars, views)
+    key = get_cache_key(con, query, views) if cache and not names else None
+    index = load_cache_index(cache_dir) if key else {}
+
+    if key in index and os.path.exists(index[key]["fpath"]):
+        df_query = pd.read_parquet(index[key]["fpath"])
+        index[key]["last_used"] = time.time()
+        save_cache_index(cache_dir, index, max_entries, max_bytes)
+        is_cached = True
+    else:
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", FutureWarning)
+                df_query = con.sql(query).df()
+        finally:
+            for name in names:
+                con.unregister(name)
+        is_cached = False
+        if key:
+            os.makedirs(cache_dir, exist_ok=True)
+            fpath = os.path.join(cache_dir, f"query__{key}.parquet")
+            try:
+                df_query.to_parquet(fpath, index=False)
+                index[key] = {
+                    "fpath": fpath,
+                    "bytes": os.path.getsize(fpath),
+                    "last_used": time.time(),
+                }
+                save_cache_index(cache_dir, index, max_entries, max_bytes)
+            except (pa.ArrowException, ValueError):
+                pass
+    if verbose:
+        print(
+            f"Query returned {len(df_query):,} rows"
+            + (" (cached)" if is_cached else "")
+        )
+    return df_query
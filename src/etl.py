@@ -0,0 +1,736 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define ETL pipeline to process raw bike share ridership data."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import argparse
+import gc
+import os
+import pickle  # nosec
+import tracemalloc
+from functools import partial
+from glob import glob
+from typing import Dict, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+from contexttimer import Timer
+
+import calendar_dimension as cd
+import clean as cl
+import file_utils as flut
+import instrumentation as instr
+import parallel_utils as plu
+import read
+import sketches as sk
+import station_dimension as stdim
+import trip_datetimes as tdt
+import trip_dedup as tdd
+import trip_quality as tq
+import trips_layout as tl
+import trips_schema as ts
+
+# estimated peak memory of the ETL pipeline, per byte of raw CSV file, by
+# layout era (columns are read with the python engine, as pandas string
+# dtypes and, for October 2020, entirely as strings before being re-typed)
+ETL_MEMORY_PER_CSV_BYTE = {
+    "2018": 6,
+    "2019": 6,
+    "2020": 6,
+    "2020-10": 9,
+    "2021": 7,
+    "2022": 6,
+    "2023": 7,
+}
+# memory used by a worker process before it reads any data
+ETL_WORKER_MEMORY = 250 * 1024**2
+# modules preloaded by the server process from which workers are forked (see
+# parallel_utils.run_memory_aware), which import every dependency of the ETL
+# pipeline and none of the dependencies of notebooks
+ETL_WORKER_MODULES = ["etl"]
+
+
+def get_year_period(f: str) -> List[str]:
+    """Get year and period (month or quarter) of raw trips file."""
+    fname = os.path.basename(f)
+    if "2018" not in f:
+        period, year = [
+            f[-6:].replace(".csv", ""),
+            f[-11:].replace(".csv", "").split("-")[0],
+        ]
+    else:
+        yq = fname.split("Ridership_Q")[-1]
+        period, year = yq.split(" ")
+        year = year.split(".")[0]
+        period = "Q" + period
+    return [year, period]
+
+
+def get_max_trip_duration(year: str, period: str, buffer_mins: int) -> int:
+    """Get longest allowed trip duration (in seconds) during a period."""
+    if int(year) <= 2020:
+        max_duration = (30 + buffer_mins) * 60
+    elif int(year) == 2021:
+        if period in ["01", "02", "03", "04", "05", "06"]:
+            max_duration = (30 + buffer_mins) * 60
+        else:
+            max_duration = (45 + buffer_mins) * 60
+    elif int(year) == 2022:
+        max_duration = (45 + buffer_mins) * 60
+    else:
+        assert int(year) == 2023
+        if period in ["01", "02", "03"]:
+            max_duration = (45 + buffer_mins) * 60
+        else:
+            max_duration = (90 + buffer_mins) * 60
+    return max_duration
+
+
+def estimate_etl_memory(f: str) -> int:
+    """Estimate peak memory (in bytes) needed to process raw trips file."""
+    year, period = get_year_period(f)
+    era = f"{year}-{period}" if year == "2020" and period == "10" else year
+    memory_per_byte = ETL_MEMORY_PER_CSV_BYTE.get(
+        era, max(ETL_MEMORY_PER_CSV_BYTE.values())
+    )
+    return ETL_WORKER_MEMORY + memory_per_byte * os.path.getsize(f)
+
+
+def export_etl_frame(df: pd.DataFrame, fpath: str) -> str:
+    """Export trips to uncompressed Arrow IPC file next to Parquet file."""
+    fpath_ipc = fpath.replace(".parquet.gzip", ".arrow")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.ipc.new_file(fpath_ipc, table.schema) as writer:
+        writer.write_table(table)
+    return fpath_ipc
+
+
+def read_etl_frame(fpath_ipc: str) -> pd.DataFrame:
+    """Read trips from memory-mapped Arrow IPC file."""
+    with pa.memory_map(fpath_ipc) as source:
+        df = pa.ipc.open_file(source).read_all().to_pandas()
+    return df
+
+
+def run_trips_etl_pipeline(
+    f: str,
+    processed_data_dir: str,
+    cols_to_drop: List[str],
+    buffer_mins: int = 5,
+    frames: Optional[str] = None,
+    bloom_filters: bool = False,
+    export_raw: bool = True,
+    trace_memory: bool = False,
+) -> Dict[str, Union[str, int, float, pd.DataFrame]]:
+    """Run ETL to load and process raw bike share ridership data.
+
+    Parameters
+    ----------
+    f: str
+        filepath to raw (monthly or quarterly) trips CSV file
+    processed_data_dir: str
+        directory to which processed trips are exported
+    cols_to_drop: List[str]
+        columns to be dropped from processed trips
+    buffer_mins: int
+        buffer (in minutes) added to longest allowed trip duration
+    frames: Optional[str]
+        how raw and processed trips are returned, in addition to the
+        filepaths of the exported trips (see Notes)
+    bloom_filters: bool
+        whether to write bloom filters of station IDs of processed trips
+    export_raw: bool
+        whether to export a copy of raw trips (monthly data-quality metrics
+        of raw trips are exported with processed trips in either case, see
+        trip_quality)
+    trace_memory: bool
+        whether to record peak memory traced by tracemalloc of every stage,
+        which slows down the pipeline
+
+    Returns
+    -------
+    Dict[str, Union[str, int, float, pd.DataFrame]]
+        summary counts of raw and processed trips, filepaths of exported
+        trips (raw_fpath is None if raw trips are not exported) and records
+        of the stages of the pipeline (see instrumentation.stage)
+
+    Notes
+    -----
+    By default (frames=None), only summary counts and filepaths are returned
+    so that the output is cheap to send from a worker process back to the
+    parent process. Trips can be returned with
+    1. frames='pickle', as DataFrames (the "raw_data" and "data" keys), which
+       are pickled when sent to the parent process
+    2. frames='arrow', as filepaths to uncompressed Arrow IPC files (the
+       "raw_data_ipc" and "data_ipc" keys), which can be memory-mapped by
+       the parent process with read_etl_frame
+    """
+    fname = os.path.basename(f)
+    year, period = get_year_period(f)
+
+    with instr.pipeline("etl_pipeline", fname, trace_memory) as (stages, run):
+        # EXTRACT and TRANSFORM
+        with Timer() as t:
+            with instr.stage("read_csv") as s:
+                df = (
+                    # 1. read monthly CSV file
+                    read.read_csv_file(
+                        *read.get_read_csv_inputs(f), "%m/%d/%Y %H:%M"
+                    )
+                    # 2. clean column names
+                    .rename(
+                        mapper=lambda x: (
+                            (
+                                x.lower()
+                                .replace("  ", " ")
+                                .replace(" ", "_")
+                                .replace("__", "_")
+                            )
+                        ),
+                        axis="columns",
+                    )
+                )
+                # 3. standardize column names across different years
+                if year != "2018":
+                    df = df.rename(
+                        columns={
+                            "start_time": "started_at",
+                            "end_time": "ended_at",
+                        }
+                    )
+                else:
+                    df = df.rename(
+                        columns={
+                            "to_station_name": "end_station_name",
+                            "to_station_id": "end_station_id",
+                            "from_station_name": "start_station_name",
+                            "from_station_id": "start_station_id",
+                            "trip_start_time": "started_at",
+                            "trip_stop_time": "ended_at",
+                            "trip_duration_seconds": "trip_duration",
+                        }
+                    ).assign(bike_id=lambda df: None)
+                s["rows_out"] = len(df)
+
+            # 4. remove trips that are longer than allowed
+            max_duration = get_max_trip_duration(year, period, buffer_mins)
+            with instr.stage("filter_duration", rows_in=len(df)) as s:
+                df_valid = (
+                    df
+                    # extract trip duration
+                    .assign(
+                        trip_duration=lambda df: (
+                            df["ended_at"] - df["started_at"]
+                        ).dt.total_seconds()
+                    )
+                    # filter out longer-than-allowed trips
+                    .query(
+                        f"(trip_duration > 60) & "
+                        f"(trip_duration <= {max_duration})"
+                    )
+                    # drop unwanted columns
+                    .drop(columns=cols_to_drop)
+                )
+                s["rows_out"] = len(df_valid)
+
+            # 5. drop trips with missing values in start & end station ID
+            # columns
+            with instr.stage(
+                "drop_missing_stations", rows_in=len(df_valid)
+            ) as s:
+                df_no_nans = df_valid.dropna(
+                    subset=["start_station_id"]
+                ).dropna(subset=["end_station_id"])
+                s["rows_out"] = len(df_no_nans)
+
+            # 6. clean station names (datetime attributes, such as
+            # started_at_year, are derived from start and end times when
+            # needed, see trip_datetimes)
+            with instr.stage(
+                "clean_station_names", rows_in=len(df_no_nans)
+            ) as s:
+                df_proc = df_no_nans.pipe(
+                    cl.clean_status_station_names, ["start_station_name"]
+                ).pipe(cl.clean_status_station_names, ["end_station_name"])
+                s["rows_out"] = len(df_proc)
+            # 7. add UTC offsets of start and end times, so that local times
+            # during daylight saving time transitions are not ambiguous
+            with instr.stage("utc_offsets", rows_in=len(df_proc)) as s:
+                df_proc = df_proc.pipe(tdt.assign_utc_offsets)
+                s["rows_out"] = len(df_proc)
+            # 8. cast to compact datatypes of processed trips
+            with instr.stage("apply_schema", rows_in=len(df_proc)) as s:
+                df_proc = df_proc.pipe(ts.apply_trips_schema)
+                s["rows_out"] = len(df_proc)
+
+        # Post-Processing - get duplicated trips
+        df_dup_trips = df_proc.loc[
+            df_proc.duplicated(
+                subset=[
+                    "trip_id",
+                    "start_station_id",
+                    "started_at",
+                    "end_station_id",
+                    "ended_at",
+                ]
+            )
+        ]
+
+        # LOAD
+        # 9. export processed data to disk, sorted by station and start time
+        # (see trips_layout), with station names stored separately (see
+        # station_dimension)
+        with instr.stage("write_processed", rows_in=len(df_proc)):
+            fname_prefix = f"processed__trips_{year}_{period}"
+            proc_fpath = tl.write_processed_trips(
+                df_proc.drop(columns=stdim.STATION_NAME_COLUMNS),
+                flut.get_export_fpath(processed_data_dir, fname_prefix),
+                bloom_filters=bloom_filters,
+            )
+            stations_fpath = stdim.get_station_names_fpath(proc_fpath)
+            stdim.get_station_names(df_proc).to_parquet(
+                stations_fpath, compression="gzip", index=False
+            )
+        # 10. export monthly data-quality metrics of raw and processed data
+        with instr.stage("trips_quality", rows_in=len(df)):
+            quality_fpath = tq.get_quality_fpath(proc_fpath)
+            tq.get_trips_quality(df, df_proc).to_parquet(
+                quality_fpath, compression="gzip", index=False
+            )
+        raw_fpath = None
+        if export_raw:
+            with instr.stage("write_raw", rows_in=len(df)):
+                fname_prefix = f"raw__trips_{year}_{period}"
+                raw_fpath = df.pipe(
+                    flut.load, processed_data_dir, fname_prefix
+                )
+        # 11. export mergeable sketches of processed data, for approximate
+        # metrics
+        with instr.stage("trip_sketches", rows_in=len(df_proc)):
+            sketch_fpath = sk.build_trip_sketches(proc_fpath)
+
+        if frames == "pickle":
+            frames_dict = {"raw_data": df, "data": df_proc}
+        elif frames == "arrow":
+            frames_dict = {
+                "raw_data_ipc": export_etl_frame(
+                    df, proc_fpath.replace("processed__", "raw__")
+                ),
+                "data_ipc": export_etl_frame(df_proc, proc_fpath),
+            }
+        else:
+            assert frames is None, f"Unknown frames: {frames}"
+            frames_dict = {}
+        run["rows_in"], run["rows_out"] = len(df), len(df_proc)
+    return {
+        **frames_dict,
+        "file": fname,
+        "raw_fpath": raw_fpath,
+        "proc_fpath": proc_fpath,
+        "stations_fpath": stations_fpath,
+        "quality_fpath": quality_fpath,
+        "sketch_fpath": sketch_fpath,
+        "year": year,
+        "period": period,
+        "buffer_mins": buffer_mins,
+        "raw": len(df),
+        "raw_casual": len(df.query("user_type == 'Casual Member'")),
+        "raw_annual": len(df.query("user_type == 'Annual Member'")),
+        "nans": len(df) - len(df_no_nans),
+        "valid_trip_length": len(df_valid),
+        "proc": len(df_proc),
+        "proc_casual": len(df_proc.query("user_type == 'Casual Member'")),
+        "proc_annual": len(df_proc.query("user_type == 'Annual Member'")),
+        "raw_bikes": df["bike_id"].dropna().nunique(),
+        "proc_bikes": df_proc["bike_id"].dropna().nunique(),
+        "duplicated": len(df_dup_trips),
+        "etl_seconds": t.elapsed,
+        "stages": stages,
+    }
+
+
+def run_trips_etl(
+    fpaths: List[str],
+    processed_data_dir: str,
+    cols_to_drop: List[str] = ["trip_duration"],
+    buffer_mins: int = 5,
+    max_workers: Optional[int] = None,
+    memory_limit: Optional[int] = None,
+    frames: Optional[str] = None,
+    deduplicate: bool = True,
+    bloom_filters: bool = False,
+    export_raw: bool = True,
+    trace_memory: bool = False,
+    verbose: bool = False,
+) -> List[Dict[str, Union[str, int, float, pd.DataFrame]]]:
+    """Run ETL pipeline on raw trips files, scheduled by estimated memory.
+
+    Parameters
+    ----------
+    fpaths: List[str]
+        filepaths to raw (monthly or quarterly) trips CSV files
+    processed_data_dir: str
+        directory to which processed trips are exported
+    cols_to_drop: List[str]
+        columns to be dropped from processed trips
+    buffer_mins: int
+        buffer (in minutes) added to longest allowed trip duration
+    max_workers: Optional[int]
+        maximum number of processes, or the number of CPUs if None
+    memory_limit: Optional[int]
+        memory (in bytes) shared by all processes, or 80% of the available
+        memory if None
+    frames: Optional[str]
+        how raw and processed trips are returned (None, 'pickle' or 'arrow',
+        see run_trips_etl_pipeline)
+    deduplicate: bool
+        whether to remove trips with trip IDs that are duplicated within, or
+        across, processed trips files (see trip_dedup.deduplicate_trips)
+    bloom_filters: bool
+        whether to write bloom filters of station IDs of processed trips
+    export_raw: bool
+        whether to export a copy of raw trips of every file
+    trace_memory: bool
+        whether to record peak memory traced by tracemalloc of every stage
+    verbose: bool
+        whether to show the memory budget and number of processes, and the
+        summary of the run log of stages (see add_run_log)
+
+    Returns
+    -------
+    List[Dict[str, Union[str, int, float, pd.DataFrame]]]
+        outputs of the ETL pipeline, in the same order as the files
+    """
+    fn = partial(
+        run_trips_etl_pipeline,
+        processed_data_dir=processed_data_dir,
+        cols_to_drop=cols_to_drop,
+        buffer_mins=buffer_mins,
+        frames=frames,
+        bloom_filters=bloom_filters,
+        export_raw=export_raw,
+        trace_memory=trace_memory,
+    )
+    outputs = plu.run_memory_aware(
+        fn,
+        fpaths,
+        {f: estimate_etl_memory(f) for f in fpaths},
+        max_workers=max_workers,
+        memory_limit=memory_limit,
+        preload=ETL_WORKER_MODULES,
+        verbose=verbose,
+    )
+    with instr.collect() as stages:
+        if deduplicate:
+            outputs = add_deduplicated_trips(
+                outputs, processed_data_dir, verbose
+            )
+        add_station_dimension(outputs, fpaths, processed_data_dir, verbose)
+        add_calendar_dimension(outputs, fpaths, processed_data_dir, verbose)
+    add_run_log(outputs, stages, processed_data_dir, "etl", verbose)
+    return outputs
+
+
+def add_run_log(
+    outputs: List[Dict[str, Union[str, int, float, pd.DataFrame]]],
+    stages: List[Dict],
+    processed_data_dir: str,
+    name: str,
+    verbose: bool = False,
+) -> List[Dict[str, Union[str, int, float, pd.DataFrame]]]:
+    """Export run log of stages run by workers and by the parent process.
+
+    Records of stages are removed from the outputs of workers, and replaced
+    by the filepath to the run log (see instrumentation.write_run_log).
+    """
+    if not outputs:
+        return outputs
+    records = [r for o in outputs for r in o.pop("stages", [])] + stages
+    fpath = instr.write_run_log(records, processed_data_dir, name)
+    for o in outputs:
+        o["run_log_fpath"] = fpath
+    if verbose:
+        df_summary = instr.get_run_summary(pd.read_parquet(fpath))
+        print(df_summary.round(3).to_string(index=False))
+    return outputs
+
+
+@instr.instrument()
+def add_station_dimension(
+    outputs: List[Dict[str, Union[str, int, float, pd.DataFrame]]],
+    fpaths: List[str],
+    processed_data_dir: str,
+    verbose: bool = False,
+) -> List[Dict[str, Union[str, int, float, pd.DataFrame]]]:
+    """Re-build station dimension from names of stations used in trips.
+
+    Station attributes are taken from the most recent station information
+    file found next to the raw trips files.
+    """
+    if not outputs:
+        return outputs
+    fpaths_info = sorted(
+        glob(os.path.join(os.path.dirname(fpaths[0]), "stations_info__*"))
+    )
+    fpath = stdim.build_station_dimension(
+        processed_data_dir,
+        fpaths_info[-1] if fpaths_info else None,
+        verbose,
+    )
+    for o in outputs:
+        o["station_dimension_fpath"] = fpath
+    return outputs
+
+
+@instr.instrument()
+def add_calendar_dimension(
+    outputs: List[Dict[str, Union[str, int, float, pd.DataFrame]]],
+    fpaths: List[str],
+    processed_data_dir: str,
+    verbose: bool = False,
+) -> List[Dict[str, Union[str, int, float, pd.DataFrame]]]:
+    """Re-build calendar dimension covering all years of processed trips.
+
+    Daily weather and public holidays are taken from the most recent files
+    found next to the raw trips files.
+    """
+    if not outputs:
+        return outputs
+    raw_dir = os.path.dirname(fpaths[0])
+    fpaths_weather, fpaths_holidays = [
+        sorted(glob(os.path.join(raw_dir, f"{prefix}__*")))
+        for prefix in ["daily_weather", "holidays"]
+    ]
+    fpath = cd.build_calendar_dimension(
+        processed_data_dir,
+        fpaths_weather[-1] if fpaths_weather else None,
+        fpaths_holidays[-1] if fpaths_holidays else None,
+        verbose,
+    )
+    for o in outputs:
+        o["calendar_dimension_fpath"] = fpath
+    return outputs
+
+
+@instr.instrument()
+def add_deduplicated_trips(
+    outputs: List[Dict[str, Union[str, int, float, pd.DataFrame]]],
+    processed_data_dir: str,
+    verbose: bool = False,
+) -> List[Dict[str, Union[str, int, float, pd.DataFrame]]]:
+    """Remove duplicated trips from processed files, and count them.
+
+    Sketches of processed files from which trips were removed are re-built.
+    """
+    df_dedup = tdd.deduplicate_trips(
+        [o["proc_fpath"] for o in outputs], processed_data_dir, verbose
+    )
+    removed = dict(zip(df_dedup["file"], df_dedup["duplicated_trips_removed"]))
+    for o in outputs:
+        o["duplicated_trips_removed"] = removed.get(
+            os.path.basename(o["proc_fpath"]), 0
+        )
+        if o["duplicated_trips_removed"] > 0:
+            o["sketch_fpath"] = sk.build_trip_sketches(o["proc_fpath"])
+    return outputs
+
+
+def get_summary(
+    outputs: List[Dict[str, Union[str, int, float, pd.DataFrame]]]
+) -> pd.DataFrame:
+    """Get summary of processed trips, with one row per raw trips file."""
+    df = pd.DataFrame.from_records(
+        [
+            {k: v for k, v in o.items() if not isinstance(v, pd.DataFrame)}
+            for o in outputs
+        ]
+    )
+    return df
+
+
+def benchmark_etl_results(
+    fpaths: List[str],
+    processed_data_dir: str,
+    frames_options: List[Optional[str]] = ["pickle", None, "arrow"],
+    max_workers: Optional[int] = None,
+    memory_limit: Optional[int] = None,
+) -> pd.DataFrame:
+    """Compare parent process memory and runtime of ETL output contracts.
+
+    Parameters
+    ----------
+    fpaths: List[str]
+        filepaths to raw (monthly or quarterly) trips CSV files
+    processed_data_dir: str
+        directory to which processed trips are exported
+    frames_options: List[Optional[str]]
+        how raw and processed trips are returned by the ETL pipeline (see
+        run_trips_etl_pipeline)
+    max_workers: Optional[int]
+        maximum number of processes, or the number of CPUs if None
+    memory_limit: Optional[int]
+        memory (in bytes) shared by all processes, or 80% of the available
+        memory if None
+
+    Returns
+    -------
+    pd.DataFrame
+        runtime, size of outputs and memory of parent process, per option
+
+    Notes
+    -----
+    Peak memory allocated by the parent process is traced with tracemalloc,
+    which includes buffers of DataFrames that are un-pickled from worker
+    processes. Resident memory of the parent process is measured after the
+    ETL pipeline has run, while its outputs are still held in memory.
+    Trips exported by all but the last run are deleted.
+    """
+    records = []
+    for frames in frames_options:
+        gc.collect()
+        rss_before = plu.get_process_memory()
+        tracemalloc.start()
+        with Timer() as t:
+            outputs = run_trips_etl(
+                fpaths,
+                processed_data_dir,
+                max_workers=max_workers,
+                memory_limit=memory_limit,
+                frames=frames,
+            )
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        records.append(
+            {
+                "frames": frames or "none",
+                "files": len(fpaths),
+                "seconds": t.elapsed,
+                "outputs_pickled_mb": (
+                    len(pickle.dumps(outputs, pickle.HIGHEST_PROTOCOL))
+                    / 1024**2
+                ),
+                "parent_peak_traced_mb": peak_traced / 1024**2,
+                "parent_rss_increase_mb": (
+                    plu.get_process_memory() - rss_before
+                )
+                / 1024**2,
+            }
+        )
+        # keep exported trips from the last run only
+        is_last_run = len(records) == len(frames_options)
+        for o in outputs:
+            keys = ["raw_data_ipc", "data_ipc"]
+            if not is_last_run:
+                keys += [
+                    "raw_fpath",
+                    "proc_fpath",
+                    "stations_fpath",
+                    "quality_fpath",
+                    "sketch_fpath",
+                ]
+            for k in keys:
+                if o.get(k):
+                    os.remove(o[k])
+        del outputs
+    df = pd.DataFrame.from_records(records)
+    return df
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Process raw bike share ridership data."
+    )
+    parser.add_argument(
+        "--raw-data-dir",
+        default=os.path.join("data", "raw", "systems", "toronto"),
+        help="directory containing raw trips CSV files",
+    )
+    parser.add_argument(
+        "--processed-data-dir",
+        default=os.path.join("data", "processed"),
+        help="directory to which processed trips are exported",
+    )
+    parser.add_argument(
+        "--buffer-mins",
+        type=int,
+        default=5,
+        help="buffer (in minutes) added to longest allowed trip duration",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=None,
+        help="maximum number of processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--memory-limit-gb",
+        type=float,
+        default=None,
+        help="memory shared by all processes (default: 80%% of available)",
+    )
+    parser.add_argument(
+        "--skip-raw",
+        action="store_true",
+        help="do not export a copy of raw trips of every file",
+    )
+    parser.add_argument(
+        "--bloom-filters",
+        action="store_true",
+        help="write bloom filters of station IDs of processed trips",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="record peak memory traced by tracemalloc of every stage",
+    )
+    parser.add_argument(
+        "--benchmark-results",
+        action="store_true",
+        help="compare parent memory and runtime of ETL output contracts",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Run ETL pipeline on all raw trips files."""
+    args = parse_args()
+    fpaths = sorted(glob(os.path.join(args.raw_data_dir, "*.csv")))
+    memory_limit = (
+        int(args.memory_limit_gb * 1024**3) if args.memory_limit_gb else None
+    )
+    if args.benchmark_results:
+        df_benchmark = benchmark_etl_results(
+            fpaths,
+            args.processed_data_dir,
+            max_workers=args.max_workers,
+            memory_limit=memory_limit,
+        )
+        print(df_benchmark.round(3).to_string(index=False))
+        return
+    with Timer() as t:
+        outputs = run_trips_etl(
+            fpaths,
+            args.processed_data_dir,
+            buffer_mins=args.buffer_mins,
+            max_workers=args.max_workers,
+            memory_limit=memory_limit,
+            bloom_filters=args.bloom_filters,
+            export_raw=not args.skip_raw,
+            trace_memory=args.trace_memory,
+            verbose=True,
+        )
+    df_summary = get_summary(outputs)
+    print(
+        f"Processed {df_summary['proc'].sum():,} of "
+        f"{df_summary['raw'].sum():,} trips from {len(fpaths):,} files in "
+        f"{t.elapsed:.3f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
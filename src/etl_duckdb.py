@@ -0,0 +1,707 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define out-of-core ETL pipeline to process raw trips using DuckDB."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import argparse
+import codecs
+import os
+import shutil
+import tempfile
+from glob import glob
+from typing import Dict, List, Optional, Union
+
+import duckdb
+import pandas as pd
+from contexttimer import Timer
+from tqdm import tqdm
+
+import clean as cl
+import etl
+import file_utils as flut
+import instrumentation as instr
+import sketches as sk
+import station_dimension as stdim
+import trip_datetimes as tdt
+import trip_quality as tq
+import trips_layout as tl
+import trips_schema as ts
+
+# columns of raw trips files (in the order found in the files) with the names
+# and datatypes used for raw trips exported by the ETL pipeline
+RAW_COLUMNS = {
+    "trip_id": "BIGINT",
+    "trip_duration": "BIGINT",
+    "start_station_id": "INTEGER",
+    "started_at": "TIMESTAMP",
+    "start_station_name": "VARCHAR",
+    "end_station_id": "INTEGER",
+    "ended_at": "TIMESTAMP",
+    "end_station_name": "VARCHAR",
+    "bike_id": "BIGINT",
+    "user_type": "VARCHAR",
+}
+RAW_COLUMNS_2018 = {
+    "trip_id": "BIGINT",
+    "started_at": "TIMESTAMP",
+    "ended_at": "TIMESTAMP",
+    "trip_duration": "BIGINT",
+    "start_station_id": "INTEGER",
+    "start_station_name": "VARCHAR",
+    "end_station_id": "INTEGER",
+    "end_station_name": "VARCHAR",
+    "user_type": "VARCHAR",
+}
+# column names in the header of raw trips files
+RAW_HEADER = [
+    "Trip Id",
+    "Trip  Duration",
+    "Start Station Id",
+    "Start Time",
+    "Start Station Name",
+    "End Station Id",
+    "End Time",
+    "End Station Name",
+    "Bike Id",
+    "User Type",
+]
+RAW_HEADER_2018 = [
+    "trip_id",
+    "trip_start_time",
+    "trip_stop_time",
+    "trip_duration_seconds",
+    "from_station_id",
+    "from_station_name",
+    "to_station_id",
+    "to_station_name",
+    "user_type",
+]
+# columns used to find duplicated processed trips (station names are not
+# stored with processed trips)
+DUPLICATE_SUBSET = [
+    "trip_id",
+    "start_station_id",
+    "started_at",
+    "end_station_id",
+    "ended_at",
+]
+
+
+def get_csv_layout(year: str, period: str) -> Dict[str, Union[str, Dict]]:
+    """Get header, column datatypes and encoding of raw trips file."""
+    layout = {
+        "header": RAW_HEADER if year != "2018" else RAW_HEADER_2018,
+        "columns": RAW_COLUMNS if year != "2018" else RAW_COLUMNS_2018,
+        # as in read.read_csv_file, files from 2021 and 2023 are decoded
+        # with unicode_escape, which is the encoding that the station name
+        # cleaning rules were written for
+        "encoding": (
+            "unicode_escape" if year in ["2021", "2023"] else "utf-8"
+        ),
+        # October 2020 contains rows with mis-aligned columns, which are
+        # read as strings and dropped before columns are re-typed
+        "all_varchar": year == "2020" and period == "10",
+    }
+    return layout
+
+
+def transcode_to_utf8(
+    fpath: str, fpath_utf8: str, encoding: str, chunk_size: int = 2**20
+) -> str:
+    """Re-encode text file as UTF-8, reading one chunk at a time."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    with open(fpath, "rb") as fi, open(
+        fpath_utf8, "w", encoding="utf-8", newline=""
+    ) as fo:
+        while chunk := fi.read(chunk_size):
+            fo.write(decoder.decode(chunk))
+        fo.write(decoder.decode(b"", final=True))
+    return fpath_utf8
+
+
+def check_csv_header(fpath: str, header: List[str]) -> None:
+    """Verify that header of UTF-8 encoded CSV file matches the layout."""
+    with open(fpath, encoding="utf-8-sig") as f:
+        columns = f.readline().strip().split(",")
+    # byte order marks decoded with unicode_escape are not removed by the
+    # utf-8-sig codec
+    columns[0] = columns[0].replace("ï»¿", "")
+    assert columns == header, f"Unexpected columns {columns} in {fpath}"
+
+
+def get_raw_trips_sql(fpath: str, layout: Dict[str, Union[str, Dict]]) -> str:
+    """Get SQL to read and type raw trips from UTF-8 encoded CSV file."""
+    columns = {
+        c: ("VARCHAR" if layout["all_varchar"] else dtype)
+        for c, dtype in layout["columns"].items()
+    }
+    source = f"""
+        read_csv(
+            '{fpath}',
+            header=true,
+            auto_detect=false,
+            delim=',',
+            quote='"',
+            escape='"',
+            columns={columns},
+            timestampformat='%m/%d/%Y %H:%M'
+        )
+        """  # nosec
+    if layout["all_varchar"]:
+        selected = [
+            (
+                f"strptime({c}, '%m/%d/%Y %H:%M') AS {c}"
+                if dtype == "TIMESTAMP"
+                else f"CAST({c} AS {dtype}) AS {c}"
+            )
+            for c, dtype in RAW_COLUMNS.items()
+        ]
+        where = "WHERE length(start_station_id) <= 4"
+    else:
+        selected = [
+            c if c in layout["columns"] else f"CAST(NULL AS {dtype}) AS {c}"
+            for c, dtype in RAW_COLUMNS.items()
+        ]
+        where = ""
+    query = f"""
+            SELECT {', '.join(selected)}
+            FROM {source}
+            {where}
+            """  # nosec
+    return query
+
+
+def get_processed_trips_sql(
+    fpath_raw: str,
+    max_duration: int,
+    cols_to_drop: List[str],
+    years: List[int],
+) -> str:
+    """Get SQL to filter and clean raw trips.
+
+    Columns are cast to the compact datatypes of processed trips. Datetime
+    attributes are not stored, while UTC offsets of start and end times are
+    derived from the local times at which they change (see trip_datetimes).
+    """
+    columns = {c: c for c in RAW_COLUMNS if c not in cols_to_drop}
+    for c in ["start_station_name", "end_station_name"]:
+        if c in columns:
+            columns[c] = cl.get_clean_station_name_sql(c)
+    columns = {
+        c: f"CAST({expr} AS {ts.get_sql_type(c)}) AS {c}"
+        for c, expr in columns.items()
+    }
+    for c, name in tdt.UTC_OFFSET_COLUMNS.items():
+        columns[name] = f"{tdt.get_utc_offset_sql(c, years)} AS {name}"
+    query = f"""
+            SELECT {', '.join(columns.values())}
+            FROM (
+                SELECT * REPLACE (
+                    epoch(ended_at) - epoch(started_at) AS trip_duration
+                )
+                FROM read_parquet('{fpath_raw}')
+            )
+            WHERE trip_duration > 60
+            AND trip_duration <= {max_duration}
+            AND start_station_id IS NOT NULL
+            AND end_station_id IS NOT NULL
+            """  # nosec
+    return query
+
+
+def get_processed_filter_sql(max_duration: int) -> str:
+    """Get SQL predicate selecting raw trips kept in processed trips."""
+    return f"""
+            epoch(ended_at) - epoch(started_at) > 60
+            AND epoch(ended_at) - epoch(started_at) <= {max_duration}
+            AND start_station_id IS NOT NULL
+            AND end_station_id IS NOT NULL
+            """
+
+
+def get_trips_counts(
+    con: duckdb.DuckDBPyConnection,
+    fpath_raw: str,
+    fpath_proc: str,
+    max_duration: int,
+) -> Dict[str, int]:
+    """Get summary counts of raw and processed trips from exported files."""
+    query_raw = f"""
+                SELECT COUNT(*) AS raw,
+                       COUNT(*) FILTER (
+                           user_type = 'Casual Member'
+                       ) AS raw_casual,
+                       COUNT(*) FILTER (
+                           user_type = 'Annual Member'
+                       ) AS raw_annual,
+                       COUNT(*) FILTER (
+                           epoch(ended_at) - epoch(started_at) > 60
+                           AND epoch(ended_at) - epoch(started_at)
+                           <= {max_duration}
+                       ) AS valid_trip_length,
+                       COUNT(DISTINCT bike_id) AS raw_bikes
+                FROM read_parquet('{fpath_raw}')
+                """  # nosec
+    query_proc = f"""
+                 SELECT COUNT(*) AS proc,
+                        COUNT(*) FILTER (
+                            user_type = 'Casual Member'
+                        ) AS proc_casual,
+                        COUNT(*) FILTER (
+                            user_type = 'Annual Member'
+                        ) AS proc_annual,
+                        COUNT(DISTINCT bike_id) AS proc_bikes,
+                        COUNT(*) - COUNT(
+                            DISTINCT ({', '.join(DUPLICATE_SUBSET)})
+                        ) AS duplicated
+                 FROM read_parquet('{fpath_proc}')
+                 """  # nosec
+    counts = {}
+    for query in [query_raw, query_proc]:
+        rel = con.sql(query)
+        counts.update(dict(zip(rel.columns, rel.fetchone())))
+    counts["nans"] = counts["raw"] - counts["proc"]
+    return counts
+
+
+def run_trips_etl_duckdb_pipeline(
+    f: str,
+    processed_data_dir: str,
+    con: duckdb.DuckDBPyConnection,
+    cols_to_drop: List[str] = ["trip_duration"],
+    buffer_mins: int = 5,
+    temp_dir: Optional[str] = None,
+    bloom_filters: bool = False,
+    export_raw: bool = True,
+) -> Dict[str, Union[str, int, float]]:
+    """Run ETL on single raw trips file using DuckDB.
+
+    Parameters
+    ----------
+    f: str
+        filepath to raw (monthly or quarterly) trips CSV file
+    processed_data_dir: str
+        directory to which raw and processed trips are exported
+    con: duckdb.DuckDBPyConnection
+        connection (with memory limit) used to run the ETL pipeline
+    cols_to_drop: List[str]
+        columns to be dropped from processed trips
+    buffer_mins: int
+        buffer (in minutes) added to longest allowed trip duration
+    temp_dir: Optional[str]
+        directory in which re-encoded CSV files (and raw trips, if they are
+        not exported) are temporarily stored, or the default temporary
+        directory if None
+    bloom_filters: bool
+        whether to set the false-positive probability of bloom filters of
+        processed trips (see trips_layout.get_copy_options_sql)
+    export_raw: bool
+        whether to export a copy of raw trips
+
+    Returns
+    -------
+    Dict[str, Union[str, int, float]]
+        summary counts of raw and processed trips, filepaths of exported
+        trips and records of stages, as returned by
+        etl.run_trips_etl_pipeline
+
+    Notes
+    -----
+    Raw trips are exported with the same datatypes for every year. Raw trips
+    are written (to a temporary file, if they are not exported) before they
+    are processed, so that the CSV file is only parsed once. Monthly
+    data-quality metrics of raw and processed trips are computed in a single
+    scan of raw trips (see trip_quality).
+    """
+    fname = os.path.basename(f)
+    year, period = etl.get_year_period(f)
+    layout = get_csv_layout(year, period)
+    max_duration = etl.get_max_trip_duration(year, period, buffer_mins)
+
+    with instr.pipeline("etl_pipeline", fname) as (stages, run):
+        with tempfile.TemporaryDirectory(dir=temp_dir) as tmp:
+            with Timer() as t:
+                if layout["encoding"] != "utf-8":
+                    with instr.stage("transcode"):
+                        f_utf8 = transcode_to_utf8(
+                            f, os.path.join(tmp, fname), layout["encoding"]
+                        )
+                else:
+                    f_utf8 = f
+                check_csv_header(f_utf8, layout["header"])
+
+                # EXTRACT raw trips, and LOAD them to disk
+                with instr.stage("read_csv"):
+                    raw_fpath = flut.get_export_fpath(
+                        processed_data_dir if export_raw else tmp,
+                        f"raw__trips_{year}_{period}",
+                    )
+                    con.sql(
+                        f"COPY ({get_raw_trips_sql(f_utf8, layout)}) "
+                        f"TO '{raw_fpath}' (FORMAT PARQUET, COMPRESSION GZIP)"
+                    )  # nosec
+
+            # TRANSFORM raw trips, and LOAD them to disk
+            with Timer() as t_proc:
+                proc_fpath = flut.get_export_fpath(
+                    processed_data_dir, f"processed__trips_{year}_{period}"
+                )
+                # trips of December end in the next year
+                query = get_processed_trips_sql(
+                    raw_fpath,
+                    max_duration,
+                    cols_to_drop,
+                    [int(year), int(year) + 1],
+                )
+                # station names are stored separately (see station_dimension),
+                # and trips are sorted by station and start time (see
+                # trips_layout)
+                names = ", ".join(stdim.STATION_NAME_COLUMNS)
+                query_proc = f"""
+                             COPY (
+                                 SELECT * EXCLUDE ({names})
+                                 FROM ({query})
+                                 {tl.get_order_by_sql()}
+                             )
+                             TO '{proc_fpath}'
+                             {tl.get_copy_options_sql(bloom_filters=bloom_filters)}
+                             """  # nosec
+                with instr.stage("write_processed"):
+                    con.sql(query_proc)
+                    stations_fpath = stdim.get_station_names_fpath(proc_fpath)
+                    con.sql(
+                        f"COPY ({stdim.get_station_names_sql(query)}) "
+                        f"TO '{stations_fpath}' "
+                        "(FORMAT PARQUET, COMPRESSION GZIP)"
+                    )  # nosec
+                with instr.stage("trips_quality"):
+                    quality_fpath = tq.get_quality_fpath(proc_fpath)
+                    query_quality = tq.get_trips_quality_sql(
+                        f"read_parquet('{raw_fpath}')",
+                        get_processed_filter_sql(max_duration),
+                    )
+                    con.sql(
+                        f"COPY ({query_quality}) "
+                        f"TO '{quality_fpath}' "
+                        "(FORMAT PARQUET, COMPRESSION GZIP)"
+                    )  # nosec
+                with instr.stage("trip_sketches"):
+                    sketch_fpath = sk.build_trip_sketches(proc_fpath)
+            with instr.stage("trips_counts"):
+                counts = get_trips_counts(
+                    con, raw_fpath, proc_fpath, max_duration
+                )
+            run["rows_in"], run["rows_out"] = counts["raw"], counts["proc"]
+    return {
+        "file": fname,
+        "raw_fpath": raw_fpath if export_raw else None,
+        "proc_fpath": proc_fpath,
+        "stations_fpath": stations_fpath,
+        "quality_fpath": quality_fpath,
+        "sketch_fpath": sketch_fpath,
+        "year": year,
+        "period": period,
+        "buffer_mins": buffer_mins,
+        **counts,
+        "etl_seconds": t.elapsed + t_proc.elapsed,
+        "stages": stages,
+    }
+
+
+def run_trips_etl_duckdb(
+    fpaths: List[str],
+    processed_data_dir: str,
+    cols_to_drop: List[str] = ["trip_duration"],
+    buffer_mins: int = 5,
+    memory_limit: str = "1GB",
+    threads: Optional[int] = None,
+    temp_dir: Optional[str] = None,
+    deduplicate: bool = True,
+    bloom_filters: bool = False,
+    export_raw: bool = True,
+) -> List[Dict[str, Union[str, int, float]]]:
+    """Run ETL on raw trips files using DuckDB, with fixed memory budget.
+
+    Parameters
+    ----------
+    fpaths: List[str]
+        filepaths to raw (monthly or quarterly) trips CSV files
+    processed_data_dir: str
+        directory to which raw and processed trips are exported
+    cols_to_drop: List[str]
+        columns to be dropped from processed trips
+    buffer_mins: int
+        buffer (in minutes) added to longest allowed trip duration
+    memory_limit: str
+        memory that DuckDB can use (eg. '1GB') before spilling to disk
+    threads: Optional[int]
+        number of threads used by DuckDB, or the number of CPUs if None
+    temp_dir: Optional[str]
+        directory in which temporary files are stored, or the default
+        temporary directory if None
+    deduplicate: bool
+        whether to remove trips with trip IDs that are duplicated within, or
+        across, processed trips files (see trip_dedup.deduplicate_trips)
+    bloom_filters: bool
+        whether to set the false-positive probability of bloom filters of
+        processed trips (see trips_layout.get_copy_options_sql)
+    export_raw: bool
+        whether to export a copy of raw trips of every file
+
+    Returns
+    -------
+    List[Dict[str, Union[str, int, float]]]
+        outputs of the ETL pipeline, in the same order as the files
+
+    Notes
+    -----
+    Files are processed one at a time, while DuckDB streams every file using
+    all threads. Insertion order is not preserved, so that rows can be
+    written as soon as they are processed.
+    """
+    temp_dir = temp_dir or tempfile.gettempdir()
+    config = {
+        "memory_limit": memory_limit,
+        "threads": threads or os.cpu_count(),
+        "preserve_insertion_order": False,
+        "temp_directory": os.path.join(temp_dir, "duckdb_etl.tmp"),
+    }
+    with duckdb.connect(config=config) as con:
+        outputs = [
+            run_trips_etl_duckdb_pipeline(
+                f,
+                processed_data_dir,
+                con,
+                cols_to_drop,
+                buffer_mins,
+                temp_dir,
+                bloom_filters,
+                export_raw,
+            )
+            for f in tqdm(fpaths)
+        ]
+    with instr.collect() as stages:
+        if deduplicate:
+            outputs = etl.add_deduplicated_trips(outputs, processed_data_dir)
+        etl.add_station_dimension(outputs, fpaths, processed_data_dir)
+        etl.add_calendar_dimension(outputs, fpaths, processed_data_dir)
+    etl.add_run_log(outputs, stages, processed_data_dir, "etl_duckdb")
+    return outputs
+
+
+def get_sample_fpaths(fpaths: List[str]) -> List[str]:
+    """Get first raw trips file of every year and of every CSV layout."""
+    samples = {}
+    for f in sorted(fpaths):
+        year, period = etl.get_year_period(f)
+        layout = get_csv_layout(year, period)
+        key = (year, layout["all_varchar"])
+        samples.setdefault(key, f)
+    return list(samples.values())
+
+
+def count_mismatched_rows(
+    con: duckdb.DuckDBPyConnection, fpath_pandas: str, fpath_duckdb: str
+) -> Dict[str, int]:
+    """Count rows found in only one of two exported trips files."""
+    query = f"DESCRIBE SELECT * FROM read_parquet('{fpath_duckdb}')"  # nosec
+    # cast to the datatypes of the DuckDB pipeline, since datatypes of the
+    # Pandas pipeline differ between years
+    selected = ", ".join(
+        f"CAST({c[0]} AS {c[1]}) AS {c[0]}" for c in con.sql(query).fetchall()
+    )
+    q_pandas, q_duckdb = [
+        f"SELECT {selected} FROM read_parquet('{fp}')"  # nosec
+        for fp in [fpath_pandas, fpath_duckdb]
+    ]
+    counts = {}
+    for k, (q1, q2) in zip(
+        ["only_pandas", "only_duckdb"],
+        [[q_pandas, q_duckdb], [q_duckdb, q_pandas]],
+    ):
+        query = f"SELECT COUNT(*) FROM ({q1} EXCEPT ALL {q2})"  # nosec
+        counts[k] = con.sql(query).fetchone()[0]
+    return counts
+
+
+def check_etl_engines(
+    fpaths: List[str],
+    cols_to_drop: List[str] = ["trip_duration"],
+    buffer_mins: int = 5,
+    memory_limit: str = "1GB",
+) -> pd.DataFrame:
+    """Compare trips processed by the Pandas and DuckDB ETL pipelines.
+
+    Parameters
+    ----------
+    fpaths: List[str]
+        filepaths to raw (monthly or quarterly) trips CSV files, of which
+        one per year and CSV layout is processed
+    cols_to_drop: List[str]
+        columns to be dropped from processed trips
+    buffer_mins: int
+        buffer (in minutes) added to longest allowed trip duration
+    memory_limit: str
+        memory that DuckDB can use (eg. '1GB') before spilling to disk
+
+    Returns
+    -------
+    pd.DataFrame
+        whether summary counts match, and number of raw and processed trips
+        found in the output of only one pipeline, per sampled file
+    """
+    fpaths_sample = get_sample_fpaths(fpaths)
+    data_dir = tempfile.mkdtemp()
+    dirs = {e: os.path.join(data_dir, e) for e in ["pandas", "duckdb"]}
+    for d in dirs.values():
+        os.makedirs(d)
+    try:
+        # trips with duplicated trip IDs are kept, since the trip that is
+        # kept depends on the order in which rows are written
+        outputs_pandas = etl.run_trips_etl(
+            fpaths_sample,
+            dirs["pandas"],
+            cols_to_drop,
+            buffer_mins,
+            deduplicate=False,
+        )
+        outputs_duckdb = run_trips_etl_duckdb(
+            fpaths_sample,
+            dirs["duckdb"],
+            cols_to_drop,
+            buffer_mins,
+            memory_limit=memory_limit,
+            deduplicate=False,
+        )
+        records = []
+        con = duckdb.connect()
+        for o_p, o_d in zip(outputs_pandas, outputs_duckdb):
+            counts_cols = [
+                c
+                for c in o_d
+                if c
+                not in [
+                    "raw_fpath",
+                    "proc_fpath",
+                    "stations_fpath",
+                    "quality_fpath",
+                    "sketch_fpath",
+                    "station_dimension_fpath",
+                    "calendar_dimension_fpath",
+                    "run_log_fpath",
+                    "etl_seconds",
+                ]
+            ]
+            record = {
+                "file": o_d["file"],
+                "counts_match": all(o_p[c] == o_d[c] for c in counts_cols),
+            }
+            for fpath_type in ["raw", "proc", "stations", "quality"]:
+                mismatches = count_mismatched_rows(
+                    con,
+                    o_p[f"{fpath_type}_fpath"],
+                    o_d[f"{fpath_type}_fpath"],
+                )
+                for k, v in mismatches.items():
+                    record[f"{fpath_type}_{k}"] = v
+            record["seconds_pandas"] = o_p["etl_seconds"]
+            record["seconds_duckdb"] = o_d["etl_seconds"]
+            records.append(record)
+        con.close()
+    finally:
+        shutil.rmtree(data_dir)
+    df = pd.DataFrame.from_records(records)
+    return df
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Process raw bike share ridership data using DuckDB."
+    )
+    parser.add_argument(
+        "--raw-data-dir",
+        default=os.path.join("data", "raw", "systems", "toronto"),
+        help="directory containing raw trips CSV files",
+    )
+    parser.add_argument(
+        "--processed-data-dir",
+        default=os.path.join("data", "processed"),
+        help="directory to which processed trips are exported",
+    )
+    parser.add_argument(
+        "--buffer-mins",
+        type=int,
+        default=5,
+        help="buffer (in minutes) added to longest allowed trip duration",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        default="1GB",
+        help="memory that DuckDB can use before spilling to disk",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="number of threads used by DuckDB (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--skip-raw",
+        action="store_true",
+        help="do not export a copy of raw trips of every file",
+    )
+    parser.add_argument(
+        "--bloom-filters",
+        action="store_true",
+        help="set false-positive probability of bloom filters of trips",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="compare against the Pandas ETL pipeline on a sample of files",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Run DuckDB ETL pipeline on all raw trips files."""
+    args = parse_args()
+    fpaths = sorted(glob(os.path.join(args.raw_data_dir, "*.csv")))
+    if args.check:
+        df_check = check_etl_engines(
+            fpaths,
+            buffer_mins=args.buffer_mins,
+            memory_limit=args.memory_limit,
+        )
+        print(df_check.round(3).to_string(index=False))
+        return
+    with Timer() as t:
+        outputs = run_trips_etl_duckdb(
+            fpaths,
+            args.processed_data_dir,
+            buffer_mins=args.buffer_mins,
+            memory_limit=args.memory_limit,
+            threads=args.threads,
+            bloom_filters=args.bloom_filters,
+            export_raw=not args.skip_raw,
+        )
+    df_summary = etl.get_summary(outputs)
+    print(
+        f"Processed {df_summary['proc'].sum():,} of "
+        f"{df_summary['raw'].sum():,} trips from {len(fpaths):,} files in "
+        f"{t.elapsed:.3f}s"
+    )
+    if outputs:
+        df_run_log = pd.read_parquet(outputs[0]["run_log_fpath"])
+        print(
+            instr.get_run_summary(df_run_log).round(3).to_string(index=False)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -13,10 +13,13 @@ import shutil
 from datetime import datetime
 
 import pandas as pd
-import pytz
-import requests
 
 import datetime_utils as dtu
+import import_utils as iu
+
+# only needed to download files, or to name exported files
+pytz = iu.lazy_import("pytz")
+requests = iu.lazy_import("requests")
 
 
 def download_file(url: str, raw_data_dir: str) -> str:
@@ -60,14 +63,10 @@ def download_zip_file(raw_data_dir: str, url: str) -> str:
     return zip_filepath
 
 
-def load(
-    df: pd.DataFrame,
-    data_dir: str,
-    data_type: str,
-    my_timezone: str = "America/Toronto",
-    verbose: bool = False,
-) -> None:
-    """."""
+def get_export_fpath(
+    data_dir: str, data_type: str, my_timezone: str = "America/Toronto"
+) -> str:
+    """Get timestamped filepath to which data is exported."""
     dtime_now = datetime.now(tz=pytz.timezone(my_timezone))
     fpath = os.path.join(
         data_dir,
@@ -76,9 +75,22 @@ def load(
             f"{dtu.dtime2str(dtime_now, '%Y%m%d_%H%M%S')}.parquet.gzip"
         ),
     )
+    return fpath
+
+
+def load(
+    df: pd.DataFrame,
+    data_dir: str,
+    data_type: str,
+    my_timezone: str = "America/Toronto",
+    verbose: bool = False,
+) -> str:
+    """."""
+    fpath = get_export_fpath(data_dir, data_type, my_timezone)
     df.to_parquet(fpath, compression="gzip", index=False, engine="pyarrow")
     if verbose:
         print(
             f"Exported {len(df):,} rows of {data_type} data to "
             f"{os.path.abspath(fpath)}"
         )
+    return fpath
@@ -8,10 +8,19 @@
 # pylint: disable=too-many-locals,unused-argument,unnecessary-lambda
 
 
-from typing import List
+import hashlib
+import os
+from typing import Dict, List, Optional
 
 import geopandas as gpd
 import pandas as pd
+import shapely
+
+import instrumentation as instr
+
+# in-memory cache of simplified geometries, keyed by dataset fingerprint and
+# simplification tolerance (in metres)
+_GEOMETRY_LODS_CACHE: Dict[str, gpd.GeoDataFrame] = {}
 
 
 def get_neighbourhood_containing_point(
@@ -38,6 +47,7 @@ def get_neighbourhood_containing_point(
     return polygons_contains
 
 
+@instr.instrument(rows_arg="df")
 def get_data_with_neighbourhood(
     gdf: gpd.GeoDataFrame,
     df: pd.DataFrame,
@@ -63,3 +73,94 @@ def get_data_with_neighbourhood(
     )
     print("Added geodata to data.")
     return df
+
+
+def get_geometry_fingerprint(gdf: gpd.GeoDataFrame) -> str:
+    """Get short hash of geometries, used to key cached simplifications."""
+    wkb = shapely.to_wkb(gdf.geometry.to_numpy())
+    return hashlib.sha256(b"".join(wkb)).hexdigest()[:12]
+
+
+def simplify_geometries(
+    gdf: gpd.GeoDataFrame, tolerance: float, epsg: int = 4536
+) -> gpd.GeoDataFrame:
+    """Simplify polygons without opening gaps or overlaps between them."""
+    if tolerance <= 0:
+        return gdf.copy()
+    geoms = gdf.geometry.to_crs(epsg)
+    # simplify shared edges once (coverage simplification) so that adjacent
+    # neighbourhoods or census tracts still line up after simplification,
+    # falling back to per-polygon simplification for older versions of GEOS
+    if hasattr(shapely, "coverage_simplify"):
+        simplified = gpd.GeoSeries(
+            shapely.coverage_simplify(geoms.to_numpy(), tolerance),
+            index=geoms.index,
+            crs=epsg,
+        )
+    else:
+        simplified = geoms.simplify(tolerance, preserve_topology=True)
+    return gdf.set_geometry(simplified.to_crs(gdf.crs))
+
+
+def get_geojson_size(gdf: gpd.GeoDataFrame) -> int:
+    """Get size (in bytes) of geodata when serialized to GeoJSON."""
+    return len(gdf.to_json().encode("utf-8"))
+
+
+def get_geometry_lods(
+    gdf: gpd.GeoDataFrame,
+    name: str,
+    tolerances: List[float] = [0, 10, 25, 50, 100, 250],
+    cache_dir: Optional[str] = None,
+    epsg: int = 4536,
+) -> Dict[float, gpd.GeoDataFrame]:
+    """Get simplified geodata at multiple levels of detail (LODs).
+
+    Parameters
+    ----------
+    gdf: gpd.GeoDataFrame
+        full-resolution polygons (eg. neighbourhoods or census tracts)
+    name: str
+        name of geodata, used in names of cached files
+    tolerances: List[float]
+        simplification tolerances (in metres), where 0 is full-resolution
+    cache_dir: Optional[str]
+        directory in which simplified geodata is cached on disk
+    epsg: int
+        projection (with units of metres) in which to simplify polygons
+
+    Returns
+    -------
+    Dict[float, gpd.GeoDataFrame]
+        simplified geodata, keyed by tolerance in order of decreasing detail
+    """
+    fingerprint = get_geometry_fingerprint(gdf)
+    lods = {}
+    for tolerance in sorted(tolerances):
+        key = f"{name}__lod_{tolerance:g}m__{fingerprint}"
+        fpath = (
+            os.path.join(cache_dir, f"{key}.parquet") if cache_dir else None
+        )
+        if key not in _GEOMETRY_LODS_CACHE:
+            if fpath and os.path.exists(fpath):
+                gdf_lod = gpd.read_parquet(fpath)
+            else:
+                gdf_lod = simplify_geometries(gdf, tolerance, epsg)
+                if fpath:
+                    gdf_lod.to_parquet(fpath, index=False)
+            gdf_lod.attrs["geojson_size"] = get_geojson_size(gdf_lod)
+            _GEOMETRY_LODS_CACHE[key] = gdf_lod
+        lods[tolerance] = _GEOMETRY_LODS_CACHE[key]
+    return lods
+
+
+def get_geometry_lod_by_size(
+    lods: Dict[float, gpd.GeoDataFrame], max_bytes: int
+) -> float:
+    """Get most detailed level of detail whose GeoJSON fits in max_bytes."""
+    for tolerance, gdf_lod in sorted(lods.items()):
+        size = gdf_lod.attrs.get("geojson_size") or get_geojson_size(gdf_lod)
+        if size <= max_bytes:
+            return tolerance
+    # fall back to coarsest level if no level fits
+    return max(lods)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define utilities to import modules lazily and to measure imports."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import argparse
+import importlib.util
+import subprocess  # nosec
+import sys
+from types import ModuleType
+from typing import Dict, List
+
+import pandas as pd
+
+# modules whose import is measured by default (see get_import_costs)
+IMPORT_MODULES = [
+    "etl",
+    "etl_duckdb",
+    "file_utils",
+    "pandas_utils",
+    "visualization_helpers",
+]
+# code run in a new interpreter, printing seconds taken to import a module
+# and resident memory (in bytes) of the interpreter after the import
+IMPORT_COST_CODE = """
+import os
+import time
+
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+with open("/proc/self/statm") as f:
+    rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+print(seconds, rss)
+"""
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Import top-level package lazily, on first access of an attribute.
+
+    The module is added to sys.modules, so a later import of the module
+    (or one of its sub-modules) gets the same module. A module that is
+    already imported is returned as it is.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def get_import_cost(module: str, cwd: str = ".") -> Dict[str, float]:
+    """Get seconds to import module, and memory used, in a new interpreter."""
+    output = subprocess.run(  # nosec
+        [sys.executable, "-c", IMPORT_COST_CODE.format(module=module)],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    seconds, rss = output.split()
+    return {"seconds": float(seconds), "rss_mb": int(rss) / 1024**2}
+
+
+def get_import_costs(
+    modules: List[str] = IMPORT_MODULES, repeats: int = 5, cwd: str = "."
+) -> pd.DataFrame:
+    """Get smallest seconds to import modules, and memory used after import.
+
+    Every module is imported in a new interpreter, so that none of its
+    dependencies are already imported (as they would be in a worker process
+    started from a notebook kernel).
+    """
+    records = []
+    for module in modules:
+        costs = [get_import_cost(module, cwd) for _ in range(repeats)]
+        records.append(
+            {
+                "module": module,
+                "seconds": min(c["seconds"] for c in costs),
+                "rss_mb": min(c["rss_mb"] for c in costs),
+            }
+        )
+    return pd.DataFrame.from_records(records)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Measure time and memory taken to import modules."
+    )
+    parser.add_argument(
+        "--modules",
+        nargs="+",
+        default=IMPORT_MODULES,
+        help="modules to be imported, each in a new interpreter",
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=5,
+        help="imports of every module (the fastest import is reported)",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Show time and memory taken to import modules."""
+    args = parse_args()
+    df = get_import_costs(args.modules, args.repeats)
+    print(df.round(3).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
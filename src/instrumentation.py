@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define timing and memory instrumentation of stages of the pipeline."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import functools
+import inspect
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+import file_utils as flut
+import parallel_utils as plu
+
+# seconds between samples of resident memory while a stage is run
+RSS_SAMPLE_SECONDS = 0.01
+# columns (and datatypes) of the run log, with one row per run of a stage
+RUN_LOG_DTYPES = {
+    "stage": "str",
+    "parent": "str",
+    "file": "str",
+    "pid": "int32",
+    "started_at": "datetime64[us]",
+    "rows_in": "Int64",
+    "rows_out": "Int64",
+    "wall_seconds": "float64",
+    "cpu_seconds": "float64",
+    "rss_start_mb": "float64",
+    "rss_peak_mb": "float64",
+    "traced_peak_mb": "float64",
+}
+RUN_LOG_PREFIX = "run_log"
+
+# lists to which records of stages are added, innermost last
+_COLLECTORS: List[List[Dict[str, Any]]] = []
+# records of stages that are running, innermost last
+_STACK: List[Dict[str, Any]] = []
+
+
+def get_rows(obj: Any) -> Optional[int]:
+    """Get number of rows of (Geo)DataFrame, Series or Arrow table."""
+    if isinstance(obj, (pd.DataFrame, pd.Series, pa.Table)):
+        return len(obj)
+    return None
+
+
+@contextmanager
+def sample_peak_rss(
+    interval: float = RSS_SAMPLE_SECONDS,
+) -> Iterator[Dict[str, int]]:
+    """Sample peak resident memory (in bytes) of the process in a thread.
+
+    The largest resident memory found is in the "peak" key of the yielded
+    dictionary once the context manager exits, which includes memory
+    allocated by Arrow and DuckDB that tracemalloc does not trace.
+    """
+    rss = {"start": plu.get_process_memory()}
+    rss["peak"] = rss["start"]
+    done = threading.Event()
+
+    def sample() -> None:
+        """Keep largest resident memory found until the block is done."""
+        while not done.wait(interval):
+            rss["peak"] = max(rss["peak"], plu.get_process_memory())
+
+    thread = threading.Thread(target=sample, daemon=True)
+    thread.start()
+    try:
+        yield rss
+    finally:
+        done.set()
+        thread.join()
+        rss["peak"] = max(rss["peak"], plu.get_process_memory())
+
+
+@contextmanager
+def tracing(enabled: bool = True) -> Iterator[None]:
+    """Trace memory allocations with tracemalloc while a block is run.
+
+    Tracing slows down the block, so it is optional. It is only stopped on
+    exit if it was started here.
+    """
+    started = enabled and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        yield
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+@contextmanager
+def stage(
+    name: str, file: Optional[str] = None, rows_in: Optional[int] = None
+) -> Iterator[Dict[str, Any]]:
+    """Record wall time, CPU time and peak memory of a stage.
+
+    Parameters
+    ----------
+    name: str
+        name of the stage
+    file: Optional[str]
+        (raw trips) file processed by the stage, or the file of the stage
+        within which the stage is run if None
+    rows_in: Optional[int]
+        number of rows that are input to the stage
+
+    Yields
+    ------
+    Dict[str, Any]
+        record of the stage (see RUN_LOG_DTYPES), whose rows_in and
+        rows_out can be set within the block
+
+    Notes
+    -----
+    1. Records are added to the innermost collector (see collect). Stages
+       run outside of any collector (eg. instrumented helpers called from a
+       notebook) are neither measured nor recorded, so records do not pile
+       up in a long-running process.
+    2. CPU time is that of all threads of the process.
+    3. Peak memory traced by tracemalloc is only recorded if tracemalloc is
+       tracing (see tracing). The peak of a stage includes the peaks of the
+       stages run within it.
+    """
+    if not _COLLECTORS:
+        yield {"stage": name, "rows_in": rows_in, "rows_out": None}
+        return
+    parent = _STACK[-1] if _STACK else None
+    record = {
+        "stage": name,
+        "parent": parent["stage"] if parent else None,
+        "file": file or (parent["file"] if parent else None),
+        "pid": os.getpid(),
+        "started_at": datetime.now(),
+        "rows_in": rows_in,
+        "rows_out": None,
+        "traced_peak_mb": None,
+    }
+    is_tracing = tracemalloc.is_tracing()
+    if is_tracing:
+        # fold the peak of the parent stage so far into the parent, so that
+        # the peak can be reset for this stage
+        if parent:
+            parent["_traced_peak"] = max(
+                parent.get("_traced_peak", 0),
+                tracemalloc.get_traced_memory()[1],
+            )
+        tracemalloc.reset_peak()
+    _STACK.append(record)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    try:
+        with sample_peak_rss() as rss:
+            yield record
+    finally:
+        record["wall_seconds"] = time.perf_counter() - wall_start
+        record["cpu_seconds"] = time.process_time() - cpu_start
+        record["rss_start_mb"] = rss["start"] / 1024**2
+        record["rss_peak_mb"] = rss["peak"] / 1024**2
+        _STACK.pop()
+        if is_tracing and tracemalloc.is_tracing():
+            traced_peak = max(
+                record.pop("_traced_peak", 0),
+                tracemalloc.get_traced_memory()[1],
+            )
+            record["traced_peak_mb"] = traced_peak / 1024**2
+            if parent:
+                parent["_traced_peak"] = max(
+                    parent.get("_traced_peak", 0), traced_peak
+                )
+        _COLLECTORS[-1].append(record)
+
+
+def instrument(
+    name: Optional[str] = None, rows_arg: Optional[str] = None
+) -> Callable:
+    """Decorate function so that every call is recorded as a stage.
+
+    Calls are only recorded within a collector (see collect and stage).
+
+    Parameters
+    ----------
+    name: Optional[str]
+        name of the stage, or the name of the function if None
+    rows_arg: Optional[str]
+        argument of the function whose rows are the rows input to the stage,
+        while rows output by the stage are those of the returned value
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        """Wrap function in a stage."""
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            """Run function as a stage."""
+            rows_in = None
+            if rows_arg:
+                arguments = signature.bind(*args, **kwargs).arguments
+                rows_in = get_rows(arguments.get(rows_arg))
+            with stage(name or fn.__name__, rows_in=rows_in) as record:
+                output = fn(*args, **kwargs)
+                record["rows_out"] = get_rows(output)
+            return output
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def collect() -> Iterator[List[Dict[str, Any]]]:
+    """Collect records of stages run within a block, in the yielded list.
+
+    Collected records can be returned by a worker process to the parent
+    process (see etl.run_trips_etl_pipeline).
+    """
+    records: List[Dict[str, Any]] = []
+    _COLLECTORS.append(records)
+    try:
+        yield records
+    finally:
+        _COLLECTORS.remove(records)
+
+
+@contextmanager
+def pipeline(
+    name: str, file: Optional[str] = None, trace_memory: bool = False
+) -> Iterator[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+    """Run outermost stage of a pipeline, collecting records of its stages.
+
+    Yields the list of collected records (see collect), which includes the
+    record of the outermost stage once the block is done, and the record of
+    the outermost stage (see stage). Memory is traced by tracemalloc within
+    the block if trace_memory is True (see tracing).
+    """
+    with tracing(trace_memory), collect() as records, stage(
+        name, file
+    ) as record:
+        yield records, record
+
+
+def get_run_log(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Get run log of stages, in order of their start times."""
+    df = (
+        pd.DataFrame.from_records(records, columns=list(RUN_LOG_DTYPES))
+        .astype(RUN_LOG_DTYPES)
+        .sort_values(by=["started_at"], ignore_index=True)
+    )
+    return df
+
+
+def get_run_summary(df: pd.DataFrame) -> pd.DataFrame:
+    """Get summary of run log, with one row per stage.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        run log (see get_run_log)
+
+    Returns
+    -------
+    pd.DataFrame
+        number of runs and files, rows in and out, total wall and CPU time,
+        share of the wall time of all outermost stages, throughput (rows in
+        per second of wall time) and largest peak memory, of every stage, in
+        order of the first run of every stage
+    """
+    df_summary = (
+        df.groupby("stage", sort=False)
+        .agg(
+            parent=("parent", "first"),
+            runs=("stage", "size"),
+            files=("file", "nunique"),
+            rows_in=("rows_in", lambda s: s.sum(min_count=1)),
+            rows_out=("rows_out", lambda s: s.sum(min_count=1)),
+            wall_seconds=("wall_seconds", "sum"),
+            cpu_seconds=("cpu_seconds", "sum"),
+            rss_peak_mb=("rss_peak_mb", "max"),
+            traced_peak_mb=("traced_peak_mb", "max"),
+        )
+        .reset_index()
+    )
+    total_seconds = df.loc[df["parent"].isna(), "wall_seconds"].sum()
+    df_summary.insert(
+        8, "wall_share", df_summary["wall_seconds"] / total_seconds
+    )
+    df_summary.insert(
+        9,
+        "rows_per_second",
+        (df_summary["rows_in"] / df_summary["wall_seconds"]).where(
+            df_summary["rows_in"] > 0
+        ),
+    )
+    return df_summary
+
+
+def write_run_log(
+    records: List[Dict[str, Any]], data_dir: str, name: str
+) -> str:
+    """Export run log of stages of a run of a pipeline.
+
+    Parameters
+    ----------
+    records: List[Dict[str, Any]]
+        records of stages, eg. collected by workers of the pipeline
+    data_dir: str
+        directory to which run log is exported
+    name: str
+        name of the pipeline, which is part of the filename of the run log
+
+    Returns
+    -------
+    str
+        filepath to run log (see get_run_log)
+    """
+    df = get_run_log(records)
+    return flut.load(df, data_dir, f"{RUN_LOG_PREFIX}__{name}")
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define utilities to build and query station origin-destination flows."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import os
+import re
+from glob import glob
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from scipy import sparse
+
+OD_COLUMNS = ["started_at", "start_station_id", "end_station_id", "user_type"]
+OD_FNAME_REGEX = re.compile(r"od__(\d{4})_(\d{2})__(.+)\.npz$")
+
+
+def get_user_type_slug(user_type: str) -> str:
+    """Convert user type into a string that can be used in filenames."""
+    return re.sub(r"[^a-z0-9]+", "_", str(user_type).lower()).strip("_")
+
+
+def get_od_fpath(od_dir: str, year: int, month: int, user_type: str) -> str:
+    """Get filepath to OD matrix for single month and user type."""
+    fname = f"od__{year}_{str(month).zfill(2)}__{user_type}.npz"
+    return os.path.join(od_dir, fname)
+
+
+def get_batch_od_counts(
+    df: pd.DataFrame,
+) -> Dict[Tuple[int, int, str], sparse.coo_matrix]:
+    """Count trips between pairs of stations in a batch of trips."""
+    df = df.dropna(subset=["start_station_id", "end_station_id"])
+    started_at = pd.to_datetime(df["started_at"])
+    keys = pd.DataFrame(
+        {
+            "year": started_at.dt.year.to_numpy(),
+            "month": started_at.dt.month.to_numpy(),
+            "user_type": (
+                df["user_type"].fillna("Unknown").map(get_user_type_slug)
+            ).to_numpy(),
+        }
+    )
+    counts = {}
+    for key, idx in keys.groupby(list(keys)).indices.items():
+        rows = df["start_station_id"].to_numpy(dtype=np.int32)[idx]
+        cols = df["end_station_id"].to_numpy(dtype=np.int32)[idx]
+        od = sparse.coo_matrix(
+            (np.ones(len(idx), dtype=np.int32), (rows, cols)),
+            shape=(rows.max() + 1, cols.max() + 1),
+        )
+        od.sum_duplicates()
+        counts[key] = od
+    return counts
+
+
+def build_od_matrices(
+    fpaths: List[str],
+    od_dir: str,
+    batch_size: int = 500_000,
+    verbose: bool = False,
+) -> List[str]:
+    """Build monthly OD matrices, per user type, by streaming over trips.
+
+    Parameters
+    ----------
+    fpaths: List[str]
+        filepaths to processed trips
+    od_dir: str
+        directory in which OD matrices are written
+    batch_size: int
+        number of trips read into memory at a time
+    verbose: bool
+        whether to show number of exported OD matrices
+
+    Returns
+    -------
+    List[str]
+        filepaths to OD matrices, one per month and user type (none if
+        there are no trips between stations)
+
+    Notes
+    -----
+    Every row of processed trips is counted as a single trip. Trips are
+    assigned to the month during which they started, so trips near the end
+    of a month can be found in the file of the following month.
+    """
+    triplets = {}
+    for f in fpaths:
+        for batch in pq.ParquetFile(f).iter_batches(
+            batch_size=batch_size, columns=OD_COLUMNS
+        ):
+            for key, od in get_batch_od_counts(batch.to_pandas()).items():
+                triplets.setdefault(key, []).append(od)
+
+    # use the same (square) shape for all OD matrices so that they can be
+    # added without resizing (no matrices are exported without trips)
+    size = max(
+        (max(od.shape) for ods in triplets.values() for od in ods), default=0
+    )
+    fpaths_od = []
+    for (year, month, user_type), ods in sorted(triplets.items()):
+        od = sparse.coo_matrix(
+            (
+                np.concatenate([m.data for m in ods]),
+                (
+                    np.concatenate([m.row for m in ods]),
+                    np.concatenate([m.col for m in ods]),
+                ),
+            ),
+            shape=(size, size),
+        ).tocsr()
+        fpath = get_od_fpath(od_dir, year, month, user_type)
+        sparse.save_npz(fpath, od, compressed=True)
+        fpaths_od.append(fpath)
+    if verbose:
+        print(
+            f"Exported {len(fpaths_od):,} OD matrices to "
+            f"{os.path.abspath(od_dir)}"
+        )
+    return fpaths_od
+
+
+def get_od_matrices_index(od_dir: str) -> pd.DataFrame:
+    """Get year, month and user type of every OD matrix found on disk."""
+    records = []
+    for f in sorted(glob(os.path.join(od_dir, "od__*.npz"))):
+        year, month, user_type = OD_FNAME_REGEX.search(f).groups()
+        records.append(
+            {
+                "year": int(year),
+                "month": int(month),
+                "user_type": user_type,
+                "fpath": f,
+            }
+        )
+    df = pd.DataFrame.from_records(
+        records, columns=["year", "month", "user_type", "fpath"]
+    )
+    return df
+
+
+def aggregate_od_matrices(
+    od_dir: str,
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None,
+    user_types: Optional[List[str]] = None,
+) -> sparse.csr_matrix:
+    """Add OD matrices over a range of months (YYYY-MM) and user types."""
+    df = get_od_matrices_index(od_dir).assign(
+        year_month=lambda df: (
+            df["year"].astype(str) + "-" + df["month"].astype(str).str.zfill(2)
+        )
+    )
+    if start_month:
+        df = df.query(f"year_month >= '{start_month}'")
+    if end_month:
+        df = df.query(f"year_month <= '{end_month}'")
+    if user_types:
+        slugs = [get_user_type_slug(u) for u in user_types]
+        df = df[df["user_type"].isin(slugs)]
+    if df.empty:
+        raise ValueError("Found no OD matrices matching selection")
+    ods = [sparse.load_npz(f) for f in df["fpath"]]
+    size = max(od.shape[0] for od in ods)
+    od_total = sparse.csr_matrix((size, size), dtype=np.int64)
+    for od in ods:
+        od.resize((size, size))
+        od_total += od
+    return od_total
+
+
+def get_top_flows(
+    od: sparse.spmatrix, k: int = 10, include_round_trips: bool = True
+) -> pd.DataFrame:
+    """Get k busiest station-to-station flows (corridors)."""
+    od = sparse.coo_matrix(od)
+    if not include_round_trips:
+        od = sparse.coo_matrix(od - sparse.diags(od.diagonal()))
+        od.eliminate_zeros()
+    k = min(k, od.nnz)
+    top = np.argpartition(-od.data, k - 1)[:k] if k else np.array([], int)
+    df = (
+        pd.DataFrame(
+            {
+                "start_station_id": od.row[top],
+                "end_station_id": od.col[top],
+                "trips": od.data[top],
+            }
+        )
+        .sort_values(by=["trips"], ascending=False, ignore_index=True)
+        .assign(rank=lambda df: range(1, len(df) + 1))
+    )
+    return df
+
+
+def get_top_flows_per_station(
+    od: sparse.spmatrix,
+    k: int = 5,
+    direction: str = "outbound",
+    include_round_trips: bool = True,
+) -> pd.DataFrame:
+    """Get k busiest outbound (or inbound) flows at every station."""
+    od = sparse.coo_matrix(od if direction == "outbound" else od.T)
+    mask = np.ones(od.nnz, dtype=bool)
+    if not include_round_trips:
+        mask = od.row != od.col
+    station, other, trips = od.row[mask], od.col[mask], od.data[mask]
+    # sort by station, then by decreasing trips, and rank flows within station
+    order = np.lexsort((-trips, station))
+    station, other, trips = station[order], other[order], trips[order]
+    first = np.flatnonzero(np.r_[True, station[1:] != station[:-1]])
+    rank = np.arange(len(station)) - np.repeat(
+        first, np.diff(np.r_[first, len(station)])
+    )
+    top = rank < k
+    other_col = (
+        "end_station_id" if direction == "outbound" else "start_station_id"
+    )
+    df = pd.DataFrame(
+        {
+            "station_id": station[top],
+            other_col: other[top],
+            "trips": trips[top],
+            "rank": rank[top] + 1,
+        }
+    )
+    return df
@@ -10,11 +10,37 @@
 from typing import List
 
 import numpy as np
-from IPython.display import display
 from pandas import DataFrame, MultiIndex, Series
 
+import import_utils as iu
+import sketches as sk
 
-def show_df(df: DataFrame) -> None:
+# only needed to show DataFrames in notebooks
+IPython = iu.lazy_import("IPython")
+
+
+def get_nunique(df: DataFrame, approximate: bool = False) -> Series:
+    """
+    Get number of unique values in every column.
+
+    Parameters
+    ----------
+    df: DataFrame
+        DataFrame whose unique values are to be counted
+    approximate: bool=False
+        whether to estimate the number of unique values using HyperLogLog,
+        with a relative standard error of sketches.get_hll_relative_error()
+    """
+    if not approximate:
+        return df.nunique()
+    nunique = Series(
+        [round(sk.get_hll_nunique(df[c])) for c in df.columns],
+        index=df.columns,
+    )
+    return nunique
+
+
+def show_df(df: DataFrame, approx_nunique: bool = False) -> None:
     """
     Show DataFrame with a summary in multi-row header.
 
@@ -22,6 +48,8 @@ def show_df(df: DataFrame) -> None:
     ----------
     df: DataFrame
         DataFrame to be shown
+    approx_nunique: bool=False
+        whether to estimate the number of unique values (see get_nunique)
     """
     df_disp = df.copy()
     df_disp.columns = MultiIndex.from_tuples(
@@ -29,17 +57,17 @@ def show_df(df: DataFrame) -> None:
             zip(
                 df_disp.columns,
                 df_disp.dtypes,
-                df_disp.nunique(),
+                get_nunique(df_disp, approx_nunique),
                 df_disp.isna().sum(),
             )
         ),
         names=["column", "dtype", "nunique", "missing"],
     )
-    display(df_disp)
+    IPython.display.display(df_disp)
 
 
 def show_nans_dtypes_nunique(
-    df: DataFrame, show_transpose: bool = False
+    df: DataFrame, show_transpose: bool = False, approx_nunique: bool = False
 ) -> None:
     """
     Summarize missing values, datatypes and number of unique values in header.
@@ -50,6 +78,8 @@ def show_nans_dtypes_nunique(
         DataFrame to be summarized
     show_transpose: bool=False
         whether to show a transpose of the summarized DataFrame
+    approx_nunique: bool=False
+        whether to estimate the number of unique values (see get_nunique)
     """
     df_nans_dtypes = (
         df.isna()
@@ -57,7 +87,7 @@ def show_nans_dtypes_nunique(
         .rename("missing")
         .to_frame()
         .merge(
-            df.nunique().rename("nunique").to_frame(),
+            get_nunique(df, approx_nunique).rename("nunique").to_frame(),
             left_index=True,
             right_index=True,
             how="left",
@@ -71,7 +101,7 @@ def show_nans_dtypes_nunique(
     )
     if show_transpose:
         df_nans_dtypes = df_nans_dtypes.transpose()
-    display(df_nans_dtypes)
+    IPython.display.display(df_nans_dtypes)
 
 
 def highlight_conditionally(
@@ -89,7 +119,7 @@ def highlight_conditionally(
     value: bool
         value to be checked
     """
-    display(
+    IPython.display.display(
         df.style.apply(
             lambda _: (
                 np.where(df[col] == value, "background-color: yellow", "")
@@ -152,7 +182,7 @@ def highlight_multiple_columns_ver2(df: DataFrame, columns: List[str]) -> None:
     columns: List[str]
         list of columns to be highlighted
     """
-    display(
+    IPython.display.display(
         df.style.set_properties(
             subset=columns, **{"background-color": "yellow"}
         )
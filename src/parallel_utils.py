@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define utilities to run functions in parallel."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import importlib
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import product
+from typing import Any, Callable, Dict, List, Optional
+
+from tqdm import tqdm
+from tqdm.contrib import concurrent as concurrent_tq
+
+
+def run_parallel(
+    inputs_product: product,
+    fn: Callable,
+    chunk_size: int = 100,
+    max_workers: int = 12,
+) -> List[Any]:
+    """Run function against multiple inputs in parallel."""
+    iterables = list(inputs_product)
+    outputs = list(
+        concurrent_tq.process_map(
+            fn,
+            *zip(*iterables),
+            max_workers=max_workers,
+            chunksize=chunk_size,
+        )
+    )
+    return outputs
+
+
+def get_available_memory() -> int:
+    """Get memory (in bytes) available to start new processes."""
+    try:
+        with open("/proc/meminfo") as f:
+            meminfo = dict(line.split(":", 1) for line in f)
+        return int(meminfo["MemAvailable"].split()[0]) * 1024
+    except (OSError, KeyError):
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+
+def get_process_memory() -> int:
+    """Get resident memory (in bytes) of the current process."""
+    with open("/proc/self/statm") as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def preload_modules(names: List[str]) -> None:
+    """Import modules, eg. when a worker process is started."""
+    for name in names:
+        importlib.import_module(name)
+
+
+def run_memory_aware(
+    fn: Callable,
+    inputs: List[Any],
+    memory_estimates: Dict[Any, int],
+    max_workers: Optional[int] = None,
+    memory_limit: Optional[int] = None,
+    preload: Optional[List[str]] = None,
+    verbose: bool = False,
+) -> List[Any]:
+    """Run function in parallel with concurrency capped by available memory.
+
+    Parameters
+    ----------
+    fn: Callable
+        function to be run against every input (must be picklable)
+    inputs: List[Any]
+        inputs to the function
+    memory_estimates: Dict[Any, int]
+        estimated peak memory (in bytes) needed to run function, per input
+    max_workers: Optional[int]
+        maximum number of processes, or the number of CPUs if None
+    memory_limit: Optional[int]
+        memory (in bytes) to be shared by all processes, or 80% of the
+        currently available memory if None
+    preload: Optional[List[str]]
+        modules needed by the function, which are imported once by a server
+        process from which workers are forked (see set_forkserver_preload),
+        or None to start workers with the default start method
+    verbose: bool
+        whether to show the memory budget and number of processes
+
+    Returns
+    -------
+    List[Any]
+        outputs of the function, in the same order as the inputs
+
+    Notes
+    -----
+    Inputs are started largest-first. When the largest remaining input does
+    not fit within the unused memory budget, the largest one that does fit
+    is started instead, so that no process sits idle while small inputs are
+    waiting. An input is always started if no other input is running, even
+    if it is estimated to exceed the memory budget.
+
+    Workers forked from a server process that only imported the preloaded
+    modules do not inherit modules (or data) of the parent process, eg. of a
+    notebook kernel, and do not import the modules again when started.
+    """
+    max_workers = max_workers or os.cpu_count()
+    memory_limit = memory_limit or int(0.8 * get_available_memory())
+    if verbose:
+        print(
+            f"Running {len(inputs):,} inputs using up to {max_workers} "
+            f"processes and {memory_limit / 1024**3:.1f} GB of memory"
+        )
+    pending = sorted(
+        range(len(inputs)),
+        key=lambda k: memory_estimates[inputs[k]],
+        reverse=True,
+    )
+    outputs = [None] * len(inputs)
+    running = {}
+    mp_context = None
+    if preload and "forkserver" in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context("forkserver")
+        mp_context.set_forkserver_preload(preload)
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=mp_context,
+        initializer=preload_modules if preload else None,
+        initargs=(preload,) if preload else (),
+    ) as executor, tqdm(total=len(inputs)) as pbar:
+        while pending or running:
+            reserved = sum(
+                memory_estimates[inputs[k]] for k in running.values()
+            )
+            while pending and len(running) < max_workers:
+                fits = [
+                    k
+                    for k in pending
+                    if reserved + memory_estimates[inputs[k]] <= memory_limit
+                ]
+                if not fits and running:
+                    break
+                k = fits[0] if fits else pending[0]
+                pending.remove(k)
+                running[executor.submit(fn, inputs[k])] = k
+                reserved += memory_estimates[inputs[k]]
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                outputs[running.pop(future)] = future.result()
+                pbar.update()
+    return outputs
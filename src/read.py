@@ -12,29 +12,23 @@ from typing import Dict, List, Union
 
 import pandas as pd
 
+import datetime_utils as dtu
+
 
 def get_2020_data(
     period: str, fpath: str, dtypes: Dict, datetime_cols: List[str]
 ) -> pd.DataFrame:
     """Read bikeshare trips data from single month in 2020."""
-    if int(period) in [10]:
-        usecols = None
-        parse_dates = None
-        date_format = None
-    else:
-        usecols = None
-        parse_dates = datetime_cols
-        date_format = "%m/%d/%Y %H:%M"
+    usecols = None
 
+    # start and end times are read as strings, and parsed after reading
     df = pd.read_csv(
         fpath,
         compression=None,
         encoding=None,
         engine="python",
-        dtype=dtypes,
+        dtype={**dtypes, **{c: pd.StringDtype() for c in datetime_cols}},
         usecols=usecols,
-        parse_dates=parse_dates,
-        date_format=date_format,
     )
     # for October 2020, columns were mis-aligned and to the datatypes & column
     # names need to be fixed (See above for details)
@@ -50,12 +44,9 @@ def get_2020_data(
                 "Bike Id": pd.Int64Dtype(),
             }
         )
-        # convert start and end time columns to datetime datatype
-        end_col = "End Time"
-        df[end_col] = pd.to_datetime(df[end_col], format="%m/%d/%Y %H:%M")
-        df["Start Time"] = pd.to_datetime(
-            df["Start Time"], format="%m/%d/%Y %H:%M"
-        )
+    # convert start and end time columns to datetime datatype
+    for c in datetime_cols:
+        df[c] = dtu.parse_datetimes(df[c], "%m/%d/%Y %H:%M")
     return df
 
 
@@ -178,18 +169,20 @@ def read_csv_file(
             datetime_cols = ["Start Time", "End Time"]
         # print(1)
 
-        # read single month's bikeshare data
+        # read single month's bikeshare data, with start and end times read
+        # as strings
         df = pd.read_csv(
             fpath,
             # nrows=500,
             compression=None,
             encoding=encoding,
             engine="python",
-            dtype=dtypes,
+            dtype={**dtypes, **{c: pd.StringDtype() for c in datetime_cols}},
             usecols=None,
-            parse_dates=datetime_cols,
-            date_format=datetime_fmt,
         )
+        # parse start and end times by the fixed offsets of their digits
+        for c in datetime_cols:
+            df[c] = dtu.parse_datetimes(df[c], datetime_fmt)
         # remove special characters from trip_id column in 2021
         if year in ["2021", "2023"]:
             df = df.rename(columns={"ï»¿Trip Id": "Trip Id"})
@@ -0,0 +1,676 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define the recommended hourly schedule from structured temporal rules."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import argparse
+import calendar
+from itertools import product
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+import numpy as np
+import pandas as pd
+from contexttimer import Timer
+
+# user types for which hours are recommended
+USER_TYPES = ["Annual", "Casual"]
+# seasons, and the (inclusive) range of days of the year, as MM-DD, of the
+# prime bike share season (all other days are in the off-season)
+SEASONS = ["Prime Bike Share Season", "Off-Season"]
+PRIME_SEASON = ("05-01", "09-30")
+TYPES_OF_DAY = ["Weekday", "Weekend"]
+# names of months and days of the week (starting on Monday), as returned by
+# MONTHNAME() and DAYNAME() in DuckDB
+MONTH_NAMES = list(calendar.month_name)[1:]
+DAY_NAMES = list(calendar.day_name)
+# columns of the recommended hourly schedule
+SCHEDULE_COLUMNS = [
+    "user_type",
+    "datetime",
+    "month",
+    "day_of_week",
+    "hour",
+    "type_of_day",
+    "season",
+    "is_recommended",
+    "hours_cumsum",
+    "total_hours",
+    "frac_recommended_hours",
+]
+# keys of a rule of recommended hours, which is
+# - season: name of season (see SEASONS), or None for all seasons
+# - type_of_day: Weekday or Weekend, or None for all days
+# - hours: windows of recommended hours of the day, as [start, end)
+# - user_types: user types the rule applies to, or None for all user types
+# - station_ids: stations the rule applies to, or None for all stations
+# - sql: SQL predicate selecting recommended hours of an hourly calendar
+#   (with user_type, datetime, month, day_of_week and hour columns), as
+#   stored with the temporal insights, instead of season, type_of_day and
+#   hours
+RULE_KEYS = [
+    "season",
+    "type_of_day",
+    "hours",
+    "user_types",
+    "station_ids",
+    "sql",
+]
+
+
+def get_hourly_calendar(
+    start_date: str,
+    end_date: str,
+    prime_season: Tuple[str, str] = PRIME_SEASON,
+) -> Dict[str, np.ndarray]:
+    """Get attributes of every day between two dates, and hours to keep.
+
+    Parameters
+    ----------
+    start_date: str
+        first hour of the calendar (eg. 2023-05-22 00:00:00)
+    end_date: str
+        last hour of the calendar (inclusive)
+    prime_season: Tuple[str, str]
+        first and last day (as MM-DD) of the prime bike share season
+
+    Returns
+    -------
+    Dict[str, np.ndarray]
+        day (datetime64[D]), month (0-11), day of the week (0 for Monday),
+        type of day and season (as positions in TYPES_OF_DAY and SEASONS) of
+        every day, and the first and last hour (as positions in the days x 24
+        hours of these days) of the calendar
+
+    Notes
+    -----
+    Attributes are found once per day (rather than per hour) with integer
+    arithmetic on datetime64 values, so the hourly calendar is never built
+    row by row.
+    """
+    start = np.datetime64(pd.Timestamp(start_date), "h")
+    end = np.datetime64(pd.Timestamp(end_date), "h")
+    days = np.arange(start.astype("M8[D]"), end.astype("M8[D]") + 1)
+    day_nums = days.astype(np.int64)
+    months = days.astype("M8[M]")
+    month = months.astype(np.int64) % 12
+    day_of_month = (days - months.astype("M8[D]")).astype(np.int64) + 1
+    # 1970-01-01 was a Thursday
+    day_of_week = (day_nums + 3) % 7
+    # seasons are compared as MMDD integers, so a season may wrap around the
+    # end of the year
+    mmdd = (month + 1) * 100 + day_of_month
+    first, last = [int(d.replace("-", "")) for d in prime_season]
+    if first <= last:
+        is_prime = (mmdd >= first) & (mmdd <= last)
+    else:
+        is_prime = (mmdd >= first) | (mmdd <= last)
+    first_hour = int((start - days[0].astype("M8[h]")).astype(np.int64))
+    return {
+        "day": days,
+        "month": month,
+        "day_of_week": day_of_week,
+        "type_of_day": (day_of_week >= 5).astype(np.int8),
+        "season": np.where(is_prime, 0, 1).astype(np.int8),
+        "hours": slice(
+            first_hour, first_hour + int((end - start).astype(int)) + 1
+        ),
+    }
+
+
+def get_rule_mask(rule: Dict, cal: Dict[str, np.ndarray]) -> np.ndarray:
+    """Get hours of a calendar recommended by a rule.
+
+    The days and the hours of the day selected by the rule are found
+    separately, and are combined by an outer product (days x 24 hours).
+    """
+    unknown = set(rule) - set(RULE_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown keys of recommendation rule: {unknown}")
+    is_day = np.ones(len(cal["day"]), dtype=bool)
+    if rule.get("season") is not None:
+        is_day &= cal["season"] == SEASONS.index(rule["season"])
+    if rule.get("type_of_day") is not None:
+        is_day &= cal["type_of_day"] == TYPES_OF_DAY.index(rule["type_of_day"])
+    is_hour = np.zeros(24, dtype=bool)
+    for start, end in rule.get("hours", []):
+        if not 0 <= start < end <= 24:
+            raise ValueError(
+                f"Invalid window of recommended hours {start, end}"
+            )
+        is_hour[slice(start, end)] = True
+    return np.outer(is_day, is_hour).ravel()[cal["hours"]]
+
+
+def get_sql_rule_mask(
+    predicate: str, start_date: str, end_date: str, user_types: List[str]
+) -> np.ndarray:
+    """Get hours of a calendar selected by a SQL predicate, per user type.
+
+    The predicate is evaluated in DuckDB on the hourly calendar of every
+    user type, with the columns that filters of the temporal insights use.
+    """
+    datetimes = pd.date_range(start_date, end_date, freq="h")
+    df_calendar = pd.DataFrame(
+        {
+            "user_type": np.repeat(user_types, len(datetimes)),
+            "datetime": np.tile(datetimes, len(user_types)),
+        }
+    )
+    query = f"""
+            SELECT COALESCE({predicate}, false) AS is_selected
+            FROM (
+                SELECT *,
+                       MONTHNAME(datetime) AS month,
+                       DAYNAME(datetime) AS day_of_week,
+                       HOUR(datetime) AS hour
+                FROM df_calendar
+            )
+            """  # nosec
+    with duckdb.connect() as con:
+        con.register("df_calendar", df_calendar)
+        is_selected = con.sql(query).fetchnumpy()["is_selected"]
+    return np.asarray(is_selected, dtype=bool).reshape(len(user_types), -1)
+
+
+def read_recommended_hour_rules(fpath: str) -> Dict[str, Dict]:
+    """Read rules of recommended hours from filters of temporal insights.
+
+    Filters (recommendations_temporal) are stored as one column per rule
+    (eg. weekday_prime), holding its SQL predicate (see RULE_KEYS).
+    """
+    df = pd.read_parquet(fpath)
+    return {c: {"sql": df[c].squeeze()} for c in df.columns}
+
+
+def get_recommended_hours(
+    rules: Dict[str, Dict],
+    start_date: str,
+    end_date: str,
+    user_types: List[str] = USER_TYPES,
+    prime_season: Tuple[str, str] = PRIME_SEASON,
+    cal: Optional[Dict[str, np.ndarray]] = None,
+) -> np.ndarray:
+    """Get whether every hour is recommended, for every user type.
+
+    Parameters
+    ----------
+    rules: Dict[str, Dict]
+        rules of recommended hours (see RULE_KEYS), by name of rule (eg.
+        weekday_prime)
+    start_date: str
+        first hour of the calendar
+    end_date: str
+        last hour of the calendar (inclusive)
+    user_types: List[str]
+        user types for which hours are recommended
+    prime_season: Tuple[str, str]
+        first and last day (as MM-DD) of the prime bike share season
+    cal: Optional[Dict[str, np.ndarray]]
+        calendar (see get_hourly_calendar), or None to create it
+
+    Returns
+    -------
+    np.ndarray
+        boolean array (user types x hours) of hours recommended by any rule
+        that applies to every user type
+    """
+    if cal is None:
+        cal = get_hourly_calendar(start_date, end_date, prime_season)
+    num_hours = cal["hours"].stop - cal["hours"].start
+    is_recommended = np.zeros((len(user_types), num_hours), dtype=bool)
+    for rule in rules.values():
+        if rule.get("sql") is not None:
+            mask = get_sql_rule_mask(
+                rule["sql"], start_date, end_date, user_types
+            )
+        else:
+            mask = np.broadcast_to(
+                get_rule_mask(rule, cal), is_recommended.shape
+            )
+        for k, user_type in enumerate(user_types):
+            if (
+                rule.get("user_types") is None
+                or user_type in rule["user_types"]
+            ):
+                is_recommended[k] |= mask[k]
+    return is_recommended
+
+
+def get_recommended_schedule(
+    rules: Dict[str, Dict],
+    start_date: str,
+    end_date: str,
+    user_types: List[str] = USER_TYPES,
+    prime_season: Tuple[str, str] = PRIME_SEASON,
+) -> pd.DataFrame:
+    """Get recommended hourly schedule of every user type.
+
+    Parameters
+    ----------
+    rules: Dict[str, Dict]
+        rules of recommended hours (see RULE_KEYS), by name of rule (rules
+        of selected stations are ignored, see get_recommended_intervals)
+    start_date: str
+        first hour of the schedule
+    end_date: str
+        last hour of the schedule (inclusive)
+    user_types: List[str]
+        user types for which hours are recommended
+    prime_season: Tuple[str, str]
+        first and last day (as MM-DD) of the prime bike share season
+
+    Returns
+    -------
+    pd.DataFrame
+        every hour of every user type (ordered by hour and user type), with
+        its month, day of the week, hour of the day, type of day and season,
+        whether it is recommended, the running total of recommended hours,
+        the total number of hours and the running fraction (%) of hours that
+        are recommended (see SCHEDULE_COLUMNS)
+    """
+    cal = get_hourly_calendar(start_date, end_date, prime_season)
+    rules = {k: r for k, r in rules.items() if r.get("station_ids") is None}
+    is_recommended = get_recommended_hours(
+        rules, start_date, end_date, user_types, prime_season, cal
+    )
+    num_user_types, num_hours = is_recommended.shape
+    hours_cumsum = np.cumsum(is_recommended, axis=1)
+    # position of the day of every hour, repeated for every user type
+    day_idx = np.repeat(
+        np.arange(len(cal["day"])).repeat(24)[cal["hours"]], num_user_types
+    )
+    datetimes = np.arange(
+        np.datetime64(pd.Timestamp(start_date), "h"),
+        np.datetime64(pd.Timestamp(end_date), "h") + 1,
+    )
+    df = pd.DataFrame(
+        {
+            "user_type": pd.Categorical.from_codes(
+                np.tile(np.arange(num_user_types), num_hours), user_types
+            ),
+            "datetime": np.repeat(datetimes, num_user_types).astype(
+                "datetime64[ns]"
+            ),
+            "month": pd.Categorical.from_codes(
+                cal["month"][day_idx], MONTH_NAMES
+            ),
+            "day_of_week": pd.Categorical.from_codes(
+                cal["day_of_week"][day_idx], DAY_NAMES
+            ),
+            "hour": np.repeat(
+                (np.arange(cal["hours"].start, cal["hours"].stop) % 24).astype(
+                    np.int8
+                ),
+                num_user_types,
+            ),
+            "type_of_day": pd.Categorical.from_codes(
+                cal["type_of_day"][day_idx], TYPES_OF_DAY
+            ),
+            "season": pd.Categorical.from_codes(
+                cal["season"][day_idx], SEASONS
+            ),
+            "is_recommended": is_recommended.T.ravel(),
+            "hours_cumsum": hours_cumsum.T.ravel(),
+            "total_hours": num_hours,
+            "frac_recommended_hours": 100 * hours_cumsum.T.ravel() / num_hours,
+        }
+    )
+    return df
+
+
+def get_intervals(
+    is_recommended: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Get first and last (exclusive) positions of runs of recommended hours.
+
+    Returns the row and the start and end positions of every run, of every
+    row of a boolean array (eg. user types x hours).
+    """
+    padded = np.pad(is_recommended.astype(np.int8), ((0, 0), (1, 1)))
+    rows, starts = np.nonzero(np.diff(padded, axis=1) == 1)
+    _, ends = np.nonzero(np.diff(padded, axis=1) == -1)
+    return rows, starts, ends
+
+
+def get_recommended_intervals(
+    rules: Dict[str, Dict],
+    start_date: str,
+    end_date: str,
+    user_types: List[str] = USER_TYPES,
+    station_ids: Optional[List[int]] = None,
+    prime_season: Tuple[str, str] = PRIME_SEASON,
+) -> pd.DataFrame:
+    """Get intervals of recommended hours of every user type and station.
+
+    Parameters
+    ----------
+    rules: Dict[str, Dict]
+        rules of recommended hours (see RULE_KEYS), by name of rule, whose
+        station_ids select the stations every rule applies to
+    start_date: str
+        first hour of the schedule
+    end_date: str
+        last hour of the schedule (inclusive)
+    user_types: List[str]
+        user types for which hours are recommended
+    station_ids: Optional[List[int]]
+        stations for which hours are recommended, or None for a schedule
+        that does not depend on stations (rules with station_ids are then
+        ignored)
+    prime_season: Tuple[str, str]
+        first and last day (as MM-DD) of the prime bike share season
+
+    Returns
+    -------
+    pd.DataFrame
+        station (if station_ids are given), user type, first hour
+        (started_at) and end (ended_at, exclusive) and number of hours of
+        every interval of consecutive recommended hours
+
+    Notes
+    -----
+    Stations to which the same rules apply share their schedule, which is
+    computed once per group of stations (rather than once per station), so
+    per-station schedules over multi-year horizons hold one row per interval
+    rather than one row per hour.
+    """
+    cal = get_hourly_calendar(start_date, end_date, prime_season)
+    start = np.datetime64(pd.Timestamp(start_date), "h")
+    if station_ids is None:
+        groups = {(): None}
+        rules = {
+            k: r for k, r in rules.items() if r.get("station_ids") is None
+        }
+    else:
+        # names of rules applying to every station
+        groups = {}
+        for station_id in station_ids:
+            names = tuple(
+                k
+                for k, r in rules.items()
+                if r.get("station_ids") is None
+                or station_id in r["station_ids"]
+            )
+            groups.setdefault(names, []).append(station_id)
+    dfs = []
+    for names, stations in groups.items():
+        is_recommended = get_recommended_hours(
+            {k: rules[k] for k in names} if stations else rules,
+            start_date,
+            end_date,
+            user_types,
+            prime_season,
+            cal,
+        )
+        rows, starts, ends = get_intervals(is_recommended)
+        df = pd.DataFrame(
+            {
+                "user_type": np.asarray(user_types)[rows],
+                "started_at": (start + starts).astype("datetime64[ns]"),
+                "ended_at": (start + ends).astype("datetime64[ns]"),
+                "hours": ends - starts,
+            }
+        )
+        if stations:
+            df = df.merge(pd.DataFrame({"station_id": stations}), how="cross")
+        dfs.append(df)
+    sort_by = (["station_id"] if station_ids is not None else []) + [
+        "user_type",
+        "started_at",
+    ]
+    df = pd.concat(dfs, ignore_index=True).sort_values(
+        by=sort_by, ignore_index=True
+    )
+    return df[sort_by[:-2] + ["user_type", "started_at", "ended_at", "hours"]]
+
+
+def get_calendar_rule_sql(
+    rule: Dict, prime_season: Tuple[str, str] = PRIME_SEASON
+) -> List[str]:
+    """Get SQL predicates of season, type of day and hours of a rule."""
+    first, last = prime_season
+    mmdd = "strftime(datetime, '%m-%d')"
+    is_prime = (
+        f"{mmdd} BETWEEN '{first}' AND '{last}'"
+        if first <= last
+        else f"({mmdd} >= '{first}' OR {mmdd} <= '{last}')"
+    )
+    predicates = []
+    if rule.get("season") is not None:
+        predicates.append(
+            is_prime if rule["season"] == SEASONS[0] else f"NOT ({is_prime})"
+        )
+    if rule.get("type_of_day") is not None:
+        negate = "NOT " if rule["type_of_day"] == TYPES_OF_DAY[0] else ""
+        predicates.append(f"dayofweek(datetime) {negate}IN (0, 6)")
+    hours = [
+        f"(hour(datetime) >= {start} AND hour(datetime) < {end})"
+        for start, end in rule.get("hours", [])
+    ]
+    predicates.append(f"({' OR '.join(hours) or 'false'})")
+    return predicates
+
+
+def get_rule_sql(
+    rule: Dict, prime_season: Tuple[str, str] = PRIME_SEASON
+) -> str:
+    """Get SQL predicate of a rule, on an hourly calendar (datetime column).
+
+    The predicate selects the same hours as get_rule_mask (or as the SQL
+    predicate of the rule), from a calendar with one row per hour and user
+    type (eg. a Cartesian product of user types and hours), and is used to
+    check the vectorised schedule.
+    """
+    if rule.get("sql") is not None:
+        predicates = [f"({rule['sql']})"]
+    else:
+        predicates = get_calendar_rule_sql(rule, prime_season)
+    if rule.get("user_types") is not None:
+        user_types = ", ".join(f"'{u}'" for u in rule["user_types"])
+        predicates.append(f"user_type IN ({user_types})")
+    return " AND ".join(predicates)
+
+
+def get_recommended_schedule_sql(
+    rules: Dict[str, Dict],
+    start_date: str,
+    end_date: str,
+    user_types: List[str] = USER_TYPES,
+    prime_season: Tuple[str, str] = PRIME_SEASON,
+) -> pd.DataFrame:
+    """Get recommended hourly schedule from a Cartesian product in DuckDB.
+
+    This builds the hourly calendar of every user type with
+    itertools.product, and selects recommended hours with the SQL predicate
+    of every rule. It is kept to check, and compare the speed of,
+    get_recommended_schedule.
+    """
+    dict_in = dict(
+        user_type=user_types,
+        datetime=pd.date_range(start_date, end_date, freq="h"),
+    )
+    df_calendar = pd.DataFrame(  # noqa: F841
+        list(product(*dict_in.values())), columns=list(dict_in)
+    )
+    is_recommended = " OR ".join(
+        f"({get_rule_sql(r, prime_season)})" for r in rules.values()
+    )
+    is_prime = get_rule_sql(
+        {"season": SEASONS[0], "hours": [(0, 24)]}, prime_season
+    )
+    query = f"""
+            WITH t1 AS (
+                SELECT *,
+                       MONTHNAME(datetime) AS month,
+                       DAYNAME(datetime) AS day_of_week,
+                       HOUR(datetime) AS hour,
+                       (
+                           CASE WHEN day_of_week IN ('Saturday', 'Sunday')
+                           THEN 'Weekend'
+                           ELSE 'Weekday'
+                           END
+                       ) AS type_of_day,
+                       (
+                           CASE WHEN {is_prime}
+                           THEN '{SEASONS[0]}'
+                           ELSE '{SEASONS[1]}'
+                           END
+                       ) AS season,
+                       COALESCE({is_recommended or 'false'}, false)
+                       AS is_recommended
+                FROM df_calendar
+            )
+            SELECT *,
+                   SUM(CAST(is_recommended AS INTEGER)) OVER(
+                       PARTITION BY user_type ORDER BY datetime
+                   ) AS hours_cumsum,
+                   COUNT(*) OVER(PARTITION BY user_type) AS total_hours,
+                   100 * hours_cumsum / total_hours AS frac_recommended_hours
+            FROM t1
+            ORDER BY datetime, user_type
+            """  # nosec
+    with duckdb.connect() as con:
+        df = con.sql(query).df()
+    return df
+
+
+def benchmark_recommended_schedule(
+    rules: Dict[str, Dict],
+    start_date: str,
+    end_dates: List[str],
+    user_types: List[str] = USER_TYPES,
+    num_stations: int = 600,
+    repeats: int = 3,
+) -> pd.DataFrame:
+    """Compare vectorised and Cartesian product recommended schedules.
+
+    Parameters
+    ----------
+    rules: Dict[str, Dict]
+        rules of recommended hours (see RULE_KEYS), by name of rule
+    start_date: str
+        first hour of every schedule
+    end_dates: List[str]
+        last hour of every schedule, one per horizon compared
+    user_types: List[str]
+        user types for which hours are recommended
+    num_stations: int
+        number of stations of per-station schedules (as intervals)
+    repeats: int
+        number of times every method is run (the fastest run is reported)
+
+    Returns
+    -------
+    pd.DataFrame
+        seconds taken by, and rows returned by, every method for every
+        horizon, and whether hourly schedules are identical to those of
+        the Cartesian product
+    """
+    records = []
+    for end_date in end_dates:
+        methods = {
+            "product_sql": lambda: get_recommended_schedule_sql(
+                rules, start_date, end_date, user_types
+            ),
+            "vectorised": lambda: get_recommended_schedule(
+                rules, start_date, end_date, user_types
+            ),
+            "intervals": lambda: get_recommended_intervals(
+                rules, start_date, end_date, user_types
+            ),
+            "station_intervals": lambda: get_recommended_intervals(
+                rules,
+                start_date,
+                end_date,
+                user_types,
+                list(range(num_stations)),
+            ),
+        }
+        results, seconds_taken = {}, {}
+        for name, method in methods.items():
+            seconds = []
+            for _ in range(repeats):
+                with Timer() as t:
+                    results[name] = method()
+                seconds.append(t.elapsed)
+            seconds_taken[name] = min(seconds)
+        expected, df = results["product_sql"], results["vectorised"]
+        identical = (
+            df.astype({c: "str" for c in df.select_dtypes("category")})
+            .astype(expected.dtypes.to_dict())
+            .equals(expected[SCHEDULE_COLUMNS])
+        )
+        for name, seconds in seconds_taken.items():
+            records.append(
+                {
+                    "end_date": end_date,
+                    "method": name,
+                    "rows": len(results[name]),
+                    "seconds": seconds,
+                    # only hourly schedules are compared
+                    "identical": {
+                        "product_sql": True,
+                        "vectorised": identical,
+                    }.get(name),
+                }
+            )
+    df = pd.DataFrame.from_records(records)
+    return df
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Compare generators of the recommended hourly schedule."
+    )
+    parser.add_argument(
+        "--start-date",
+        default="2023-05-22 00:00:00",
+        help="first hour of the recommended schedule",
+    )
+    parser.add_argument(
+        "--years",
+        type=int,
+        nargs="+",
+        default=[1, 5, 10],
+        help="horizons (in years) of the recommended schedule",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Benchmark recommended schedules over multi-year horizons."""
+    args = parse_args()
+    rules = {
+        "weekday_prime": {
+            "season": SEASONS[0],
+            "type_of_day": "Weekday",
+            "hours": [(7, 11), (16, 20)],
+        },
+        "weekend_prime": {
+            "season": SEASONS[0],
+            "type_of_day": "Weekend",
+            "hours": [(12, 14)],
+        },
+        "weekday_offseason": {
+            "season": SEASONS[1],
+            "type_of_day": "Weekday",
+            "hours": [(7, 10), (16, 19)],
+        },
+    }
+    start = pd.Timestamp(args.start_date)
+    end_dates = [
+        str(start + pd.DateOffset(years=y) - pd.Timedelta(hours=1))
+        for y in args.years
+    ]
+    df = benchmark_recommended_schedule(rules, args.start_date, end_dates)
+    print(df.round(4).to_string())
+
+
+if __name__ == "__main__":
+    main()
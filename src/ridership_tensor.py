@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define utilities to build and query a dense station ridership tensor."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import os
+from typing import Dict, List, Optional, Union
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+import trip_dedup as tdd
+
+# axes of the tensor, in order
+TENSOR_DIMS = ["direction", "station_id", "date", "hour", "user_type"]
+DIRECTIONS = ["departures", "arrivals"]
+TENSOR_FNAME = "ridership_tensor"
+
+
+def get_tensor_fpaths(tensor_dir: str) -> Dict[str, str]:
+    """Get filepaths to tensor and its index sidecar files."""
+    fpaths = {
+        k: os.path.join(tensor_dir, f"{TENSOR_FNAME}__{k}.npy")
+        for k in ["stations", "dates", "user_types"]
+    }
+    fpaths["tensor"] = os.path.join(tensor_dir, f"{TENSOR_FNAME}.npy")
+    return fpaths
+
+
+def get_hourly_station_trips(fpaths: List[str]) -> Dict[str, np.ndarray]:
+    """Get hourly departures and arrivals by station and user type."""
+    count_sql = tdd.get_trips_count_sql(fpaths)
+    query = f"""
+            WITH t1 AS (
+                SELECT *,
+                       COALESCE(user_type, 'Unknown') AS user_type_filled
+                FROM read_parquet({fpaths})
+            ),
+            -- 1. get hourly departures by station and user type
+            t2 AS (
+                SELECT 0 AS direction,
+                       start_station_id AS station_id,
+                       CAST(started_at AS DATE) AS date,
+                       HOUR(started_at) AS hour,
+                       user_type_filled AS user_type,
+                       {count_sql} AS trips
+                FROM t1
+                WHERE start_station_id IS NOT NULL
+                GROUP BY ALL
+            ),
+            -- 2. get hourly arrivals by station and user type (trips are
+            -- assigned to the hour during which they started)
+            t3 AS (
+                SELECT 1 AS direction,
+                       end_station_id AS station_id,
+                       CAST(started_at AS DATE) AS date,
+                       HOUR(started_at) AS hour,
+                       user_type_filled AS user_type,
+                       {count_sql} AS trips
+                FROM t1
+                WHERE end_station_id IS NOT NULL
+                GROUP BY ALL
+            )
+            SELECT *
+            FROM t2
+            UNION ALL
+            SELECT *
+            FROM t3
+            """  # nosec
+    return duckdb.sql(query).fetchnumpy()
+
+
+def build_ridership_tensor(
+    fpaths: List[str], tensor_dir: str, verbose: bool = False
+) -> Dict[str, str]:
+    """Build (direction, station, date, hour, user type) tensor of trips.
+
+    Parameters
+    ----------
+    fpaths: List[str]
+        filepaths to processed trips (at least one)
+    tensor_dir: str
+        directory in which tensor and index sidecar files are written
+    verbose: bool
+        whether to show the shape and size of the tensor
+
+    Returns
+    -------
+    Dict[str, str]
+        filepaths to the tensor and its station, date and user type indexes
+        (the tensor is empty if there are no trips)
+    """
+    if not fpaths:
+        raise ValueError("No processed trips files to build tensor from")
+    trips = get_hourly_station_trips(fpaths)
+    stations = np.unique(trips["station_id"]).astype(np.int32)
+    user_types = np.unique(trips["user_type"].astype(str))
+    day = trips["date"].astype("datetime64[D]")
+    if len(day) > 0:
+        dates = np.arange(day.min(), day.max() + 1, dtype="datetime64[D]")
+        dtype = np.min_scalar_type(int(trips["trips"].max()))
+    else:
+        # files without trips (at stations) give an empty tensor
+        dates = np.array([], dtype="datetime64[D]")
+        dtype = np.dtype(np.uint8)
+    shape = (len(DIRECTIONS), len(stations), len(dates), 24, len(user_types))
+
+    # fill tensor on disk, so that it does not need to fit into memory
+    fpaths_tensor = get_tensor_fpaths(tensor_dir)
+    tensor = np.lib.format.open_memmap(
+        fpaths_tensor["tensor"], mode="w+", dtype=dtype, shape=shape
+    )
+    tensor[
+        trips["direction"],
+        np.searchsorted(stations, trips["station_id"]),
+        np.searchsorted(dates, day),
+        trips["hour"],
+        np.searchsorted(user_types, trips["user_type"].astype(str)),
+    ] = trips["trips"]
+    tensor.flush()
+    del tensor
+    for k, index in zip(
+        ["stations", "dates", "user_types"], [stations, dates, user_types]
+    ):
+        np.save(fpaths_tensor[k], index)
+    if verbose:
+        size_mb = np.prod(shape) * dtype.itemsize / 1024**2
+        print(
+            f"Exported {dtype} tensor with shape {shape} ({size_mb:,.1f} MB) "
+            f"to {os.path.abspath(fpaths_tensor['tensor'])}"
+        )
+    return fpaths_tensor
+
+
+def load_ridership_tensor(tensor_dir: str) -> Dict[str, np.ndarray]:
+    """Load memory-mapped ridership tensor and its indexes."""
+    fpaths_tensor = get_tensor_fpaths(tensor_dir)
+    rt = {
+        k: np.load(fpath, mmap_mode="r" if k == "tensor" else None)
+        for k, fpath in fpaths_tensor.items()
+    }
+    return rt
+
+
+def get_day_of_week(dates: np.ndarray) -> np.ndarray:
+    """Get day of week (Monday=0, Sunday=6) of datetime64[D] array."""
+    # 1970-01-01 was a Thursday
+    return (dates.astype(np.int64) + 3) % 7
+
+
+def slice_ridership_tensor(
+    rt: Dict[str, np.ndarray],
+    direction: str = "departures",
+    station_ids: Optional[List[int]] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    hours: Optional[List[int]] = None,
+    days_of_week: Optional[List[int]] = None,
+    user_types: Optional[List[str]] = None,
+) -> Dict[str, Union[np.ndarray, List[str]]]:
+    """Slice tensor of trips, along with the indexes of the slice.
+
+    Parameters
+    ----------
+    rt: Dict[str, np.ndarray]
+        ridership tensor and indexes (see load_ridership_tensor)
+    direction: str
+        one of departures or arrivals
+    station_ids: Optional[List[int]]
+        stations to select (all by default)
+    start_date: Optional[str]
+        first date (inclusive) to select
+    end_date: Optional[str]
+        last date (inclusive) to select
+    hours: Optional[List[int]]
+        hours of day (0 to 23) to select
+    days_of_week: Optional[List[int]]
+        days of week (Monday=0, Sunday=6) to select
+    user_types: Optional[List[str]]
+        user types to select
+
+    Returns
+    -------
+    Dict[str, Union[np.ndarray, List[str]]]
+        sliced tensor (station, date, hour, user type) and its indexes
+    """
+    dates = rt["dates"]
+    # slice contiguous date range first, since this only maps the pages of
+    # the tensor that fall within the range
+    date_start = (
+        np.searchsorted(dates, np.datetime64(start_date, "D"))
+        if start_date
+        else 0
+    )
+    date_end = (
+        np.searchsorted(dates, np.datetime64(end_date, "D"), side="right")
+        if end_date
+        else len(dates)
+    )
+    tensor = rt["tensor"][DIRECTIONS.index(direction), :, date_start:date_end]
+    idx = {
+        "station_id": rt["stations"],
+        "date": dates[date_start:date_end],
+        "hour": np.arange(24),
+        "user_type": rt["user_types"],
+    }
+    masks = {
+        "station_id": (
+            np.isin(idx["station_id"], station_ids) if station_ids else None
+        ),
+        "date": (
+            np.isin(get_day_of_week(idx["date"]), days_of_week)
+            if days_of_week
+            else None
+        ),
+        "hour": np.isin(idx["hour"], hours) if hours else None,
+        "user_type": (
+            np.isin(idx["user_type"], user_types) if user_types else None
+        ),
+    }
+    for axis, (dim, mask) in enumerate(masks.items()):
+        if mask is not None:
+            tensor = np.compress(mask, tensor, axis=axis)
+            idx[dim] = idx[dim][mask]
+    return {"tensor": tensor, **idx}
+
+
+def sum_ridership_tensor(
+    rt: Dict[str, np.ndarray], by: List[str] = ["station_id"], **filters
+) -> pd.DataFrame:
+    """Get total trips grouped by one or more tensor dimensions.
+
+    Parameters
+    ----------
+    rt: Dict[str, np.ndarray]
+        ridership tensor and indexes (see load_ridership_tensor)
+    by: List[str]
+        dimensions (station_id, date, hour, user_type) to group trips by
+    filters
+        direction, stations, dates, hours, days of week and user types to
+        select (see slice_ridership_tensor)
+
+    Returns
+    -------
+    pd.DataFrame
+        total trips, with one row per combination of the grouped dimensions
+    """
+    sliced = slice_ridership_tensor(rt, **filters)
+    dims = TENSOR_DIMS[1:]
+    axes = tuple(k for k, dim in enumerate(dims) if dim not in by)
+    totals = sliced["tensor"].sum(axis=axes, dtype=np.int64)
+    kept = [dim for dim in dims if dim in by]
+    index = pd.MultiIndex.from_product(
+        [sliced[dim] for dim in kept], names=kept
+    )
+    df = pd.DataFrame(
+        {filters.get("direction", "departures"): totals.ravel()},
+        index=index,
+    ).reset_index()
+    return df
+
+
+def get_station_trips(rt: Dict[str, np.ndarray], **filters) -> pd.DataFrame:
+    """Get departures and arrivals by station."""
+    df = sum_ridership_tensor(
+        rt, ["station_id"], direction="departures", **filters
+    ).merge(
+        sum_ridership_tensor(
+            rt, ["station_id"], direction="arrivals", **filters
+        ),
+        on="station_id",
+        how="left",
+    )
+    return df
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define mergeable sketches of processed trips for approximate metrics."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import os
+from glob import glob
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# HyperLogLog precision (number of registers is 2**HLL_PRECISION), with a
+# relative standard error of 1.04/sqrt(2**HLL_PRECISION) (0.81%)
+HLL_PRECISION = 14
+# relative accuracy of quantiles of trip duration (in seconds), which are
+# counted in logarithmically-sized buckets (up to one day)
+DURATION_ACCURACY = 0.01
+DURATION_GAMMA = (1 + DURATION_ACCURACY) / (1 - DURATION_ACCURACY)
+DURATION_BUCKETS = int(np.ceil(np.log(24 * 60 * 60) / np.log(DURATION_GAMMA)))
+# columns of processed trips whose distinct values are counted
+SKETCH_DISTINCT_COLUMNS = [
+    "trip_id",
+    "bike_id",
+    "start_station_id",
+    "end_station_id",
+]
+
+
+def get_hashes(values: pd.Series) -> np.ndarray:
+    """Get 64-bit hashes of non-missing values."""
+    return pd.util.hash_pandas_object(values.dropna(), index=False).to_numpy()
+
+
+def get_id_hashes(values: pa.Array) -> np.ndarray:
+    """Get 64-bit hashes of non-missing IDs, as 64-bit integers.
+
+    Missing values are dropped before conversion to NumPy, so IDs are
+    hashed as int64 (rather than float64) whether or not any are missing.
+    """
+    ids = pc.drop_null(values.cast(pa.int64())).to_numpy()
+    return get_hashes(pd.Series(ids, dtype="int64"))
+
+
+def get_bit_length(x: np.ndarray) -> np.ndarray:
+    """Get number of bits needed to represent unsigned 64-bit integers."""
+    # split into 32-bit halves, which are represented exactly as floats
+    hi, lo = (x >> np.uint64(32)), (x & np.uint64(0xFFFFFFFF))
+    bits_hi = np.frexp(hi.astype(np.float64))[1]
+    bits_lo = np.frexp(lo.astype(np.float64))[1]
+    return np.where(hi > 0, 32 + bits_hi, bits_lo)
+
+
+def update_hll(
+    registers: np.ndarray, hashes: np.ndarray, p: int = HLL_PRECISION
+) -> np.ndarray:
+    """Add hashed values to HyperLogLog registers."""
+    idx = (hashes >> np.uint64(64 - p)).astype(np.int64)
+    remainder = hashes & np.uint64((1 << (64 - p)) - 1)
+    # position of first 1-bit in remaining (64-p) bits
+    rank = (64 - p) - get_bit_length(remainder) + 1
+    np.maximum.at(registers, idx, rank.astype(np.uint8))
+    return registers
+
+
+def get_hll_estimate(registers: np.ndarray) -> float:
+    """Estimate number of distinct values from HyperLogLog registers."""
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m**2 / np.sum(np.power(2.0, -registers.astype(float)))
+    num_zeros = np.count_nonzero(registers == 0)
+    if estimate <= 2.5 * m and num_zeros > 0:
+        # linear counting is more accurate for small cardinalities
+        estimate = m * np.log(m / num_zeros)
+    return float(estimate)
+
+
+def get_hll_relative_error(p: int = HLL_PRECISION) -> float:
+    """Get relative standard error of HyperLogLog estimates."""
+    return 1.04 / np.sqrt(2**p)
+
+
+def get_hll_nunique(values: pd.Series, p: int = HLL_PRECISION) -> float:
+    """Estimate number of distinct non-missing values using HyperLogLog."""
+    registers = np.zeros(2**p, dtype=np.uint8)
+    return get_hll_estimate(update_hll(registers, get_hashes(values), p))
+
+
+def update_duration_counts(
+    counts: np.ndarray, durations: np.ndarray
+) -> np.ndarray:
+    """Add trip durations (in seconds) to logarithmic bucket counts."""
+    durations = durations[~np.isnan(durations)]
+    buckets = np.ceil(
+        np.log(np.maximum(durations, 1)) / np.log(DURATION_GAMMA)
+    ).astype(np.int64)
+    counts += np.bincount(
+        np.clip(buckets, 0, DURATION_BUCKETS - 1), minlength=DURATION_BUCKETS
+    )
+    return counts
+
+
+def get_duration_quantiles(
+    counts: np.ndarray, quantiles: List[float]
+) -> np.ndarray:
+    """Estimate quantiles of trip duration from bucket counts.
+
+    Every estimate is within DURATION_ACCURACY (relative error) of the
+    exact quantile, for durations between one second and one day.
+    """
+    rank = np.asarray(quantiles) * (counts.sum() - 1)
+    buckets = np.searchsorted(np.cumsum(counts), rank, side="right")
+    return 2 * DURATION_GAMMA**buckets / (DURATION_GAMMA + 1)
+
+
+def get_sketch_fpath(fpath: str) -> str:
+    """Get filepath to sketches of processed trips file."""
+    fname = os.path.basename(fpath).replace("processed__", "sketches__")
+    return os.path.join(
+        os.path.dirname(fpath), fname.replace(".parquet.gzip", ".npz")
+    )
+
+
+def build_trip_sketches(fpath: str, batch_size: int = 500_000) -> str:
+    """Build sketches of processed trips file, one batch at a time.
+
+    Parameters
+    ----------
+    fpath: str
+        filepath to processed trips
+    batch_size: int
+        number of trips read into memory at a time
+
+    Returns
+    -------
+    str
+        filepath to sketches, stored next to processed trips
+
+    Notes
+    -----
+    Sketches are HyperLogLog registers of distinct values of every column
+    in SKETCH_DISTINCT_COLUMNS, and counts of trip durations in
+    logarithmically-sized buckets.
+    """
+    registers = {
+        c: np.zeros(2**HLL_PRECISION, dtype=np.uint8)
+        for c in SKETCH_DISTINCT_COLUMNS
+    }
+    duration_counts = np.zeros(DURATION_BUCKETS, dtype=np.int64)
+    num_trips = 0
+    pf = pq.ParquetFile(fpath)
+    for batch in pf.iter_batches(
+        batch_size=batch_size,
+        columns=SKETCH_DISTINCT_COLUMNS + ["started_at", "ended_at"],
+    ):
+        # trip and station IDs are strings in some years
+        for c in SKETCH_DISTINCT_COLUMNS:
+            update_hll(registers[c], get_id_hashes(batch.column(c)))
+        durations = (
+            batch.column("ended_at").to_pandas()
+            - batch.column("started_at").to_pandas()
+        ).dt.total_seconds()
+        update_duration_counts(duration_counts, durations.to_numpy())
+        num_trips += batch.num_rows
+    fpath_sketch = get_sketch_fpath(fpath)
+    np.savez(
+        fpath_sketch,
+        num_trips=num_trips,
+        duration_counts=duration_counts,
+        **{f"hll__{c}": r for c, r in registers.items()},
+    )
+    return fpath_sketch
+
+
+def merge_trip_sketches(fpaths: List[str]) -> Dict[str, np.ndarray]:
+    """Merge sketches of multiple processed trips files."""
+    merged = {}
+    for f in fpaths:
+        with np.load(f) as sketch:
+            for k in sketch.files:
+                if k not in merged:
+                    merged[k] = sketch[k].copy()
+                elif k.startswith("hll__"):
+                    merged[k] = np.maximum(merged[k], sketch[k])
+                else:
+                    merged[k] = merged[k] + sketch[k]
+    return merged
+
+
+def get_sketch_fpaths(
+    data_dir: str, years: Optional[List[int]] = None
+) -> List[str]:
+    """Get most recent sketches of every processed trips file."""
+    latest = {}
+    for f in sorted(glob(os.path.join(data_dir, "sketches__trips_*.npz"))):
+        latest[os.path.basename(f).rsplit("__", 1)[0]] = f
+    fpaths = [
+        f
+        for k, f in sorted(latest.items())
+        if not years or int(k.split("_")[3]) in years
+    ]
+    return fpaths
+
+
+def get_approximate_trip_metrics(
+    data_dir: str,
+    years: Optional[List[int]] = None,
+    quantiles: List[float] = [0.5, 0.9, 0.99],
+) -> pd.DataFrame:
+    """Get approximate distinct counts and trip duration quantiles.
+
+    Parameters
+    ----------
+    data_dir: str
+        directory containing processed trips and their sketches
+    years: Optional[List[int]]
+        years of processed trips to be included, or all years if None
+    quantiles: List[float]
+        quantiles of trip duration to be estimated
+
+    Returns
+    -------
+    pd.DataFrame
+        estimate, and lower and upper bound, of every metric
+
+    Notes
+    -----
+    Bounds of distinct counts are two standard errors (approximately 95%
+    confidence) from the estimate. Bounds of trip duration quantiles are
+    guaranteed (deterministic).
+    """
+    sketch = merge_trip_sketches(get_sketch_fpaths(data_dir, years))
+    records = [
+        {
+            "metric": "trips",
+            "estimate": float(sketch["num_trips"]),
+            "lower": float(sketch["num_trips"]),
+            "upper": float(sketch["num_trips"]),
+        }
+    ]
+    rse = get_hll_relative_error()
+    for c in SKETCH_DISTINCT_COLUMNS:
+        estimate = get_hll_estimate(sketch[f"hll__{c}"])
+        records.append(
+            {
+                "metric": f"distinct_{c}",
+                "estimate": estimate,
+                "lower": estimate * (1 - 2 * rse),
+                "upper": estimate * (1 + 2 * rse),
+            }
+        )
+    for q, estimate in zip(
+        quantiles, get_duration_quantiles(sketch["duration_counts"], quantiles)
+    ):
+        records.append(
+            {
+                "metric": f"trip_duration_p{100 * q:g}",
+                "estimate": estimate,
+                "lower": estimate / (1 + DURATION_ACCURACY),
+                "upper": estimate / (1 - DURATION_ACCURACY),
+            }
+        )
+    df = pd.DataFrame.from_records(records)
+    return df
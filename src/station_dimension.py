@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define a slowly-changing dimension of bike share stations."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import os
+from glob import glob
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+import file_utils as flut
+
+# station ID and name columns of processed trips, and the datetime column
+# at which every station was used
+STATION_COLUMNS = {
+    "start_station_id": ("start_station_name", "started_at"),
+    "end_station_id": ("end_station_name", "ended_at"),
+}
+STATION_NAME_COLUMNS = [name for name, _ in STATION_COLUMNS.values()]
+# columns (and datatypes) of names of stations used in processed trips
+STATION_NAMES_DTYPES = {
+    "station_id": "int32",
+    "name": "str",
+    "trips": "int64",
+    "first_seen": "datetime64[ns]",
+    "last_seen": "datetime64[ns]",
+}
+# attributes of currently active stations added to the station dimension
+STATION_INFO_COLUMNS = ["lat", "lon", "Neighbourhood", "census_tract_id"]
+STATION_DIMENSION_PREFIX = "station_dimension"
+
+
+def get_station_names_fpath(fpath: str) -> str:
+    """Get filepath to names of stations used in processed trips file."""
+    fname = os.path.basename(fpath).replace("processed__", "stations__")
+    return os.path.join(os.path.dirname(fpath), fname)
+
+
+def get_station_names(df: pd.DataFrame) -> pd.DataFrame:
+    """Get number of trips and first and last use of every station name."""
+    df_names = (
+        pd.concat(
+            [
+                df[[sid, name, dt]].set_axis(
+                    ["station_id", "name", "used_at"], axis=1
+                )
+                for sid, (name, dt) in STATION_COLUMNS.items()
+            ],
+            ignore_index=True,
+        )
+        .astype({"name": "str"})
+        .groupby(["station_id", "name"], as_index=False, observed=True)
+        .agg(
+            trips=("used_at", "size"),
+            first_seen=("used_at", "min"),
+            last_seen=("used_at", "max"),
+        )
+        .astype(STATION_NAMES_DTYPES)
+        .sort_values(by=["station_id", "name"], ignore_index=True)
+    )
+    return df_names
+
+
+def get_station_names_sql(source: str) -> str:
+    """Get SQL to get trips and first and last use of every station name."""
+    sides = []
+    for sid, (name, dt) in STATION_COLUMNS.items():
+        query = f"""
+                SELECT {sid} AS station_id, {name} AS name, {dt} AS used_at
+                FROM ({source})
+                """  # nosec
+        sides.append(query)
+    query = f"""
+            SELECT CAST(station_id AS INTEGER) AS station_id,
+                   name,
+                   COUNT(*) AS trips,
+                   MIN(used_at) AS first_seen,
+                   MAX(used_at) AS last_seen
+            FROM ({' UNION ALL '.join(sides)})
+            WHERE name IS NOT NULL
+            GROUP BY ALL
+            ORDER BY station_id, name
+            """  # nosec
+    return query
+
+
+def get_canonical_names(df_names: pd.DataFrame) -> pd.DataFrame:
+    """Get most used name of every station in every processed trips file.
+
+    Ties are broken by using the most recently used name.
+    """
+    df = (
+        df_names.sort_values(
+            by=["source", "station_id", "trips", "last_seen"],
+            ascending=[True, True, False, False],
+        )
+        .groupby(["source", "station_id"], as_index=False, sort=False)
+        .agg(
+            name=("name", "first"),
+            first_seen=("first_seen", "min"),
+            last_seen=("last_seen", "max"),
+        )
+        .sort_values(by=["station_id", "first_seen"], ignore_index=True)
+    )
+    return df
+
+
+def get_station_versions(df_canonical: pd.DataFrame) -> pd.DataFrame:
+    """Merge consecutive periods in which a station used the same name.
+
+    Every version of a station is valid from its first use until the first
+    use of the next version (valid_from of the first version, and valid_to
+    of the last version, are missing since they are open-ended).
+    """
+    new_version = (
+        df_canonical["station_id"].ne(df_canonical["station_id"].shift())
+    ) | df_canonical["name"].ne(df_canonical["name"].shift())
+    df = (
+        df_canonical.assign(version=new_version.cumsum())
+        .groupby("version", as_index=False)
+        .agg(
+            station_id=("station_id", "first"),
+            name=("name", "first"),
+            valid_from=("first_seen", "min"),
+        )
+        .drop(columns=["version"])
+    )
+    is_first = df["station_id"].ne(df["station_id"].shift())
+    is_last = df["station_id"].ne(df["station_id"].shift(-1))
+    df["valid_to"] = df["valid_from"].shift(-1).where(~is_last)
+    df["valid_from"] = df["valid_from"].where(~is_first)
+    return df
+
+
+def get_station_info(fpath_stations_info: str) -> pd.DataFrame:
+    """Get attributes of currently active stations, by station ID."""
+    df = pd.read_parquet(
+        fpath_stations_info, columns=["station_id"] + STATION_INFO_COLUMNS
+    )
+    # station IDs are strings in the station information (GBFS) feed
+    df["station_id"] = pd.to_numeric(df["station_id"], errors="coerce")
+    return (
+        df.dropna(subset=["station_id"])
+        .astype({"station_id": "int32"})
+        .drop_duplicates(subset=["station_id"])
+    )
+
+
+def build_station_dimension(
+    data_dir: str,
+    fpath_stations_info: Optional[str] = None,
+    verbose: bool = False,
+) -> str:
+    """Build slowly-changing dimension of stations used in processed trips.
+
+    Parameters
+    ----------
+    data_dir: str
+        directory containing names of stations used in every processed
+        trips file (see get_station_names), to which the station dimension
+        is exported
+    fpath_stations_info: Optional[str]
+        filepath to attributes of currently active stations, or None if
+        station attributes are not available
+    verbose: bool
+        whether to show the number of stations and station versions
+
+    Returns
+    -------
+    str
+        filepath to station dimension, with one row per station version
+        (station_key, station_id, name, valid_from, valid_to and station
+        attributes)
+
+    Notes
+    -----
+    1. A new version of a station is created when its most used name changes
+       between processed trips files.
+    2. Station attributes are only available for currently active stations,
+       and are used for all versions of a station.
+    """
+    latest = {}
+    for f in sorted(glob(os.path.join(data_dir, "stations__trips_*"))):
+        latest[os.path.basename(f).rsplit("__", 1)[0]] = f
+    df_names = pd.concat(
+        [pd.read_parquet(f).assign(source=k) for k, f in latest.items()],
+        ignore_index=True,
+    )
+    df = get_station_versions(get_canonical_names(df_names))
+    if fpath_stations_info:
+        df = df.merge(
+            get_station_info(fpath_stations_info), on="station_id", how="left"
+        )
+    else:
+        df = df.assign(**{c: np.nan for c in STATION_INFO_COLUMNS})
+    df = df.assign(
+        station_key=lambda df: np.arange(1, len(df) + 1, dtype=np.int32)
+    )[
+        ["station_key", "station_id", "name", "valid_from", "valid_to"]
+        + STATION_INFO_COLUMNS
+    ]
+    if verbose:
+        print(
+            f"Found {len(df):,} versions of {df['station_id'].nunique():,} "
+            "stations"
+        )
+    return flut.load(df, data_dir, STATION_DIMENSION_PREFIX)
+
+
+def get_station_join_sql(
+    trips: str, stations: str, columns: List[str] = ["name"]
+) -> str:
+    """Get SQL to add attributes of start and end stations to trips.
+
+    Parameters
+    ----------
+    trips: str
+        table (or table function) of processed trips
+    stations: str
+        table (or table function) of the station dimension
+    columns: List[str]
+        station attributes added to trips (as start_station_{column} and
+        end_station_{column})
+
+    Returns
+    -------
+    str
+        query joining trips to the version of their start and end station
+        that was valid at the start and end of every trip
+    """
+    joins, selected = [], []
+    for k, (sid, (_, dt)) in enumerate(STATION_COLUMNS.items()):
+        prefix = sid.replace("_id", "")
+        joins.append(
+            f"""
+            LEFT JOIN {stations} AS s{k}
+            ON t.{sid} = s{k}.station_id
+            AND (s{k}.valid_from IS NULL OR t.{dt} >= s{k}.valid_from)
+            AND (s{k}.valid_to IS NULL OR t.{dt} < s{k}.valid_to)
+            """
+        )
+        selected += [f"s{k}.{c} AS {prefix}_{c}" for c in columns]
+    query = f"""
+            SELECT t.*, {', '.join(selected)}
+            FROM {trips} AS t
+            {''.join(joins)}
+            """  # nosec
+    return query
+
+
+def join_station_attributes(
+    df: pd.DataFrame, df_stations: pd.DataFrame, columns: List[str] = ["name"]
+) -> pd.DataFrame:
+    """Add attributes of start and end stations to trips (see SQL version)."""
+    df_stations = df_stations.assign(
+        valid_from=lambda df: df["valid_from"].fillna(pd.Timestamp.min)
+    ).sort_values(by=["valid_from"])
+    for sid, (_, dt) in STATION_COLUMNS.items():
+        if sid not in df:
+            continue
+        prefix = sid.replace("_id", "")
+        df_attrs = pd.merge_asof(
+            df[[sid, dt]]
+            .assign(row=np.arange(len(df)))
+            .sort_values(by=[dt])
+            .astype({sid: "int32"}),
+            df_stations[["station_id", "valid_from"] + columns].rename(
+                columns={"station_id": sid}
+            ),
+            left_on=dt,
+            right_on="valid_from",
+            by=sid,
+            direction="backward",
+        ).sort_values(by=["row"])
+        df = df.assign(
+            **{f"{prefix}_{c}": df_attrs[c].to_numpy() for c in columns}
+        )
+    return df
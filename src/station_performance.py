@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define utilities to evaluate the performance of bike share stations."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+import numpy as np
+import pandas as pd
+from contexttimer import Timer
+
+import aggregate_cube as ac
+
+# metrics by which stations are ranked, as (name used in rank columns,
+# trips column), with {variant} replaced by the day-of-week variant
+RANK_METRICS = {
+    "deps_last_year": "departures{variant}_last_year",
+    "arrs_last_year": "arrivals{variant}_last_year",
+    "deps_last_n_years": "departures{variant}_last_n_years",
+    "arrs_last_n_years": "arrivals{variant}_last_n_years",
+}
+# day-of-week variants of station scores, as (suffix of columns, whether
+# trips started on a weekend, or None for all trips)
+SCORE_VARIANTS = {"": None, "_weekday": False, "_weekend": True}
+# operators of geospatial filters of station attributes
+FILTER_OPERATORS = {
+    "==": lambda s, v: s.eq(v),
+    "!=": lambda s, v: s.ne(v),
+    "<": lambda s, v: s.lt(v),
+    "<=": lambda s, v: s.le(v),
+    ">": lambda s, v: s.gt(v),
+    ">=": lambda s, v: s.ge(v),
+    "in": lambda s, v: s.isin(v),
+    "not in": lambda s, v: ~s.isin(v),
+}
+STATION_SCORES_TRIPS_FNAME = "station_scores__trips.parquet"
+STATION_SCORES_TOTALS_FNAME = "station_scores__totals.parquet"
+STATION_SCORES_FILTERS_FNAME = "station_scores__filters.parquet"
+STATION_SCORES_MANIFEST_FNAME = "station_scores__manifest.json"
+
+
+def get_market_penetration_curve(
+    df: pd.DataFrame,
+    num_stations_selected: int,
+    trips_col: str = "departures_last_year",
+    year: int = 2022,
+    min_stations: int = 10,
+    step: int = 2,
+    max_stations: Optional[int] = None,
+) -> pd.DataFrame:
+    """Get fraction of trips captured by the top-N stations, for every N.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        trips per station
+    num_stations_selected: int
+        number of stations selected as top-performers
+    trips_col: str
+        column with trips per station, used to rank stations
+    year: int
+        year during which trips were taken
+    min_stations: int
+        smallest number of top-ranked stations (N)
+    step: int
+        increment between consecutive values of N
+    max_stations: Optional[int]
+        largest number of top-ranked stations (exclusive), or the number of
+        stations if None
+
+    Returns
+    -------
+    pd.DataFrame
+        fraction of trips (%) taken at the top-N stations, for every N
+
+    Notes
+    -----
+    Ties are handled as in SQL, with RANK() and SUM() OVER(ORDER BY ...).
+    Tied stations share the same rank and the running total of trips
+    includes all tied stations.
+    """
+    trips = np.sort(df[trips_col].to_numpy(dtype=np.int64))[::-1]
+    cumsum = np.cumsum(trips)
+    # first position of every group of tied stations gives its rank, while the
+    # last position gives its running total of trips (peers are included)
+    first = np.searchsorted(-trips, -trips, side="left")
+    last = np.searchsorted(-trips, -trips, side="right") - 1
+    rank = first + 1
+    frac_trips = 100 * cumsum[last] / cumsum[-1]
+
+    num_stations = np.arange(min_stations, max_stations or len(trips), step)
+    # running total of the lowest-ranked station with rank <= N
+    idx = np.searchsorted(rank, num_stations, side="right") - 1
+    df_curve = pd.DataFrame(
+        {
+            "year": year,
+            "frac_trips_last_year": frac_trips[idx],
+            "num_stations": num_stations,
+            "num_stations_selected": num_stations_selected,
+        }
+    ).convert_dtypes()
+    return df_curve
+
+
+def get_rank_thresholds(num_top_stations: int) -> Dict[str, int]:
+    """Get the same highest rank of top-performers in every metric."""
+    return {metric: num_top_stations for metric in RANK_METRICS}
+
+
+def get_partition_station_trips(fpaths_partition: List[str]) -> pd.DataFrame:
+    """Get departures and arrivals by station, year and weekend, per partition.
+
+    Parameters
+    ----------
+    fpaths_partition: List[str]
+        filepaths to cube partitions (see aggregate_cube)
+
+    Returns
+    -------
+    pd.DataFrame
+        departures and arrivals by cube partition, station, year and whether
+        trips started on a weekend
+    """
+    query = f"""
+            SELECT filename AS partition,
+                   CAST(station_id AS INTEGER) AS station_id,
+                   CAST(year AS SMALLINT) AS year,
+                   day_of_week >= 5 AS is_weekend,
+                   SUM(trips) FILTER (direction = 'departures') AS departures,
+                   SUM(trips) FILTER (direction = 'arrivals') AS arrivals
+            FROM read_parquet({fpaths_partition}, filename = true)
+            GROUP BY ALL
+            ORDER BY partition, station_id, year, is_weekend
+            """  # nosec
+    df = (
+        duckdb.sql(query)
+        .df()
+        .fillna({"departures": 0, "arrivals": 0})
+        .astype({"departures": "int64", "arrivals": "int64"})
+    )
+    return df
+
+
+def get_station_totals(
+    df_trips: pd.DataFrame,
+    last_year: int,
+    years: List[int],
+    station_ids: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """Get departures and arrivals of stations in last year and last N years.
+
+    Parameters
+    ----------
+    df_trips: pd.DataFrame
+        departures and arrivals by station, year and whether trips started on
+        a weekend (see get_partition_station_trips)
+    last_year: int
+        most recent full year (eg. 2022)
+    years: List[int]
+        N most recent full years (eg. 2018 to 2022)
+    station_ids: Optional[np.ndarray]
+        stations whose totals are computed, or None for all stations
+
+    Returns
+    -------
+    pd.DataFrame
+        trips columns of RANK_METRICS, of every day-of-week variant, by
+        station
+
+    Notes
+    -----
+    As in 04_get_top_stations, where trips of the last N years are left
+    joined to trips of the last year in every direction, departures
+    (arrivals) of the last N years are 0 for stations without departures
+    (arrivals) during the last year.
+    """
+    if station_ids is not None:
+        df_trips = df_trips.loc[df_trips["station_id"].isin(station_ids)]
+    else:
+        station_ids = np.unique(df_trips["station_id"])
+    totals = {}
+    for variant, is_weekend in SCORE_VARIANTS.items():
+        df = (
+            df_trips
+            if is_weekend is None
+            else df_trips.loc[df_trips["is_weekend"] == is_weekend]
+        )
+        for period, period_years in zip(
+            ["last_year", "last_n_years"], [[last_year], years]
+        ):
+            df_period = (
+                df.loc[df["year"].isin(period_years)]
+                .groupby("station_id")[["departures", "arrivals"]]
+                .sum()
+            )
+            for direction in ["departures", "arrivals"]:
+                totals[f"{direction}{variant}_{period}"] = df_period[direction]
+        for direction in ["departures", "arrivals"]:
+            column = f"{direction}{variant}_last_n_years"
+            last_year_trips = totals[f"{direction}{variant}_last_year"]
+            totals[column] = totals[column].where(
+                last_year_trips.reindex(totals[column].index).gt(0)
+            )
+    df = (
+        pd.DataFrame(totals)
+        .reindex(pd.Index(station_ids, name="station_id"))
+        .fillna(0)
+        .astype("int64")
+    )
+    return df
+
+
+def get_station_scores(
+    df_totals: pd.DataFrame,
+    rank_thresholds: Dict[str, int],
+    station_ids: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """Rank stations in every metric and select top-performing stations.
+
+    Parameters
+    ----------
+    df_totals: pd.DataFrame
+        departures and arrivals by station (see get_station_totals)
+    rank_thresholds: Dict[str, int]
+        highest rank, in every metric of RANK_METRICS that is used, of
+        top-performing stations (see get_rank_thresholds)
+    station_ids: Optional[np.ndarray]
+        (currently active) stations that can be ranked, or None to rank all
+        stations
+
+    Returns
+    -------
+    pd.DataFrame
+        trips, ranks (rank{variant}_{metric}) and whether the station is a
+        top-performer (is_top_perform_station{variant}), of every
+        day-of-week variant, by station
+
+    Notes
+    -----
+    1. As in 04_get_top_stations, stations of every variant are ranked if
+       they were used (in departures or arrivals) during the last year, and
+       their metrics are missing otherwise.
+    2. Ranks are assigned as with RANK() in SQL, so tied stations share the
+       lowest rank of the tie.
+    """
+    if station_ids is not None:
+        df_totals = df_totals.loc[df_totals.index.isin(station_ids)]
+    scores = []
+    for variant in SCORE_VARIANTS:
+        columns = [c.format(variant=variant) for c in RANK_METRICS.values()]
+        df = df_totals[columns]
+        df = df.loc[df[columns[0]].add(df[columns[1]]).gt(0)]
+        is_top = pd.Series(True, index=df.index)
+        for metric, column in zip(RANK_METRICS, columns):
+            rank = df[column].rank(method="min", ascending=False)
+            df = df.assign(**{f"rank{variant}_{metric}": rank.astype("int64")})
+            if metric in rank_thresholds:
+                is_top &= rank.le(rank_thresholds[metric])
+        scores.append(
+            df.assign(**{f"is_top_perform_station{variant}": is_top})
+        )
+    df = pd.concat(scores, axis=1).convert_dtypes()
+    return df
+
+
+def get_station_filters_mask(
+    df: pd.DataFrame, filters: List[Tuple]
+) -> pd.Series:
+    """Get stations whose attributes satisfy every geospatial filter.
+
+    Filters are (column, operator, value) tuples (eg. ("is_downtown", "==",
+    True)), with operators in FILTER_OPERATORS. Stations with missing
+    attributes do not satisfy a filter.
+    """
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f"Unknown operator of station filter: {op}")
+        mask &= FILTER_OPERATORS[op](df[column], value).fillna(False)
+    return mask.astype(bool)
+
+
+def get_market_penetration(
+    df: pd.DataFrame, trips_col: str = "departures_last_year"
+) -> pd.DataFrame:
+    """Get running fraction of trips captured by recommended stations.
+
+    Stations are ordered by whether they are recommended and by trips (in
+    descending order). Tied stations share the same running total of trips,
+    as with SUM() OVER(ORDER BY ...) in SQL.
+    """
+    df = df.sort_values(
+        by=["is_recommended", trips_col], ascending=False, kind="stable"
+    )
+    cumsum = df[trips_col].cumsum()
+    peers = [df["is_recommended"], df[trips_col]]
+    df = df.assign(
+        trips_last_year_cumsum=cumsum.groupby(peers).transform("max"),
+        total_trips_last_year=df[trips_col].sum(),
+    )
+    df["frac_trips_last_year"] = (
+        100 * df["trips_last_year_cumsum"] / df["total_trips_last_year"]
+    )
+    return df
+
+
+def load_station_scores_state(state_dir: str) -> Tuple[Dict, Dict]:
+    """Load manifest and cached tables of the station scoring engine."""
+    fpath = os.path.join(state_dir, STATION_SCORES_MANIFEST_FNAME)
+    if not os.path.exists(fpath):
+        return {}, {}
+    with open(fpath) as f:
+        manifest = json.load(f)
+    tables = {}
+    for k, fname in zip(
+        ["trips", "totals", "filters"],
+        [
+            STATION_SCORES_TRIPS_FNAME,
+            STATION_SCORES_TOTALS_FNAME,
+            STATION_SCORES_FILTERS_FNAME,
+        ],
+    ):
+        fpath = os.path.join(state_dir, fname)
+        if os.path.exists(fpath):
+            tables[k] = pd.read_parquet(fpath)
+            if k != "trips":
+                tables[k] = tables[k].set_index("station_id")
+    return manifest, tables
+
+
+def recommend_stations(
+    df: pd.DataFrame,
+    df_info: pd.DataFrame,
+    filters: List[Tuple],
+    manifest: Dict,
+    tables: Dict[str, pd.DataFrame],
+    records: List[Dict],
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Recommend top-performers satisfying filters (see update_station_scores).
+
+    Filters are only re-evaluated for stations whose filtered attributes
+    changed since the filters cached by the engine, and the seconds taken by
+    every stage are appended to records.
+    """
+    # 5. re-evaluate filters of stations whose filtered attributes changed
+    with Timer() as t:
+        columns = sorted({column for column, _, _ in filters})
+        df_attrs = df_info.set_index("station_id")[columns]
+        df_filters = pd.DataFrame(
+            {
+                "attrs_hash": (
+                    pd.util.hash_pandas_object(df_attrs, index=False)
+                    if columns
+                    else 0
+                )
+            },
+            index=df_attrs.index,
+        ).astype({"attrs_hash": "uint64"})
+        cached = tables.get("filters")
+        if cached is not None and manifest.get("filters") == repr(filters):
+            cached = cached.reindex(df_filters.index)
+            is_changed = cached["attrs_hash"].ne(df_filters["attrs_hash"])
+            df_filters["is_filtered"] = cached["is_filtered"].where(
+                ~is_changed
+            )
+        else:
+            is_changed = pd.Series(True, index=df_filters.index)
+            df_filters["is_filtered"] = None
+        df_filters.loc[is_changed, "is_filtered"] = get_station_filters_mask(
+            df_attrs.loc[is_changed], filters
+        )
+        df_filters = df_filters.astype({"is_filtered": bool})
+    records.append(
+        {
+            "stage": "filters",
+            "seconds": t.elapsed,
+            "stations": int(is_changed.sum()),
+        }
+    )
+
+    # 6. recommend filtered top-performers and get market penetration
+    with Timer() as t:
+        df = (
+            df.assign(
+                is_recommended=lambda df: df["is_top_perform_station"]
+                .fillna(False)
+                .astype(bool)
+                .to_numpy()
+                & df_filters.loc[df["station_id"], "is_filtered"].to_numpy()
+            )
+            .pipe(get_market_penetration)
+            .reset_index(drop=True)
+        )
+    records.append(
+        {"stage": "recommend", "seconds": t.elapsed, "stations": len(df)}
+    )
+    return df, df_filters
+
+
+def update_station_scores(
+    fpaths: List[str],
+    df_info: pd.DataFrame,
+    cube_dir: str,
+    state_dir: str,
+    last_year: int,
+    years: List[int],
+    rank_thresholds: Dict[str, int],
+    filters: Optional[List[Tuple]] = None,
+    verbose: bool = False,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Score and recommend stations, recomputing only stations that changed.
+
+    Parameters
+    ----------
+    fpaths: List[str]
+        filepaths to processed trips
+    df_info: pd.DataFrame
+        attributes (including geospatial attributes and amenity layers) of
+        currently active stations, by station ID (station_id column)
+    cube_dir: str
+        directory in which cube partitions are stored (see aggregate_cube)
+    state_dir: str
+        directory in which the engine caches trips and filters by station
+    last_year: int
+        most recent full year (eg. 2022)
+    years: List[int]
+        N most recent full years (eg. 2018 to 2022)
+    rank_thresholds: Dict[str, int]
+        highest rank, in every metric, of top-performing stations (see
+        get_rank_thresholds)
+    filters: Optional[List[Tuple]]
+        geospatial filters, as (column, operator, value) of station
+        attributes, that recommended top-performing stations satisfy, or
+        None to only score stations
+    verbose: bool
+        whether to show the seconds taken by every stage
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, pd.DataFrame]
+        attributes, trips, ranks and whether every active station is a
+        top-performer (overall, on weekdays and on weekends) and (if filters
+        are given) is recommended, with the market penetration of
+        recommended stations, and the seconds taken by, and the number of
+        stations (re-)computed in, every stage
+
+    Notes
+    -----
+    1. Processed trips are aggregated into cube partitions, and partitions
+       into trips by station, only for new or changed processed files.
+    2. Totals of trips are recomputed only for stations found in new,
+       changed or removed partitions, and filters are re-evaluated only for
+       stations whose filtered attributes changed (eg. when a new amenity
+       layer is added to station attributes). A change in the years or in
+       the filters recomputes all stations.
+    3. Ranks, top-performers and market penetration depend on all stations,
+       so they are recomputed from cached totals on every run.
+    """
+    for d in [cube_dir, state_dir]:
+        os.makedirs(d, exist_ok=True)
+    df_info = df_info.assign(
+        station_id=pd.to_numeric(df_info["station_id"]).astype("int32")
+    )
+    manifest, tables = load_station_scores_state(state_dir)
+    params = {"last_year": last_year, "years": list(years)}
+    records = []
+
+    # 1. aggregate new or changed processed files into cube partitions
+    with Timer() as t:
+        updated = ac.update_aggregate_cube(fpaths, cube_dir)
+    records.append({"stage": "cube", "seconds": t.elapsed, "stations": None})
+
+    # 2. get trips by station of new or changed cube partitions
+    with Timer() as t:
+        fingerprints = {
+            f: ac.get_file_fingerprint(f) for f in ac.get_cube_fpaths(cube_dir)
+        }
+        partitions = manifest.get("partitions", {})
+        changed = [
+            f for f, fp in fingerprints.items() if partitions.get(f) != fp
+        ]
+        stale = set(changed) | (set(partitions) - set(fingerprints))
+        df_trips = tables.get("trips")
+        if df_trips is None:
+            # without cached trips, all partitions are new
+            df_trips = get_partition_station_trips(changed)
+            affected = np.unique(df_trips["station_id"])
+        elif stale:
+            is_stale = df_trips["partition"].isin(stale)
+            df_new = (
+                get_partition_station_trips(changed)
+                if changed
+                else df_trips.iloc[:0]
+            )
+            affected = np.union1d(
+                df_trips.loc[is_stale, "station_id"], df_new["station_id"]
+            )
+            df_trips = pd.concat(
+                [df_trips.loc[~is_stale], df_new], ignore_index=True
+            )
+        else:
+            affected = np.array([], dtype=np.int32)
+    records.append(
+        {"stage": "trips", "seconds": t.elapsed, "stations": len(affected)}
+    )
+
+    # 3. recompute totals of stations whose trips changed
+    with Timer() as t:
+        df_totals = tables.get("totals")
+        if df_totals is None or manifest.get("params") != params:
+            affected = np.unique(df_trips["station_id"])
+            df_totals = get_station_totals(df_trips, last_year, years)
+        elif len(affected):
+            df_totals = pd.concat(
+                [
+                    df_totals.loc[~df_totals.index.isin(affected)],
+                    get_station_totals(df_trips, last_year, years, affected),
+                ]
+            ).sort_index()
+    records.append(
+        {"stage": "totals", "seconds": t.elapsed, "stations": len(affected)}
+    )
+
+    # 4. rank all stations and select top-performers
+    with Timer() as t:
+        df_scores = get_station_scores(
+            df_totals, rank_thresholds, df_info["station_id"]
+        )
+    records.append(
+        {"stage": "ranks", "seconds": t.elapsed, "stations": len(df_scores)}
+    )
+
+    df = df_info.merge(df_scores, on="station_id", how="inner")
+    if filters is not None:
+        df, df_filters = recommend_stations(
+            df, df_info, filters, manifest, tables, records
+        )
+        df_filters.reset_index().to_parquet(
+            os.path.join(state_dir, STATION_SCORES_FILTERS_FNAME)
+        )
+
+    df_trips.to_parquet(os.path.join(state_dir, STATION_SCORES_TRIPS_FNAME))
+    df_totals.reset_index().to_parquet(
+        os.path.join(state_dir, STATION_SCORES_TOTALS_FNAME)
+    )
+    with open(
+        os.path.join(state_dir, STATION_SCORES_MANIFEST_FNAME), "w"
+    ) as f:
+        json.dump(
+            {
+                "partitions": fingerprints,
+                "params": params,
+                "filters": (
+                    repr(filters)
+                    if filters is not None
+                    else manifest.get("filters")
+                ),
+            },
+            f,
+            indent=2,
+        )
+    df_timings = pd.DataFrame.from_records(records)
+    if verbose:
+        print(
+            f"Updated {len(updated):,} processed files, and scored "
+            f"{len(df):,} stations, in {df_timings['seconds'].sum():.3f} "
+            "seconds"
+        )
+        print(df_timings.round(4).to_string())
+    return df, df_timings
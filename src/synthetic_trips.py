@@ -0,0 +1,556 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Write synthetic raw trips files in every historical CSV layout."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import argparse
+import os
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pcsv
+from contexttimer import Timer
+
+# approximate number of trips per year, of which synthetic trips are a
+# (configurable) multiple
+ANNUAL_TRIPS = {
+    2018: 1_923_000,
+    2019: 2_440_000,
+    2020: 2_911_000,
+    2021: 3_575_000,
+    2022: 4_624_000,
+    2023: 5_713_000,
+}
+# share of annual trips taken in every month (January to December)
+MONTHLY_SHARE = [
+    0.030,
+    0.028,
+    0.040,
+    0.060,
+    0.095,
+    0.120,
+    0.140,
+    0.140,
+    0.120,
+    0.100,
+    0.070,
+    0.052,
+]
+# approximate number of stations in use during every year, with IDs from
+# 7000 upwards
+ANNUAL_STATIONS = {
+    2018: 360,
+    2019: 470,
+    2020: 610,
+    2021: 625,
+    2022: 655,
+    2023: 700,
+}
+FIRST_STATION_ID = 7000
+# trip IDs of a year start from (year - 2017) * TRIP_ID_STEP, so trip IDs are
+# unique across years at up to 10x the number of trips per year
+TRIP_ID_STEP = 100_000_000
+MAX_SCALE = 10
+# streets crossed at synthetic stations
+STREETS = [
+    "Bay St",
+    "Yonge St",
+    "King St W",
+    "Queen St W",
+    "Dundas St W",
+    "College St",
+    "Bloor St W",
+    "Spadina Ave",
+    "Bathurst St",
+    "University Ave",
+    "Front St W",
+    "Wellington St W",
+    "Adelaide St W",
+    "Richmond St W",
+    "Simcoe St",
+    "Jarvis St",
+    "Church St",
+    "Sherbourne St",
+    "Parliament St",
+    "Wellesley St E",
+    "Gerrard St E",
+    "Dufferin St",
+    "Ossington Ave",
+    "Lakeshore Blvd W",
+    "Queens Quay W",
+    "Harbord St",
+    "Broadview Ave",
+    "Danforth Ave",
+    "St George St",
+    "Lansdowne Ave",
+]
+# variants of station names, with the dirty prefixes, suffixes and
+# characters of raw trips that are removed by clean.STATION_NAME_RULES
+STATION_NAME_VARIANTS = [
+    "{}",
+    "{}",
+    "{}",
+    "{} - SMART",
+    "{} SMART",
+    "{} -SMART",
+    "{} (Green P)",
+    "{} Green P",
+    "{} (West Side)",
+    "{} (East Side)",
+    "{} WEST",
+    "{}.",
+    "{} -",
+    "{} – Park",
+    "GÇô{}",
+    "{}?",
+    "{} 1",
+]
+# dirty station names found verbatim in raw trips
+DIRTY_STATION_NAMES = [
+    "York St / Lakeshore St W - South",
+    "Queen's Park / Bloor St W",
+    "Union Station – Front St W",
+]
+USER_TYPES = ["Annual Member", "Casual Member"]
+# share of trips with a missing start station, end station and bike ID
+MISSING_SHARE = {"start": 0.001, "end": 0.002, "bike": 0.005}
+# share of the last trips of a raw trips file that are repeated at the start
+# of the next file, as trips that span the end of a period are found in both
+# files
+DUPLICATE_SHARE = 0.0005
+# share of trips of October 2020 whose columns are mis-aligned
+MISALIGNED_SHARE = 0.01
+# header of raw trips files is written separately, since the Arrow CSV writer
+# quotes column names, and no values of synthetic trips need to be quoted
+CSV_WRITE_OPTIONS = pcsv.WriteOptions(
+    include_header=False, quoting_style="none"
+)
+# column names in the header of raw trips files, and the names of synthetic
+# trips columns written to them
+RAW_COLUMNS = {
+    "Trip Id": "trip_id",
+    "Trip  Duration": "trip_duration",
+    "Start Station Id": "start_station_id",
+    "Start Time": "started_at",
+    "Start Station Name": "start_station_name",
+    "End Station Id": "end_station_id",
+    "End Time": "ended_at",
+    "End Station Name": "end_station_name",
+    "Bike Id": "bike_id",
+    "User Type": "user_type",
+}
+RAW_COLUMNS_2018 = {
+    "trip_id": "trip_id",
+    "trip_start_time": "started_at",
+    "trip_stop_time": "ended_at",
+    "trip_duration_seconds": "trip_duration",
+    "from_station_id": "start_station_id",
+    "from_station_name": "start_station_name",
+    "to_station_id": "end_station_id",
+    "to_station_name": "end_station_name",
+    "user_type": "user_type",
+}
+
+
+def get_raw_trips_periods(year: int) -> List[int]:
+    """Get periods (quarters until 2019, months after) of raw trips files."""
+    return list(range(1, 4 + 1)) if year <= 2019 else list(range(1, 12 + 1))
+
+
+def get_raw_trips_fname(year: int, period: int) -> str:
+    """Get filename of raw trips file of a year and period."""
+    if year == 2018:
+        fname = f"Bike Share Toronto Ridership_Q{period} 2018.csv"
+    elif year == 2019:
+        fname = f"2019-Q{period}.csv"
+    elif year == 2020:
+        fname = f"2020-{period:02d}.csv"
+    else:
+        fname = f"Bike share ridership {year}-{period:02d}.csv"
+    return fname
+
+
+def has_bom(year: int, period: int) -> bool:
+    """Check if header of raw trips file starts with a UTF-8 byte-order mark.
+
+    The header of these files is read with encoding unicode_escape, so the
+    first column is named ï»¿Trip Id (see read.read_csv_file).
+    """
+    return (year == 2021 and period not in [1, 5]) or (
+        year == 2023 and period == 1
+    )
+
+
+def get_period_months(year: int, period: int) -> List[int]:
+    """Get months covered by raw trips file of a year and period."""
+    if year <= 2019:
+        return list(range(3 * period - 2, 3 * period + 1))
+    return [period]
+
+
+def get_stations(year: int) -> pd.DataFrame:
+    """Get IDs and (dirty) names of stations in use during a year.
+
+    Names of some stations change from one year to the next, as station
+    names of raw trips do.
+    """
+    n = ANNUAL_STATIONS[year]
+    ids = np.arange(n)
+    n_streets = len(STREETS)
+    first = ids % n_streets
+    # second street differs from the first street of every station
+    second = (first + 1 + (ids // n_streets) % (n_streets - 1)) % n_streets
+    names = [f"{STREETS[a]} / {STREETS[b]}" for a, b in zip(first, second)]
+    renamed = (ids % 7 == 0) & (year >= 2021)
+    variants = (ids * 31 + renamed * year) % len(STATION_NAME_VARIANTS)
+    names = [
+        STATION_NAME_VARIANTS[v].format(name)
+        for v, name in zip(variants, names)
+    ]
+    names[: len(DIRTY_STATION_NAMES)] = DIRTY_STATION_NAMES
+    df = pd.DataFrame(
+        {"station_id": FIRST_STATION_ID + ids, "station_name": names}
+    )
+    return df
+
+
+def get_minute_weights() -> np.ndarray:
+    """Get probability of a trip starting at every minute of the day.
+
+    Trips peak during the morning and evening commutes.
+    """
+    hours = np.arange(24 * 60) / 60
+    weights = (
+        0.2
+        + np.exp(-0.5 * ((hours - 8.5) / 1.2) ** 2)
+        + 1.3 * np.exp(-0.5 * ((hours - 17.5) / 2) ** 2)
+        + 0.4 * np.exp(-0.5 * ((hours - 13) / 3) ** 2)
+    )
+    weights[hours < 5] *= 0.3
+    return weights / weights.sum()
+
+
+def get_synthetic_trips(
+    year: int,
+    month: int,
+    n_trips: int,
+    first_trip_id: int,
+    df_stations: pd.DataFrame,
+    rng: np.random.Generator,
+) -> pd.DataFrame:
+    """Get synthetic trips starting during a month.
+
+    Parameters
+    ----------
+    year: int
+        year of start times of trips
+    month: int
+        month of start times of trips
+    n_trips: int
+        number of trips
+    first_trip_id: int
+        trip ID of the earliest trip, from which trip IDs are consecutive
+    df_stations: pd.DataFrame
+        IDs and names of stations (see get_stations), of which stations
+        with lower IDs are more popular
+    rng: np.random.Generator
+        random number generator
+
+    Returns
+    -------
+    pd.DataFrame
+        trips, sorted by start time, with start and end times formatted as
+        in raw trips files, and missing station names and bike IDs
+    """
+    n_days = pd.Period(f"{year}-{month:02d}").days_in_month
+    # dates of the month and of the first days of the next month, at which
+    # trips can end
+    dates = pd.date_range(f"{year}-{month:02d}-01", periods=n_days + 7)
+    # fixed-width strings, as np.char.add does not accept the object arrays
+    # of strftime (in pandas < 3)
+    date_strs = dates.strftime("%m/%d/%Y ").to_numpy().astype(str)
+    minute_strs = np.array(
+        [f"{m // 60:02d}:{m % 60:02d}" for m in range(24 * 60)]
+    )
+    # weekdays are busier than weekends
+    day_weights = np.where(dates[:n_days].dayofweek < 5, 1.0, 0.8)
+    start_minutes = np.sort(
+        rng.choice(n_days, n_trips, p=day_weights / day_weights.sum()) * 1_440
+        + rng.choice(24 * 60, n_trips, p=get_minute_weights())
+    )
+    # trip durations (in seconds) are log-normal, with a median of about 12
+    # minutes, so that some trips are longer than the longest allowed trip
+    # duration
+    durations = np.clip(
+        rng.lognormal(np.log(720), 0.8, n_trips).astype(np.int64), 60, 86_400
+    )
+    end_minutes = start_minutes + durations // 60
+    station_weights = 1 / (np.arange(len(df_stations)) + 20)
+    stations = [
+        rng.choice(
+            len(df_stations),
+            n_trips,
+            p=station_weights / station_weights.sum(),
+        )
+        for _ in range(2)
+    ]
+    # casual members take a larger share of trips during summer
+    casual_share = 0.1 + 2.5 * MONTHLY_SHARE[month - 1]
+    df = pd.DataFrame(
+        {
+            "trip_id": first_trip_id + np.arange(n_trips),
+            "trip_duration": durations,
+            "start_station_id": df_stations["station_id"].to_numpy()[
+                stations[0]
+            ],
+            "started_at": np.char.add(
+                date_strs[start_minutes // 1_440],
+                minute_strs[start_minutes % 1_440],
+            ),
+            "start_station_name": df_stations["station_name"].to_numpy()[
+                stations[0]
+            ],
+            "end_station_id": df_stations["station_id"].to_numpy()[
+                stations[1]
+            ],
+            "ended_at": np.char.add(
+                date_strs[end_minutes // 1_440],
+                minute_strs[end_minutes % 1_440],
+            ),
+            "end_station_name": df_stations["station_name"].to_numpy()[
+                stations[1]
+            ],
+            "bike_id": rng.integers(1, 10_000, n_trips),
+            "user_type": np.array(USER_TYPES)[
+                (rng.random(n_trips) < casual_share).astype(int)
+            ],
+        }
+    ).astype(
+        {
+            "start_station_id": "Int64",
+            "end_station_id": "Int64",
+            "bike_id": "Int64",
+        }
+    )
+    for kind, columns in [
+        ("start", ["start_station_id", "start_station_name"]),
+        ("end", ["end_station_id", "end_station_name"]),
+        ("bike", ["bike_id"]),
+    ]:
+        is_missing = rng.random(n_trips) < MISSING_SHARE[kind]
+        df.loc[is_missing, columns] = None
+    return df
+
+
+def get_raw_trips_layout(
+    df: pd.DataFrame, year: int, period: int, rng: np.random.Generator
+) -> pd.DataFrame:
+    """Get synthetic trips with the columns of a raw trips file.
+
+    Trips from 2018 do not have bike IDs. In October 2020, a share of trips
+    have a missing start station ID, and their remaining columns are shifted
+    left by one column, so that their start time is found in the column of
+    start station IDs.
+    """
+    columns = RAW_COLUMNS_2018 if year == 2018 else RAW_COLUMNS
+    df = df[list(columns.values())].set_axis(list(columns), axis=1)
+    if year == 2020 and period == 10:
+        is_misaligned = rng.random(len(df)) < MISALIGNED_SHARE
+        df = df.astype("string")
+        shifted = df.columns[2:]
+        df.loc[is_misaligned, shifted] = (
+            df.loc[is_misaligned, shifted]
+            .shift(-1, axis=1)
+            .fillna("")
+            .to_numpy()
+        )
+    return df
+
+
+def write_synthetic_trips(
+    raw_data_dir: str,
+    years: List[int] = list(ANNUAL_TRIPS),
+    periods: Optional[List[int]] = None,
+    scale: float = 1.0,
+    chunk_size: int = 1_000_000,
+    seed: int = 42,
+    verbose: bool = False,
+) -> List[str]:
+    """Write synthetic raw trips files of every period of years.
+
+    Parameters
+    ----------
+    raw_data_dir: str
+        directory to which raw trips files are written
+    years: List[int]
+        years of raw trips files, from 2018 to 2023
+    periods: Optional[List[int]]
+        periods (quarters until 2019, months after) of raw trips files of
+        every year, or all periods if None
+    scale: float
+        number of trips as a multiple of the approximate number of trips per
+        year (up to 10x)
+    chunk_size: int
+        largest number of trips generated and written at once, which limits
+        the memory used to write large files
+    seed: int
+        seed of the random number generator, so that files are reproducible
+    verbose: bool
+        whether to show the number of trips written to every file
+
+    Returns
+    -------
+    List[str]
+        filepaths to raw trips files, named and laid out as the raw trips
+        files read by read.read_csv_file and etl_duckdb
+
+    Notes
+    -----
+    1. Files of 2018 and 2019 hold a quarter of trips, and files of later
+       years hold a month of trips.
+    2. The header of files of 2021 (except January and May) and of January
+       2023 starts with a UTF-8 byte-order mark.
+    3. Station names are dirty (see STATION_NAME_VARIANTS), and names of
+       some stations change from 2021 onwards.
+    4. A share of the last trips of every file is repeated at the start of
+       the next file of the same year, with the same trip IDs.
+    """
+    if not 0 < scale <= MAX_SCALE:
+        raise ValueError(f"Scale must be above 0 and at most {MAX_SCALE}")
+    unknown = sorted(set(years) - set(ANNUAL_TRIPS))
+    if unknown:
+        raise ValueError(f"Unknown years of raw trips files: {unknown}")
+    os.makedirs(raw_data_dir, exist_ok=True)
+    fpaths = []
+    for year in sorted(years):
+        rng = np.random.default_rng([seed, year])
+        df_stations = get_stations(year)
+        trip_id = (year - 2017) * TRIP_ID_STEP
+        df_duplicated = None
+        for period in [
+            p
+            for p in get_raw_trips_periods(year)
+            if periods is None or p in periods
+        ]:
+            fpath = os.path.join(
+                raw_data_dir, get_raw_trips_fname(year, period)
+            )
+            n_written = 0
+            header = ",".join(
+                RAW_COLUMNS_2018 if year == 2018 else RAW_COLUMNS
+            )
+            with Timer() as t, open(fpath, "wb") as f:
+                f.write(
+                    f"{header}\n".encode(
+                        "utf-8-sig" if has_bom(year, period) else "utf-8"
+                    )
+                )
+                for month in get_period_months(year, period):
+                    n_trips = round(
+                        ANNUAL_TRIPS[year] * MONTHLY_SHARE[month - 1] * scale
+                    )
+                    for n in [
+                        min(chunk_size, n_trips - start)
+                        for start in range(0, n_trips, chunk_size)
+                    ]:
+                        df = get_synthetic_trips(
+                            year, month, n, trip_id, df_stations, rng
+                        )
+                        trip_id += n
+                        if df_duplicated is not None:
+                            df = pd.concat(
+                                [df_duplicated, df], ignore_index=True
+                            )
+                            df_duplicated = None
+                        pcsv.write_csv(
+                            pa.Table.from_pandas(
+                                get_raw_trips_layout(df, year, period, rng),
+                                preserve_index=False,
+                            ),
+                            f,
+                            CSV_WRITE_OPTIONS,
+                        )
+                        n_written += len(df)
+                df_duplicated = (
+                    df.tail(round(len(df) * DUPLICATE_SHARE))
+                    if n_written
+                    else None
+                )
+            if verbose:
+                print(
+                    f"Wrote {n_written:,} trips to {os.path.basename(fpath)} "
+                    f"in {t.elapsed:.3f}s"
+                )
+            fpaths.append(fpath)
+    return fpaths
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Write synthetic raw bike share ridership data."
+    )
+    parser.add_argument(
+        "--raw-data-dir",
+        default=os.path.join("data", "raw", "synthetic"),
+        help="directory to which raw trips CSV files are written",
+    )
+    parser.add_argument(
+        "--years",
+        type=int,
+        nargs="+",
+        default=list(ANNUAL_TRIPS),
+        help="years of raw trips files",
+    )
+    parser.add_argument(
+        "--periods",
+        type=int,
+        nargs="+",
+        default=None,
+        help="quarters (until 2019) or months of raw trips files",
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help=f"multiple of current number of trips (up to {MAX_SCALE}x)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1_000_000,
+        help="largest number of trips written at once",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=42,
+        help="seed of random number generator",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Write synthetic raw trips files."""
+    args = parse_args()
+    with Timer() as t:
+        fpaths = write_synthetic_trips(
+            args.raw_data_dir,
+            args.years,
+            args.periods,
+            scale=args.scale,
+            chunk_size=args.chunk_size,
+            seed=args.seed,
+            verbose=True,
+        )
+    print(f"Wrote {len(fpaths):,} raw trips files in {t.elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
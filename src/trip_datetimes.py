@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define datetime attributes of trips, derived from start and end times."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import argparse
+import os
+import tempfile
+from datetime import datetime
+from glob import glob
+from typing import Dict, List, Optional
+
+import duckdb
+import pandas as pd
+import pyarrow.parquet as pq
+from contexttimer import Timer
+
+import datetime_utils as dtu
+import station_dimension as stdim
+import trips_layout as tl
+
+# datetime columns of processed trips, from which attributes are derived
+DATETIME_COLUMNS = ["started_at", "ended_at"]
+# datatypes of datetime attributes (eg. started_at_year) of processed trips,
+# which are derived when needed rather than stored with processed trips
+DATETIME_ATTRIBUTES = {
+    "year": "int16",
+    "month": "int8",
+    "day": "int8",
+    "hour": "int8",
+    "minute": "int8",
+}
+DATETIME_ATTRIBUTE_DTYPES = {
+    f"{c}_{attr}": dtype
+    for c in DATETIME_COLUMNS
+    for attr, dtype in DATETIME_ATTRIBUTES.items()
+}
+SQL_TYPES = {"int16": "SMALLINT", "int8": "TINYINT"}
+# timezone of (naive, local) start and end times of trips, and how local
+# times during daylight saving time transitions are localized (see
+# datetime_utils.get_utc_offsets)
+TRIPS_TIMEZONE = "America/Toronto"
+AMBIGUOUS_TIMES = "earliest"
+NONEXISTENT_TIMES = "shift_by_gap"
+# UTC offsets (in minutes) of start and end times, which are stored with
+# processed trips, since local times are ambiguous when clocks are set back
+UTC_OFFSET_COLUMNS = {c: f"{c}_utc_offset" for c in DATETIME_COLUMNS}
+# queries used to compare stored and derived datetime attributes
+BENCHMARK_QUERIES = {
+    "monthly_trips": """
+        SELECT started_at_year, started_at_month, COUNT(*) AS trips
+        FROM trips
+        GROUP BY ALL
+        """,
+    "hourly_trips": """
+        SELECT started_at_hour, ended_at_hour, COUNT(*) AS trips
+        FROM trips
+        GROUP BY ALL
+        """,
+    "year_filter_attribute": """
+        SELECT start_station_id, COUNT(*) AS trips
+        FROM trips
+        WHERE started_at_year = {year}
+        GROUP BY ALL
+        """,
+    "year_filter_range": """
+        SELECT start_station_id, COUNT(*) AS trips
+        FROM trips
+        WHERE {year_filter}
+        GROUP BY ALL
+        """,
+}
+# name of DuckDB table macro that reads processed trips with datetime
+# attributes
+TRIPS_MACRO = "read_trips"
+
+
+def get_datetime_attributes_sql() -> List[str]:
+    """Get SQL expressions of datetime attributes of processed trips."""
+    return [
+        f"CAST({attr}({c}) AS {SQL_TYPES[dtype]}) AS {c}_{attr}"
+        for c in DATETIME_COLUMNS
+        for attr, dtype in DATETIME_ATTRIBUTES.items()
+    ]
+
+
+def get_trips_macro_sql() -> str:
+    """Get SQL to create table macro reading trips with datetime attributes.
+
+    The macro (eg. SELECT * FROM read_trips(['a.parquet', 'b.parquet']))
+    replaces read_parquet in queries of processed trips. Attributes stored
+    in processed trips files exported by older versions of the ETL pipeline
+    are replaced by derived attributes, and their station names are dropped
+    (see station_dimension).
+    """
+    stored = ", ".join(
+        f"'{c}'"
+        for c in [*DATETIME_ATTRIBUTE_DTYPES, *stdim.STATION_NAME_COLUMNS]
+    )
+    query = f"""
+            CREATE OR REPLACE MACRO {TRIPS_MACRO}(fpaths) AS TABLE
+            SELECT COLUMNS(c -> c NOT IN ({stored})),
+                   {', '.join(get_datetime_attributes_sql())}
+            FROM read_parquet(fpaths, union_by_name=true)
+            """  # nosec
+    return query
+
+
+def assign_utc_offsets(df: pd.DataFrame) -> pd.DataFrame:
+    """Add UTC offsets of start and end times to trips."""
+    return df.assign(
+        **{
+            name: dtu.get_utc_offsets(
+                df[c], TRIPS_TIMEZONE, AMBIGUOUS_TIMES, NONEXISTENT_TIMES
+            )
+            for c, name in UTC_OFFSET_COLUMNS.items()
+            if c in df
+        }
+    )
+
+
+def get_utc_offset_sql(column: str, years: List[int]) -> str:
+    """Get SQL expression of UTC offset of start or end times of trips.
+
+    UTC offsets only change at daylight saving time transitions, so the
+    offset of every local hour of years (see
+    datetime_utils.get_hourly_utc_offsets) is reduced to a CASE expression
+    over the local times at which the offset changes, which localizes trips
+    as assign_utc_offsets does.
+    """
+    df = pd.concat(
+        [dtu.get_hourly_utc_offsets(TRIPS_TIMEZONE, y) for y in sorted(years)]
+    )
+    offsets = df["earliest" if AMBIGUOUS_TIMES == "earliest" else "latest"]
+    changes = offsets[offsets.ne(offsets.shift())]
+    cases = [
+        f"WHEN {column} < TIMESTAMP '{t}' THEN {offset}"
+        for t, offset in zip(changes.index[1:], changes.iloc[:-1])
+    ]
+    return (
+        f"CAST(CASE {' '.join(cases)} ELSE {changes.iloc[-1]} END "
+        f"AS {SQL_TYPES['int16']})"
+    )
+
+
+def get_period_bounds(
+    year: int, month: Optional[int] = None
+) -> List[datetime]:
+    """Get start (inclusive) and end (exclusive) of year or month."""
+    if month is None:
+        return [datetime(year, 1, 1), datetime(year + 1, 1, 1)]
+    end = (
+        datetime(year + 1, 1, 1)
+        if month == 12
+        else datetime(year, month + 1, 1)
+    )
+    return [datetime(year, month, 1), end]
+
+
+def get_period_filter_sql(
+    years: List[int],
+    months: Optional[List[int]] = None,
+    column: str = "started_at",
+) -> str:
+    """Get SQL predicate selecting trips by year (and month) of a datetime.
+
+    Parameters
+    ----------
+    years: List[int]
+        years to be selected
+    months: Optional[List[int]]
+        months (of every year) to be selected, or all months if None
+    column: str
+        datetime column used to select trips
+
+    Returns
+    -------
+    str
+        range predicates on the datetime column (eg. started_at >= ... AND
+        started_at < ...), which DuckDB uses to skip files and row groups
+        using their minimum and maximum values, unlike predicates on derived
+        attributes (eg. started_at_year <= 2022)
+    """
+    bounds = [
+        get_period_bounds(y, m)
+        for y in sorted(years)
+        for m in months or [None]
+    ]
+    # merge consecutive periods
+    merged = [bounds[0]]
+    for start, end in bounds[1:]:
+        if start == merged[-1][1]:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    predicates = [
+        f"({column} >= TIMESTAMP '{start}' AND {column} < TIMESTAMP '{end}')"
+        for start, end in merged
+    ]
+    return f"({' OR '.join(predicates)})"
+
+
+def get_period_fpaths(
+    fpaths: List[str],
+    years: List[int],
+    months: Optional[List[int]] = None,
+) -> List[str]:
+    """Get processed trips files whose year (and month) are selected.
+
+    Quarterly files (2018 and 2019) are selected if any of their months are
+    selected.
+    """
+    selected = []
+    for f in fpaths:
+        # eg. processed__trips_2021_07__20230801_120000.parquet.gzip
+        _, year, period = os.path.basename(f).split("__")[1].split("_")
+        if period.startswith("Q"):
+            periods = range(3 * int(period[1:]) - 2, 3 * int(period[1:]) + 1)
+        else:
+            periods = [int(period)]
+        if int(year) in years and (
+            months is None or any(m in months for m in periods)
+        ):
+            selected.append(f)
+    return selected
+
+
+@pd.api.extensions.register_dataframe_accessor("trips")
+class TripsAccessor:
+    """Derive datetime attributes of trips (eg. df.trips["started_at_hour"]).
+
+    Processed trips only store start and end times, so datetime attributes
+    are derived from these times when they are needed.
+    """
+
+    def __init__(self, df: pd.DataFrame) -> None:
+        """Check that DataFrame contains start or end times of trips."""
+        if not any(c in df for c in DATETIME_COLUMNS):
+            raise AttributeError(
+                f"DataFrame must contain one of {DATETIME_COLUMNS}"
+            )
+        self._df = df
+
+    def __getitem__(self, column: str) -> pd.Series:
+        """Get datetime attribute (eg. started_at_year) of trips."""
+        if column in self._df:
+            return self._df[column]
+        c, attr = column.rsplit("_", 1)
+        return (
+            getattr(self._df[c].dt, attr)
+            .astype(DATETIME_ATTRIBUTE_DTYPES[column])
+            .rename(column)
+        )
+
+    def assign_datetime_attributes(
+        self, columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """Add datetime attributes, or all attributes if None, to trips."""
+        columns = columns or [
+            c
+            for c in DATETIME_ATTRIBUTE_DTYPES
+            if c.rsplit("_", 1)[0] in self._df
+        ]
+        return self._df.assign(**{c: self[c] for c in columns})
+
+    def localize(self, column: str = "started_at") -> pd.Series:
+        """Get start or end times of trips in their timezone.
+
+        Stored UTC offsets are used if available (see assign_utc_offsets),
+        and looked up for trips exported before UTC offsets were stored.
+        """
+        name = UTC_OFFSET_COLUMNS[column]
+        offsets = self._df.get(name)
+        if offsets is None or offsets.isna().any():
+            looked_up = assign_utc_offsets(self._df[[column]])[name]
+            offsets = (
+                looked_up if offsets is None else offsets.fillna(looked_up)
+            )
+        return dtu.localize_datetimes(
+            self._df[column], TRIPS_TIMEZONE, utc_offsets=offsets
+        )
+
+
+def benchmark_datetime_attributes(
+    fpaths: List[str],
+    queries: Dict[str, str],
+    repeats: int = 3,
+) -> pd.DataFrame:
+    """Compare stored and derived datetime attributes of processed trips.
+
+    Parameters
+    ----------
+    fpaths: List[str]
+        filepaths to processed trips (without stored datetime attributes)
+    queries: Dict[str, str]
+        queries run against processed trips (as the trips table)
+    repeats: int
+        number of times every query is run (the fastest run is reported)
+
+    Returns
+    -------
+    pd.DataFrame
+        size on disk of processed trips and seconds taken by every query,
+        with stored and with derived datetime attributes
+
+    Notes
+    -----
+    Both layouts are written by trips_layout.write_trips_table, with the
+    same row groups and compression, so that only their columns differ.
+    """
+    records = []
+    with tempfile.TemporaryDirectory() as temp_dir, duckdb.connect() as con:
+        con.sql(get_trips_macro_sql())
+        # copy of every file with stored datetime attributes, and without
+        # (as processed trips), written alike so that their sizes compare
+        fpaths_layout = {"stored": [], "derived": []}
+        for k, f in enumerate(fpaths):
+            query = f"SELECT * FROM {TRIPS_MACRO}(['{f}'])"  # nosec
+            tables = {
+                "stored": con.sql(query).fetch_arrow_table(),
+                "derived": pq.read_table(f),
+            }
+            for layout, table in tables.items():
+                fpaths_layout[layout].append(
+                    tl.write_trips_table(
+                        table,
+                        os.path.join(temp_dir, f"{layout}_{k}.parquet.gzip"),
+                    )
+                )
+        sources = {
+            "stored": (
+                f"read_parquet({fpaths_layout['stored']}, union_by_name=true)"
+            ),
+            "derived": f"{TRIPS_MACRO}({fpaths_layout['derived']})",
+        }
+        records.append(
+            {
+                "query": "disk_mb",
+                **{
+                    layout: sum(map(os.path.getsize, fps)) / 1024**2
+                    for layout, fps in fpaths_layout.items()
+                },
+            }
+        )
+        for name, query in queries.items():
+            record = {"query": name}
+            for layout, source in sources.items():
+                q = f"WITH trips AS (SELECT * FROM {source}) {query}"  # nosec
+                seconds = []
+                for _ in range(repeats):
+                    with Timer() as t:
+                        con.sql(q).fetchall()
+                    seconds.append(t.elapsed)
+                record[layout] = min(seconds)
+            records.append(record)
+    df = pd.DataFrame.from_records(records)
+    return df
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Compare stored and derived datetime attributes."
+    )
+    parser.add_argument(
+        "--processed-data-dir",
+        default=os.path.join("data", "processed"),
+        help="directory containing processed trips",
+    )
+    parser.add_argument(
+        "--year",
+        type=int,
+        default=2022,
+        help="year selected by queries that filter trips by year",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Benchmark storage and scan time of datetime attributes."""
+    args = parse_args()
+    pattern = os.path.join(
+        args.processed_data_dir, "processed__trips_*.parquet.gzip"
+    )
+    latest = {}
+    for f in sorted(glob(pattern)):
+        latest[os.path.basename(f).rsplit("__", 1)[0]] = f
+    queries = {
+        name: query.format(
+            year=args.year, year_filter=get_period_filter_sql([args.year])
+        )
+        for name, query in BENCHMARK_QUERIES.items()
+    }
+    df = benchmark_datetime_attributes(sorted(latest.values()), queries)
+    print(df.round(4).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
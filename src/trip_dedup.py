@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define utilities to enforce unique trip IDs across processed trips."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import json
+import os
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import trips_layout as tl
+
+TRIP_KEYS_FNAME = "trips__keys.parquet"
+TRIPS_METADATA_FNAME = "trips__metadata.json"
+
+
+def get_source_key(fpath: str) -> str:
+    """Get name of processed trips file without its export timestamp."""
+    return os.path.basename(fpath).rsplit("__", 1)[0]
+
+
+def get_file_fingerprint(fpath: str) -> Dict[str, Union[str, int]]:
+    """Get filepath, size and modification time of file."""
+    stat = os.stat(fpath)
+    return {
+        "fpath": os.path.abspath(fpath),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def load_trips_metadata(index_dir: str) -> Dict:
+    """Load metadata of processed trips whose trip IDs have been checked."""
+    fpath = os.path.join(index_dir, TRIPS_METADATA_FNAME)
+    if not os.path.exists(fpath):
+        return {"trip_id_unique": True, "num_trips": 0, "files": {}}
+    with open(fpath) as f:
+        return json.load(f)
+
+
+def load_trip_keys(index_dir: str) -> pd.DataFrame:
+    """Load trip ID and processed trips file of every indexed trip."""
+    fpath = os.path.join(index_dir, TRIP_KEYS_FNAME)
+    if not os.path.exists(fpath):
+        return pd.DataFrame(
+            {
+                "trip_id": np.array([], dtype=np.int64),
+                "source": pd.Categorical([]),
+            }
+        )
+    return pd.read_parquet(fpath)
+
+
+def get_trip_keys(trip_ids: pa.ChunkedArray) -> pd.Series:
+    """Get trip IDs as nullable integers (trip IDs are strings in 2018)."""
+    keys = trip_ids.cast(pa.int64()).to_pandas(
+        types_mapper={pa.int64(): pd.Int64Dtype()}.get
+    )
+    return keys
+
+
+def drop_duplicated_trips(fpath: str, other_keys: np.ndarray) -> pd.Series:
+    """Remove trips whose trip ID is missing, repeated or found elsewhere.
+
+    Parameters
+    ----------
+    fpath: str
+        filepath to processed trips, which is re-written if any trips are
+        removed
+    other_keys: np.ndarray
+        trip IDs found in other processed trips files
+
+    Returns
+    -------
+    pd.Series
+        trip IDs of the trips that were kept
+    """
+    keys = get_trip_keys(pq.read_table(fpath, columns=["trip_id"])["trip_id"])
+    # hash the (smaller) keys of this file, rather than keys of all other
+    # files, to find trip IDs that are already used by other files
+    keys_found = other_keys[pd.Index(other_keys).isin(keys.dropna())]
+    to_drop = keys.isna() | keys.duplicated() | keys.isin(keys_found)
+    if to_drop.any():
+        table = pq.read_table(fpath)
+        table = table.filter(pc.invert(pa.array(to_drop.to_numpy())))
+        tl.write_trips_table(table, fpath)
+    return keys[~to_drop]
+
+
+def deduplicate_trips(
+    fpaths: List[str], index_dir: str, verbose: bool = False
+) -> pd.DataFrame:
+    """Enforce unique trip IDs across processed trips files.
+
+    Parameters
+    ----------
+    fpaths: List[str]
+        filepaths to processed trips, of which new or changed files are
+        checked against the trip IDs of all previously checked files
+    index_dir: str
+        directory in which the trip ID index and metadata are stored
+    verbose: bool
+        whether to show the number of checked files and removed trips
+
+    Returns
+    -------
+    pd.DataFrame
+        number of removed trips, per checked file
+
+    Notes
+    -----
+    Every processed trips file is identified by its name without the export
+    timestamp (eg. processed__trips_2021_07), so that a re-processed file
+    replaces the trip IDs of the file that it replaces. If a trip ID is
+    found in more than one file, then the trip is kept in the file that was
+    checked first. Trips without a trip ID are removed.
+    """
+    metadata = load_trips_metadata(index_dir)
+    df_keys = load_trip_keys(index_dir)
+    records = []
+    for f in sorted(fpaths, key=get_source_key):
+        source = get_source_key(f)
+        if metadata["files"].get(source) == get_file_fingerprint(f):
+            continue
+        is_other = (df_keys["source"] != source).to_numpy()
+        num_trips = pq.ParquetFile(f).metadata.num_rows
+        keys = drop_duplicated_trips(
+            f, df_keys["trip_id"].to_numpy()[is_other]
+        )
+        df_keys = pd.concat(
+            [
+                df_keys.loc[is_other],
+                pd.DataFrame(
+                    {
+                        "trip_id": keys.to_numpy(dtype=np.int64),
+                        "source": source,
+                    }
+                ),
+            ],
+            ignore_index=True,
+        ).astype({"source": "category"})
+        metadata["files"][source] = get_file_fingerprint(f)
+        records.append(
+            {
+                "file": os.path.basename(f),
+                "trips": num_trips,
+                "duplicated_trips_removed": num_trips - len(keys),
+            }
+        )
+    metadata["num_trips"] = len(df_keys)
+    df_keys.to_parquet(os.path.join(index_dir, TRIP_KEYS_FNAME), index=False)
+    with open(os.path.join(index_dir, TRIPS_METADATA_FNAME), "w") as fm:
+        json.dump(metadata, fm, indent=2)
+    df = pd.DataFrame.from_records(
+        records, columns=["file", "trips", "duplicated_trips_removed"]
+    )
+    if verbose:
+        print(
+            f"Removed {df['duplicated_trips_removed'].sum():,} trips with "
+            f"duplicated or missing trip IDs from {len(df):,} checked files"
+        )
+    return df
+
+
+def is_trip_id_unique(fpaths: List[str], index_dir: str) -> bool:
+    """Check if trip IDs are known to be unique across processed trips."""
+    metadata = load_trips_metadata(index_dir)
+    files = metadata["files"]
+    return metadata["trip_id_unique"] and all(
+        files.get(get_source_key(f)) == get_file_fingerprint(f) for f in fpaths
+    )
+
+
+def get_trips_count_sql(fpaths: List[str]) -> str:
+    """Get SQL to count trips, using COUNT(*) if trip IDs are unique."""
+    index_dir = os.path.dirname(fpaths[0]) if fpaths else ""
+    if fpaths and is_trip_id_unique(fpaths, index_dir):
+        return "COUNT(*)"
+    return "COUNT(DISTINCT(trip_id))"
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define monthly data-quality metrics of raw and processed trips."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import os
+from glob import glob
+
+import pandas as pd
+
+# data-quality metrics of raw and processed trips, as (name of metric, with
+# {stage} replaced by raw or proc, and how the metric is aggregated)
+QUALITY_METRICS = {
+    "trips": ("{stage}_trips", "nunique"),
+    "annual": ("{stage}_annual", "sum"),
+    "casual": ("{stage}_casual", "sum"),
+    "start_nans": ("start_nans_{stage}", "sum"),
+    "end_nans": ("end_nans_{stage}", "sum"),
+    "bike_id_nans": ("bike_id_nans_{stage}", "sum"),
+}
+STAGES = ["raw", "proc"]
+# columns (and datatypes) of data-quality metrics, per month of the start
+# time of trips
+QUALITY_DTYPES = {
+    "year": "int16",
+    "month": "int8",
+    **{
+        name.format(stage=stage): "int64"
+        for stage in STAGES
+        for name, _ in QUALITY_METRICS.values()
+    },
+}
+QUALITY_PREFIX = "quality__trips"
+
+
+def get_quality_fpath(fpath: str) -> str:
+    """Get filepath to data-quality metrics of processed trips file."""
+    fname = os.path.basename(fpath).replace("processed__", "quality__")
+    return os.path.join(os.path.dirname(fpath), fname)
+
+
+def get_stage_quality(df: pd.DataFrame, stage: str) -> pd.DataFrame:
+    """Get monthly data-quality metrics of raw or processed trips."""
+    flags = pd.DataFrame(
+        {
+            "trips": df["trip_id"],
+            "annual": df["user_type"].eq("Annual Member"),
+            "casual": df["user_type"].eq("Casual Member"),
+            "start_nans": df["start_station_name"].isna(),
+            "end_nans": df["end_station_name"].isna(),
+            "bike_id_nans": df["bike_id"].isna(),
+        }
+    )
+    df_quality = flags.groupby(
+        [
+            df["started_at"].dt.year.rename("year"),
+            df["started_at"].dt.month.rename("month"),
+        ]
+    ).agg(
+        **{
+            name.format(stage=stage): (metric, agg)
+            for metric, (name, agg) in QUALITY_METRICS.items()
+        }
+    )
+    return df_quality
+
+
+def get_trips_quality(
+    df_raw: pd.DataFrame, df_proc: pd.DataFrame
+) -> pd.DataFrame:
+    """Get monthly data-quality metrics of raw and processed trips.
+
+    Parameters
+    ----------
+    df_raw: pd.DataFrame
+        raw trips of a raw trips file, with standardized column names
+    df_proc: pd.DataFrame
+        processed trips of the same file, with (cleaned) station names
+
+    Returns
+    -------
+    pd.DataFrame
+        number of trips (distinct trip IDs), trips by Annual and Casual
+        members, and trips with missing start and end station names and bike
+        IDs, of raw and processed trips, per year and month of start time
+
+    Notes
+    -----
+    1. Metrics are computed from the raw and processed trips held in memory
+       by the ETL pipeline, so raw trips do not have to be exported and
+       re-read.
+    2. Processed trips are counted before trips with trip IDs duplicated
+       across files are removed (see trip_dedup), and their missing station
+       names are those of trips rather than of the station dimension.
+    """
+    df = (
+        get_stage_quality(df_raw, "raw")
+        .join(get_stage_quality(df_proc, "proc"), how="left")
+        .fillna(0)
+        .reset_index()
+        .astype(QUALITY_DTYPES)[list(QUALITY_DTYPES)]
+        .sort_values(by=["year", "month"], ignore_index=True)
+    )
+    return df
+
+
+def get_trips_quality_sql(source: str, is_processed: str) -> str:
+    """Get SQL to get monthly data-quality metrics of raw trips.
+
+    Parameters
+    ----------
+    source: str
+        table (or table function) of raw trips
+    is_processed: str
+        predicate (on columns of raw trips) selecting raw trips that are
+        kept in processed trips
+
+    Returns
+    -------
+    str
+        query of the metrics returned by get_trips_quality, in a single scan
+        of raw trips (station names of processed trips are missing where
+        raw station names are missing, since cleaning station names does not
+        remove them)
+    """
+    metrics = {
+        "trips": "COUNT(DISTINCT trip_id) FILTER ({f})",
+        "annual": "COUNT(*) FILTER ({f} AND user_type = 'Annual Member')",
+        "casual": "COUNT(*) FILTER ({f} AND user_type = 'Casual Member')",
+        "start_nans": "COUNT(*) FILTER ({f} AND start_station_name IS NULL)",
+        "end_nans": "COUNT(*) FILTER ({f} AND end_station_name IS NULL)",
+        "bike_id_nans": "COUNT(*) FILTER ({f} AND bike_id IS NULL)",
+    }
+    selected = [
+        f"{expr.format(f=f)} AS {QUALITY_METRICS[metric][0].format(stage=s)}"
+        for s, f in zip(STAGES, ["true", "is_processed"])
+        for metric, expr in metrics.items()
+    ]
+    query = f"""
+            SELECT CAST(year(started_at) AS SMALLINT) AS year,
+                   CAST(month(started_at) AS TINYINT) AS month,
+                   {', '.join(selected)}
+            FROM (
+                SELECT *, COALESCE({is_processed}, false) AS is_processed
+                FROM {source}
+            )
+            WHERE started_at IS NOT NULL
+            GROUP BY ALL
+            ORDER BY year, month
+            """  # nosec
+    return query
+
+
+def read_trips_quality(data_dir: str) -> pd.DataFrame:
+    """Read monthly data-quality metrics of all processed trips files.
+
+    Only the most recently exported metrics of every file are used. Metrics
+    of a month found in more than one file (eg. trips starting at the end of
+    the previous month) are added up.
+    """
+    latest = {}
+    for f in sorted(glob(os.path.join(data_dir, f"{QUALITY_PREFIX}_*"))):
+        latest[os.path.basename(f).rsplit("__", 1)[0]] = f
+    df = (
+        pd.concat(
+            [pd.read_parquet(f) for f in latest.values()], ignore_index=True
+        )
+        .groupby(["year", "month"], as_index=False)
+        .sum()
+        .astype(QUALITY_DTYPES)
+    )
+    return df
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define the sorted layout of processed trips files, and check its effect."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import argparse
+import inspect
+import os
+import re
+import tempfile
+import warnings
+from glob import glob
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from contexttimer import Timer
+
+import trip_datetimes as tdt
+
+# columns by which processed trips are sorted within every file, so that
+# every row group covers a narrow range of start stations (and of start
+# times within every station)
+SORT_COLUMNS = ["start_station_id", "started_at"]
+# rows per row group of processed trips, which is small enough that a query
+# of a single station reads a few row groups of a monthly file
+ROW_GROUP_SIZE = 32_768
+# columns of processed trips with (optional) bloom filters, which can skip
+# row groups that do not contain a station, when the minimum and maximum of
+# the station ID in the row group cannot
+BLOOM_FILTER_COLUMNS = ["start_station_id", "end_station_id"]
+# distinct values per row group (approximately the number of stations), and
+# false-positive probability, of bloom filters
+BLOOM_FILTER_NDV = 1_024
+BLOOM_FILTER_FPP = 0.01
+# whether pyarrow can write bloom filters (older versions, such as pyarrow
+# 15.0, do not accept bloom_filter_options)
+PYARROW_BLOOM_FILTERS = (
+    "bloom_filter_options" in inspect.signature(pq.write_table).parameters
+)
+# oldest versions of DuckDB that set the false-positive ratio of bloom
+# filters written by COPY, and that have an external file cache
+DUCKDB_BLOOM_FILTER_VERSION = (1, 2)
+DUCKDB_FILE_CACHE_VERSION = (1, 3)
+# queries used to compare layouts of processed trips
+BENCHMARK_QUERIES = {
+    "start_station_filter": """
+        SELECT hour(started_at) AS hour, COUNT(*) AS trips
+        FROM trips
+        WHERE start_station_id = {station_id}
+        GROUP BY ALL
+        """,
+    "end_station_filter": """
+        SELECT hour(ended_at) AS hour, COUNT(*) AS trips
+        FROM trips
+        WHERE end_station_id = {station_id}
+        GROUP BY ALL
+        """,
+    "hour_filter": """
+        SELECT start_station_id, COUNT(*) AS trips
+        FROM trips
+        WHERE hour(started_at) = 8
+        GROUP BY ALL
+        """,
+    "month_filter": """
+        SELECT start_station_id, COUNT(*) AS trips
+        FROM trips
+        WHERE {month_filter}
+        GROUP BY ALL
+        """,
+}
+
+
+def get_duckdb_version() -> Tuple[int, ...]:
+    """Get major and minor version of DuckDB."""
+    return tuple(int(v) for v in re.findall(r"\d+", duckdb.__version__)[:2])
+
+
+def write_trips_table(
+    table: pa.Table,
+    fpath: str,
+    row_group_size: int = ROW_GROUP_SIZE,
+    bloom_filters: bool = False,
+) -> str:
+    """Write (sorted) processed trips to gzip-compressed Parquet file.
+
+    Bloom filters are skipped (with a warning) if pyarrow cannot write them.
+    """
+    columns = [c for c in SORT_COLUMNS if c in table.column_names]
+    options = {}
+    if bloom_filters and PYARROW_BLOOM_FILTERS:
+        options["bloom_filter_options"] = {
+            c: {"ndv": BLOOM_FILTER_NDV, "fpp": BLOOM_FILTER_FPP}
+            for c in BLOOM_FILTER_COLUMNS
+            if c in table.column_names
+        }
+    elif bloom_filters:
+        warnings.warn(
+            f"pyarrow {pa.__version__} cannot write bloom filters, which are "
+            "skipped"
+        )
+    pq.write_table(
+        table,
+        fpath,
+        row_group_size=row_group_size,
+        compression="gzip",
+        sorting_columns=pq.SortingColumn.from_ordering(
+            table.schema, [(c, "ascending") for c in columns]
+        ),
+        **options,
+    )
+    return fpath
+
+
+def write_processed_trips(
+    df: pd.DataFrame,
+    fpath: str,
+    row_group_size: int = ROW_GROUP_SIZE,
+    bloom_filters: bool = False,
+) -> str:
+    """Sort processed trips by station and start time, and write to file."""
+    df = df.sort_values(by=[c for c in SORT_COLUMNS if c in df], kind="stable")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    return write_trips_table(table, fpath, row_group_size, bloom_filters)
+
+
+def get_copy_options_sql(
+    row_group_size: int = ROW_GROUP_SIZE, bloom_filters: bool = False
+) -> str:
+    """Get options of DuckDB COPY statement that writes processed trips.
+
+    DuckDB writes bloom filters for every dictionary-encoded column (which
+    includes station IDs), so bloom filters only set their false-positive
+    probability. This is skipped (with a warning) by older versions of
+    DuckDB, which do not write bloom filters.
+    """
+    options = [
+        "FORMAT PARQUET",
+        "COMPRESSION GZIP",
+        f"ROW_GROUP_SIZE {row_group_size}",
+    ]
+    if bloom_filters and get_duckdb_version() >= DUCKDB_BLOOM_FILTER_VERSION:
+        options.append(f"BLOOM_FILTER_FALSE_POSITIVE_RATIO {BLOOM_FILTER_FPP}")
+    elif bloom_filters:
+        warnings.warn(
+            f"DuckDB {duckdb.__version__} cannot write bloom filters, which "
+            "are skipped"
+        )
+    return f"({', '.join(options)})"
+
+
+def get_order_by_sql() -> str:
+    """Get ORDER BY clause that sorts processed trips written by DuckDB."""
+    return f"ORDER BY {', '.join(SORT_COLUMNS)}"
+
+
+def get_bytes_read() -> Optional[int]:
+    """Get bytes read by the current process, or None if not available."""
+    try:
+        with open("/proc/self/io") as f:
+            stats = dict(line.split(": ") for line in f.read().splitlines())
+    except OSError:
+        return None
+    return int(stats["rchar"])
+
+
+def benchmark_trips_layout(
+    fpaths: List[str],
+    queries: Dict[str, str],
+    repeats: int = 3,
+    row_group_size: int = ROW_GROUP_SIZE,
+) -> pd.DataFrame:
+    """Compare processed trips in raw row order and in the sorted layout.
+
+    Parameters
+    ----------
+    fpaths: List[str]
+        filepaths to processed trips
+    queries: Dict[str, str]
+        queries run against processed trips (as the trips table)
+    repeats: int
+        number of times every query is run (the fastest run is reported)
+    row_group_size: int
+        rows per row group of the sorted layout
+
+    Returns
+    -------
+    pd.DataFrame
+        size on disk of processed trips, and seconds taken by, and MB read
+        from files by, every query with every layout
+
+    Notes
+    -----
+    1. Layouts are raw row order (by trip ID) with default row groups, as
+       processed trips were written before they were sorted, the sorted
+       layout, and the sorted layout with bloom filters (if pyarrow can
+       write them).
+    2. MB read are bytes read by the process (rchar of /proc/self/io, which
+       includes reads served from the page cache), with the DuckDB file
+       cache disabled (in versions of DuckDB that have one). They are
+       missing where this is not available.
+    """
+    records = []
+    layouts = {"sorted": False}
+    if PYARROW_BLOOM_FILTERS:
+        layouts["sorted_bloom"] = True
+    with tempfile.TemporaryDirectory() as temp_dir, duckdb.connect() as con:
+        if get_duckdb_version() >= DUCKDB_FILE_CACHE_VERSION:
+            con.sql("SET enable_external_file_cache = false")
+        fpaths_layouts = {"raw_order": [], **{k: [] for k in layouts}}
+        for k, f in enumerate(fpaths):
+            table = pq.read_table(f)
+            fpath = os.path.join(temp_dir, f"raw_order_{k}.parquet.gzip")
+            pq.write_table(table.sort_by("trip_id"), fpath, compression="gzip")
+            fpaths_layouts["raw_order"].append(fpath)
+            for layout, bloom_filters in layouts.items():
+                fpath = os.path.join(temp_dir, f"{layout}_{k}.parquet.gzip")
+                write_processed_trips(
+                    table.to_pandas(), fpath, row_group_size, bloom_filters
+                )
+                fpaths_layouts[layout].append(fpath)
+        for layout, fps in fpaths_layouts.items():
+            records.append(
+                {
+                    "query": "disk_mb",
+                    "layout": layout,
+                    "seconds": None,
+                    "mb_read": sum(map(os.path.getsize, fps)) / 1024**2,
+                }
+            )
+        for name, query in queries.items():
+            for layout, fps in fpaths_layouts.items():
+                q = f"""
+                    WITH trips AS (SELECT * FROM read_parquet({fps}))
+                    {query}
+                    """  # nosec
+                seconds, bytes_read = [], []
+                for _ in range(repeats):
+                    bytes_start = get_bytes_read()
+                    with Timer() as t:
+                        con.sql(q).fetchall()
+                    seconds.append(t.elapsed)
+                    if bytes_start is not None:
+                        bytes_read.append(get_bytes_read() - bytes_start)
+                records.append(
+                    {
+                        "query": name,
+                        "layout": layout,
+                        "seconds": min(seconds),
+                        "mb_read": (
+                            min(bytes_read) / 1024**2 if bytes_read else None
+                        ),
+                    }
+                )
+    df = pd.DataFrame.from_records(records)
+    return df
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Compare layouts of processed trips files."
+    )
+    parser.add_argument(
+        "--processed-data-dir",
+        default=os.path.join("data", "processed"),
+        help="directory containing processed trips",
+    )
+    parser.add_argument(
+        "--year",
+        type=int,
+        default=2022,
+        help="year of processed trips to be compared",
+    )
+    parser.add_argument(
+        "--month",
+        type=int,
+        default=8,
+        help="month selected by queries that filter trips by month",
+    )
+    parser.add_argument(
+        "--row-group-size",
+        type=int,
+        default=ROW_GROUP_SIZE,
+        help="rows per row group of the sorted layout",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Benchmark bytes read and latency of queries of processed trips."""
+    args = parse_args()
+    pattern = os.path.join(
+        args.processed_data_dir, "processed__trips_*.parquet.gzip"
+    )
+    latest = {}
+    for f in sorted(glob(pattern)):
+        latest[os.path.basename(f).rsplit("__", 1)[0]] = f
+    fpaths = tdt.get_period_fpaths(sorted(latest.values()), [args.year])
+    # busiest start station
+    query = f"""
+            SELECT start_station_id
+            FROM read_parquet({fpaths})
+            GROUP BY ALL
+            ORDER BY COUNT(*) DESC
+            LIMIT 1
+            """  # nosec
+    station_id = duckdb.sql(query).fetchone()[0]
+    queries = {
+        name: query.format(
+            station_id=station_id,
+            month_filter=tdt.get_period_filter_sql([args.year], [args.month]),
+        )
+        for name, query in BENCHMARK_QUERIES.items()
+    }
+    df = benchmark_trips_layout(
+        fpaths, queries, row_group_size=args.row_group_size
+    )
+    print(
+        df.pivot(
+            index="query", columns="layout", values=["seconds", "mb_read"]
+        )
+        .round(4)
+        .to_string()
+    )
+
+
+if __name__ == "__main__":
+    main()
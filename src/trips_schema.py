@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define the compact schema of processed trips, and check its effect."""
+
+# pylint: disable=invalid-name,dangerous-default-value
+# pylint: disable=too-many-locals,unused-argument
+
+import argparse
+import os
+import tempfile
+from glob import glob
+from typing import Dict, List, Optional
+
+import duckdb
+import pandas as pd
+
+import station_dimension as stdim
+import trip_datetimes as tdt
+
+# datatypes of processed trips, which are applied by both ETL pipelines and
+# enforced whenever processed trips are read (station names are applied
+# before being stored separately, see station_dimension)
+PROCESSED_TRIPS_DTYPES = {
+    "trip_id": "Int64",
+    "trip_duration": "Int32",
+    "start_station_id": "int32",
+    "started_at": "datetime64[ns]",
+    "start_station_name": "category",
+    "end_station_id": "int32",
+    "ended_at": "datetime64[ns]",
+    "end_station_name": "category",
+    "bike_id": "Int32",
+    "user_type": "category",
+    # missing in files exported before UTC offsets were stored
+    **{c: "Int16" for c in tdt.UTC_OFFSET_COLUMNS.values()},
+}
+# datatypes of processed trips, including datetime attributes that were
+# stored by older versions of the ETL pipeline
+ALL_TRIPS_DTYPES = {**PROCESSED_TRIPS_DTYPES, **tdt.DATETIME_ATTRIBUTE_DTYPES}
+# DuckDB datatypes equivalent to the datatypes of processed trips
+SQL_TYPES = {
+    "Int64": "BIGINT",
+    "Int32": "INTEGER",
+    "int32": "INTEGER",
+    "Int16": "SMALLINT",
+    "int16": "SMALLINT",
+    "int8": "TINYINT",
+    "datetime64[ns]": "TIMESTAMP",
+    "category": "VARCHAR",
+}
+# datatypes of processed trips before the compact schema was used (when
+# datetime attributes were also stored)
+LEGACY_DTYPES = {
+    "Int64": "Int64",
+    "Int32": "Int64",
+    "int32": "Int64",
+    "Int16": "Int64",
+    "int16": "int64",
+    "int8": "int64",
+    "datetime64[ns]": "datetime64[ns]",
+    "category": "object",
+}
+# queries, from notebooks, whose results must not depend on the datatypes of
+# processed trips or on whether datetime attributes and station names are
+# stored (processed trips are available as the trips table)
+NOTEBOOK_QUERIES = {
+    "monthly_missing_values": """
+        SELECT started_at_year,
+               started_at_month,
+               SUM(IF(start_station_name IS NULL, 1, 0)) AS start_nans_proc,
+               SUM(IF(end_station_name IS NULL, 1, 0)) AS end_nans_proc,
+               SUM(IF(bike_id IS NULL, 1, 0)) AS bike_id_nans_proc,
+               COUNT(DISTINCT(trip_id)) AS proc_trips
+        FROM trips
+        GROUP BY ALL
+        """,
+    "weekday_trips": """
+        SELECT started_at_year AS year,
+               datepart('week', started_at) AS week_of_year,
+               started_at_month AS month,
+               dayname(started_at) AS weekday,
+               COUNT(DISTINCT(trip_id)) AS trips
+        FROM trips
+        GROUP BY ALL
+        """,
+    "yearly_stations": """
+        SELECT started_at_year AS year,
+               COUNT(DISTINCT(start_station_id)) AS stations_deps,
+               COUNT(DISTINCT(end_station_id)) AS stations_arrs
+        FROM trips
+        GROUP BY started_at_year
+        """,
+    "quarterly_departures": """
+        SELECT start_station_id AS station_id,
+               CONCAT(
+                   CAST(started_at_year AS VARCHAR),
+                   '_q',
+                   datepart('quarter', started_at)
+               ) AS year_quarter,
+               COUNT(DISTINCT(trip_id)) AS trips,
+               'departures' AS type
+        FROM trips
+        WHERE started_at_year <= 2022
+        GROUP BY all
+        """,
+    "weekend_arrivals": """
+        SELECT end_station_id AS station_id,
+               CAST(ended_at_year AS VARCHAR) AS year,
+               COUNT(DISTINCT(trip_id)) AS trips,
+               'arrivals_weekend' As type
+        FROM trips
+        WHERE ISODOW(ended_at)-1 IN (5,6)
+        AND ended_at_year <= 2022
+        GROUP BY all
+        """,
+    "casual_departures": """
+        SELECT start_station_id AS station_id,
+               CAST(started_at_year AS VARCHAR) AS year,
+               COUNT(DISTINCT(trip_id)) AS trips,
+               'departures_casual' As type
+        FROM trips
+        WHERE user_type LIKE 'Casual%'
+        AND started_at_year <= 2022
+        GROUP BY all
+        """,
+    "station_names": """
+        SELECT start_station_id AS station_id,
+               start_station_name AS name,
+               COUNT(DISTINCT(trip_id)) AS trips
+        FROM trips
+        GROUP BY all
+        """,
+    "hourly_trips": """
+        SELECT started_at_hour,
+               started_at_minute // 15 AS quarter_hour,
+               user_type,
+               COUNT(DISTINCT(trip_id)) AS trips
+        FROM trips
+        WHERE started_at_day = ended_at_day
+        GROUP BY all
+        """,
+}
+
+
+def apply_trips_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast processed trips to the compact datatypes of processed trips."""
+    dtypes = {c: dtype for c, dtype in ALL_TRIPS_DTYPES.items() if c in df}
+    for c, dtype in dtypes.items():
+        # trip and station IDs are strings in 2018
+        if dtype not in ["category", "datetime64[ns]"] and (
+            not pd.api.types.is_numeric_dtype(df[c])
+        ):
+            df[c] = pd.to_numeric(df[c])
+    return df.astype(dtypes)
+
+
+def get_legacy_trips(df: pd.DataFrame) -> pd.DataFrame:
+    """Get processed trips as stored before the compact schema was used."""
+    df = df.trips.assign_datetime_attributes()
+    dtypes = {
+        c: LEGACY_DTYPES[dtype]
+        for c, dtype in ALL_TRIPS_DTYPES.items()
+        if c in df
+    }
+    return df.astype(dtypes)
+
+
+def get_sql_type(column: str) -> str:
+    """Get DuckDB datatype of column of processed trips."""
+    return SQL_TYPES[PROCESSED_TRIPS_DTYPES[column]]
+
+
+def get_trips_select_sql(con: duckdb.DuckDBPyConnection, source: str) -> str:
+    """Get SQL to select processed trips, cast to the compact datatypes.
+
+    Datetime attributes are derived from start and end times, rather than
+    read from files exported by older versions of the ETL pipeline. Station
+    names stored by older versions are dropped (see station_dimension).
+    """
+    query = f"DESCRIBE SELECT * FROM {source}"  # nosec
+    columns = [c for c, *_ in con.sql(query).fetchall()]
+    stored = [
+        c
+        for c in columns
+        if c in tdt.DATETIME_ATTRIBUTE_DTYPES
+        or c in stdim.STATION_NAME_COLUMNS
+    ]
+    casts = [
+        f"CAST({c} AS {get_sql_type(c)}) AS {c}"
+        for c in columns
+        if c in PROCESSED_TRIPS_DTYPES and c not in stored
+    ]
+    selected = "*"
+    if stored:
+        selected += f" EXCLUDE ({', '.join(stored)})"
+    if casts:
+        selected += f" REPLACE ({', '.join(casts)})"
+    return ", ".join([selected] + tdt.get_datetime_attributes_sql())
+
+
+def read_processed_trips(
+    fpaths: List[str], columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """Read processed trips files, with the compact datatypes enforced.
+
+    Files are cast one at a time, since files exported before the compact
+    schema was used do not share the same datatypes. Station names stored
+    by older versions of the ETL pipeline are dropped.
+    """
+    df = pd.concat(
+        [
+            apply_trips_schema(
+                pd.read_parquet(f, columns=columns).drop(
+                    columns=stdim.STATION_NAME_COLUMNS, errors="ignore"
+                )
+            )
+            for f in fpaths
+        ],
+        ignore_index=True,
+    )
+    # categories differ between files
+    return apply_trips_schema(df)
+
+
+def get_bytes_per_row(fpaths: List[str], fpath_stations: str) -> pd.DataFrame:
+    """Get bytes per row on disk and in memory, with and without schema.
+
+    Parameters
+    ----------
+    fpaths: List[str]
+        filepaths to processed trips
+    fpath_stations: str
+        filepath to station dimension, from which station names of the
+        legacy datatypes are joined
+
+    Returns
+    -------
+    pd.DataFrame
+        bytes per row on disk (exported as gzip-compressed Parquet) and in
+        memory (as a DataFrame) of every file, with the legacy (with stored
+        datetime attributes and station names) and compact datatypes of
+        processed trips
+    """
+    df_stations = pd.read_parquet(fpath_stations)
+    records = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for f in fpaths:
+            df = read_processed_trips([f])
+            df_legacy = get_legacy_trips(
+                stdim.join_station_attributes(df, df_stations)
+            )
+            record = {"file": os.path.basename(f), "rows": len(df)}
+            for schema, df_schema in zip(
+                ["legacy", "compact"], [df_legacy, df]
+            ):
+                fpath = os.path.join(temp_dir, f"{schema}.parquet.gzip")
+                df_schema.to_parquet(fpath, index=False, compression="gzip")
+                record[f"disk_{schema}"] = os.path.getsize(fpath) / len(df)
+                record[f"memory_{schema}"] = df_schema.memory_usage(
+                    deep=True, index=False
+                ).sum() / len(df)
+            records.append(record)
+    df = pd.DataFrame.from_records(records)
+    return df
+
+
+def get_sorted_result(df: pd.DataFrame) -> pd.DataFrame:
+    """Get query result in a form that does not depend on its datatypes."""
+    df = df.astype(
+        {c: "object" for c in df.select_dtypes(include="category")}
+    ).convert_dtypes()
+    return df.sort_values(by=list(df)).reset_index(drop=True)
+
+
+def check_query_results(
+    fpaths: List[str],
+    fpath_stations: str,
+    queries: Dict[str, str] = NOTEBOOK_QUERIES,
+) -> pd.DataFrame:
+    """Check if queries give identical results with legacy and compact types.
+
+    Parameters
+    ----------
+    fpaths: List[str]
+        filepaths to processed trips
+    fpath_stations: str
+        filepath to station dimension, from which station names are joined
+        (with pandas for the legacy datatypes, where names are stored, and
+        with DuckDB for the compact datatypes)
+    queries: Dict[str, str]
+        queries run against processed trips (as the trips table)
+
+    Returns
+    -------
+    pd.DataFrame
+        number of rows returned by, and whether results are identical, for
+        every query
+    """
+    df = read_processed_trips(fpaths)
+    df_stations = pd.read_parquet(fpath_stations)
+    df_legacy = get_legacy_trips(
+        stdim.join_station_attributes(df, df_stations)
+    )
+    results = {}
+    for schema, df_schema in zip(["legacy", "compact"], [df_legacy, df]):
+        con = duckdb.connect()
+        con.register("trips_stored", df_schema)
+        con.register("stations", df_stations)
+        # datetime attributes and station names are only stored with the
+        # legacy datatypes
+        if schema == "legacy":
+            query = "CREATE VIEW trips AS SELECT * FROM trips_stored"
+        else:
+            selected = get_trips_select_sql(con, "trips_stored")
+            source = f"(SELECT {selected} FROM trips_stored)"  # nosec
+            query = f"""
+                    CREATE VIEW trips AS
+                    {stdim.get_station_join_sql(source, 'stations')}
+                    """  # nosec
+        con.sql(query)
+        results[schema] = {
+            name: get_sorted_result(con.sql(query).df())
+            for name, query in queries.items()
+        }
+        con.close()
+    records = []
+    for name in queries:
+        df_legacy = results["legacy"][name]
+        df_compact = results["compact"][name]
+        try:
+            pd.testing.assert_frame_equal(
+                df_legacy, df_compact, check_dtype=False
+            )
+            identical = True
+        except AssertionError:
+            identical = False
+        records.append(
+            {"query": name, "rows": len(df_legacy), "identical": identical}
+        )
+    df_check = pd.DataFrame.from_records(records)
+    return df_check
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Report effect of compact datatypes of processed trips."
+    )
+    parser.add_argument(
+        "--processed-data-dir",
+        default=os.path.join("data", "processed"),
+        help="directory containing processed trips",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Report bytes per row, and check query results, of processed trips."""
+    args = parse_args()
+    pattern = os.path.join(
+        args.processed_data_dir, "processed__trips_*.parquet.gzip"
+    )
+    latest = {}
+    for f in sorted(glob(pattern)):
+        latest[os.path.basename(f).rsplit("__", 1)[0]] = f
+    fpaths = sorted(latest.values())
+    fpath_stations = sorted(
+        glob(
+            os.path.join(
+                args.processed_data_dir,
+                f"{stdim.STATION_DIMENSION_PREFIX}__*.parquet.gzip",
+            )
+        )
+    )[-1]
+    df_bytes = get_bytes_per_row(fpaths, fpath_stations)
+    print(df_bytes.round(1).to_string(index=False))
+    totals = {
+        c: (df_bytes[c] * df_bytes["rows"]).sum() / df_bytes["rows"].sum()
+        for c in df_bytes.columns[2:]
+    }
+    print(
+        "Bytes per row (legacy -> compact): "
+        f"disk {totals['disk_legacy']:.1f} -> {totals['disk_compact']:.1f}, "
+        f"memory {totals['memory_legacy']:.1f} -> "
+        f"{totals['memory_compact']:.1f}"
+    )
+    print(check_query_results(fpaths, fpath_stations).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,20 @@
 # pylint: disable=invalid-name,dangerous-default-value
 # pylint: disable=too-many-locals,unused-argument,unnecessary-lambda
 
+from __future__ import annotations
+
+from io import StringIO
 from typing import Dict, List, Union
 
-import altair as alt
 import pandas as pd
+from contexttimer import Timer
+
+import import_utils as iu
+
+# only needed once a chart is created (annotations are not evaluated)
+alt = iu.lazy_import("altair")
+gpd = iu.lazy_import("geopandas")
+gpu = iu.lazy_import("geopandas_helpers")
 
 
 def configure_chart(
@@ -1127,3 +1137,71 @@ def plot_line_chart(
     )
     chart = configure_chart(alt.layer(chart, rule, text), axis_label_fontsize)
     return chart
+
+
+def plot_choropleth_map(
+    lods: Dict[float, gpd.GeoDataFrame],
+    color_by_col: str,
+    tooltip: List[str],
+    ptitle: alt.TitleParams,
+    max_spec_bytes: int = 1_000_000,
+    color_scheme: str = "greens",
+    stroke_color: str = "white",
+    stroke_width: float = 0.5,
+    fig_size: Dict[str, int] = dict(width=600, height=450),
+) -> alt.Chart:
+    """Plot map using the most detailed geometries that fit in the spec."""
+    tolerance = gpu.get_geometry_lod_by_size(lods, max_spec_bytes)
+    chart = (
+        alt.Chart(data=lods[tolerance], title=ptitle)
+        .mark_geoshape(stroke=stroke_color, strokeWidth=stroke_width)
+        .encode(
+            color=alt.Color(
+                color_by_col, title=None, scale=alt.Scale(scheme=color_scheme)
+            ),
+            tooltip=tooltip,
+        )
+        .project(type="mercator")
+        .properties(**fig_size)
+    )
+    chart = configure_chart(chart, show_grid=False)
+    return chart
+
+
+def benchmark_geometry_lods(
+    lods: Dict[float, gpd.GeoDataFrame],
+    color_by_col: str,
+    tooltip: List[str],
+    render: bool = True,
+) -> pd.DataFrame:
+    """Get chart spec size and rendering time at every level of detail."""
+    records = []
+    for tolerance, gdf_lod in sorted(lods.items()):
+        chart = plot_choropleth_map(
+            {tolerance: gdf_lod},
+            color_by_col,
+            tooltip,
+            alt.TitleParams(text=f"Tolerance = {tolerance:g}m"),
+        )
+        with Timer() as t_spec:
+            spec = chart.to_json()
+        render_time = None
+        if render:
+            # rendering to SVG requires vl-convert
+            with Timer() as t_render:
+                chart.save(StringIO(), format="svg")
+            render_time = t_render.elapsed
+        records.append(
+            {
+                "tolerance": tolerance,
+                "num_vertices": int(
+                    gdf_lod.geometry.count_coordinates().sum()
+                ),
+                "geojson_bytes": gpu.get_geojson_size(gdf_lod),
+                "spec_bytes": len(spec.encode("utf-8")),
+                "spec_time": t_spec.elapsed,
+                "render_time": render_time,
+            }
+        )
+    df = pd.DataFrame.from_records(records).convert_dtypes()
+    return df
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Define fixtures of synthetic trips shared by tests."""
+
+# pylint: disable=invalid-name,redefined-outer-name
+
+import os
+from typing import Dict, List
+
+import pytest
+
+import etl
+import synthetic_trips as st
+
+# years and months of synthetic raw trips files (monthly files of 2020
+# onwards), of which the last month is added in an incremental update
+SYNTHETIC_PERIODS = {2021: [6, 7], 2022: [6, 7]}
+SYNTHETIC_SCALE = 0.02
+
+
+@pytest.fixture(scope="session")
+def processed_fpaths(tmp_path_factory) -> Dict[int, List[str]]:
+    """Get processed trips of a few months of synthetic raw trips, by year.
+
+    Trips are processed as in etl.run_trips_etl, including the removal of
+    trips duplicated across files.
+    """
+    data_dir = tmp_path_factory.mktemp("data")
+    raw_dir, proc_dir = [os.path.join(data_dir, d) for d in ["raw", "proc"]]
+    os.makedirs(proc_dir)
+    outputs = [
+        etl.run_trips_etl_pipeline(
+            f, proc_dir, ["trip_duration"], export_raw=False
+        )
+        for year, periods in SYNTHETIC_PERIODS.items()
+        for f in st.write_synthetic_trips(
+            raw_dir, [year], periods, scale=SYNTHETIC_SCALE
+        )
+    ]
+    outputs = etl.add_deduplicated_trips(outputs, proc_dir)
+    fpaths = {}
+    for o in outputs:
+        fpaths.setdefault(int(o["year"]), []).append(o["proc_fpath"])
+    return fpaths
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Test that the aggregate cube gives the same totals as processed trips."""
+
+# pylint: disable=invalid-name,redefined-outer-name
+
+from typing import Dict, List, Optional
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+
+import aggregate_cube as ac
+
+# days of week (Monday=0) selected overall, on weekdays and on weekends
+DAYS_OF_WEEK = {
+    "all": None,
+    "weekdays": [0, 1, 2, 3, 4],
+    "weekends": [5, 6],
+}
+
+
+def get_station_trips_sql(
+    fpaths_last_year: List[str],
+    fpaths_last_n_years: List[str],
+    days_of_week: Optional[List[int]] = None,
+) -> pd.DataFrame:
+    """Get station departures and arrivals as in 04_get_top_stations.
+
+    Trips are counted with COUNT(DISTINCT(trip_id)) over the processed trips
+    files of the last year and of the last N years, as in the notebook, while
+    missing stations (removed in the notebook by the join to station
+    attributes) are dropped.
+    """
+    where = (
+        f"AND ISODOW(started_at)-1 IN ({', '.join(map(str, days_of_week))})"
+        if days_of_week
+        else ""
+    )
+    counts = [
+        f"""
+        SELECT {col}_station_id AS station_id,
+               COUNT(DISTINCT(trip_id)) AS {direction}_{suffix}
+        FROM read_parquet({fpaths})
+        WHERE {col}_station_id IS NOT NULL
+        {where}
+        GROUP BY ALL
+        """  # nosec
+        for fpaths, suffix in zip(
+            [fpaths_last_n_years, fpaths_last_year],
+            ["last_n_years", "last_year"],
+        )
+        for col, direction in zip(["start", "end"], ["departures", "arrivals"])
+    ]
+    query = f"""
+            SELECT *
+            FROM ({counts[0]})
+            FULL OUTER JOIN ({counts[1]}) USING (station_id)
+            LEFT JOIN ({counts[2]}) USING (station_id)
+            LEFT JOIN ({counts[3]}) USING (station_id)
+            """  # nosec
+    df = duckdb.sql(query).df()
+    return df.fillna(0).astype({c: "int64" for c in df.columns})
+
+
+def check_station_trips(
+    cube_dir: str, fpaths: Dict[int, List[str]], days_of_week: List[int]
+) -> None:
+    """Check cube totals of stations against processed trips."""
+    years = sorted(fpaths)
+    # filter values taken from NumPy arrays, as in notebooks
+    df_cube = ac.get_station_trips_by_period(
+        cube_dir, np.int64(years[-1]), list(np.array(years)), days_of_week
+    )
+    df_trips = get_station_trips_sql(
+        fpaths[years[-1]],
+        [f for y in years for f in fpaths[y]],
+        days_of_week,
+    )
+    pd.testing.assert_frame_equal(
+        df_cube.sort_values(by="station_id", ignore_index=True),
+        df_trips[df_cube.columns].sort_values(
+            by="station_id", ignore_index=True
+        ),
+    )
+
+
+@pytest.mark.parametrize("days", list(DAYS_OF_WEEK))
+def test_station_trips_by_period(processed_fpaths, tmp_path, days):
+    """Cube totals of stations equal totals of processed trips."""
+    fpaths = processed_fpaths
+    ac.update_aggregate_cube([f for v in fpaths.values() for f in v], tmp_path)
+    check_station_trips(tmp_path, fpaths, DAYS_OF_WEEK[days])
+
+
+@pytest.mark.parametrize("days", list(DAYS_OF_WEEK))
+def test_station_trips_after_update(processed_fpaths, tmp_path, days):
+    """Cube totals equal totals of processed trips after adding a month."""
+    fpaths = [f for v in processed_fpaths.values() for f in v]
+    assert len(ac.update_aggregate_cube(fpaths[:-1], tmp_path)) == len(
+        fpaths[:-1]
+    )
+    assert ac.update_aggregate_cube(fpaths, tmp_path) == [fpaths[-1]]
+    check_station_trips(tmp_path, processed_fpaths, DAYS_OF_WEEK[days])
+
+
+@pytest.mark.parametrize(
+    "by", [["station_id"], ["year", "month"], ["day_of_week", "user_type"]]
+)
+def test_query_aggregate_cube(processed_fpaths, tmp_path, by):
+    """Cube totals by any dimensions equal totals of processed trips."""
+    fpaths = [f for v in processed_fpaths.values() for f in v]
+    ac.update_aggregate_cube(fpaths, tmp_path)
+    filters = {"user_type": ["Casual Member"], "hour": list(np.arange(7, 10))}
+    pd.testing.assert_frame_equal(
+        ac.query_aggregate_cube(tmp_path, by, filters),
+        ac.query_trips_like_cube(fpaths, by, filters),
+    )
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Test localized datetimes against pandas around DST transitions."""
+
+# pylint: disable=invalid-name,redefined-outer-name
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import datetime_utils as dtu
+
+TZ = "America/Toronto"
+# how datetime_utils localizes ambiguous and nonexistent datetimes, and the
+# equivalent arguments of tz_localize
+AMBIGUOUS_TIMES = {"earliest": True, "latest": False, "NaT": "NaT"}
+NONEXISTENT_TIMES = {"shift_by_gap": pd.Timedelta(hours=1), "NaT": "NaT"}
+
+
+@pytest.fixture(scope="module")
+def local_times() -> pd.Series:
+    """Get naive local datetimes around the DST transitions of 2022."""
+    return pd.Series(
+        pd.to_datetime(
+            [
+                "2022-03-13 01:59",
+                "2022-03-13 02:00",
+                "2022-03-13 02:30",
+                "2022-03-13 03:00",
+                "2022-11-06 00:30",
+                "2022-11-06 01:00",
+                "2022-11-06 01:30",
+                "2022-11-06 02:00",
+                None,
+            ]
+        ).astype("datetime64[ns]"),
+        name="started_at",
+    )
+
+
+@pytest.mark.parametrize("ambiguous", list(AMBIGUOUS_TIMES))
+@pytest.mark.parametrize("nonexistent", list(NONEXISTENT_TIMES))
+def test_localize_datetimes(local_times, ambiguous, nonexistent):
+    """Test localized datetimes are the same as with tz_localize."""
+    localized = dtu.localize_datetimes(local_times, TZ, ambiguous, nonexistent)
+    expected = local_times.dt.tz_localize(
+        TZ,
+        ambiguous=(
+            np.full(len(local_times), AMBIGUOUS_TIMES[ambiguous])
+            if ambiguous != "NaT"
+            else "NaT"
+        ),
+        nonexistent=NONEXISTENT_TIMES[nonexistent],
+    )
+    pd.testing.assert_series_equal(
+        localized, expected.dt.as_unit("ns"), check_dtype=False
+    )
+
+
+def test_shift_by_gap(local_times):
+    """Test nonexistent datetimes are shifted forward by the DST gap."""
+    localized = dtu.localize_datetimes(local_times[[2]], TZ)
+    assert localized.iloc[0] == pd.Timestamp("2022-03-13 03:30", tz=TZ)
+
+
+@pytest.mark.parametrize("name", ["ambiguous", "nonexistent"])
+def test_raise(local_times, name):
+    """Test an error is raised for ambiguous or nonexistent datetimes."""
+    with pytest.raises(ValueError, match=name):
+        dtu.get_utc_offsets(local_times, TZ, **{name: "raise"})
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Test keys of cached query results of the shared DuckDB connection."""
+
+# pylint: disable=invalid-name,redefined-outer-name
+
+import duckdb
+import pytest
+
+import duckdb_utils as dbu
+
+
+@pytest.fixture
+def con(processed_fpaths) -> duckdb.DuckDBPyConnection:
+    """Get connection with a view over processed trips."""
+    con = duckdb.connect()
+    fpaths = processed_fpaths[2022]
+    con.sql(
+        f"CREATE VIEW trips AS SELECT * FROM read_parquet({fpaths})"  # nosec
+    )
+    yield con
+    con.close()
+
+
+def test_sql_references(con):
+    """Test tables (but not CTEs) and files referenced by query are found."""
+    query = """
+            WITH t1 AS (SELECT * FROM trips)
+            SELECT *
+            FROM t1
+            UNION ALL
+            SELECT *
+            FROM read_parquet('trips_*.parquet')
+            """
+    tables, files = dbu.get_sql_references(dbu.get_parsed_sql(con, query))
+    assert tables == {"trips"}
+    assert files == {"trips_*.parquet"}
+
+
+def test_cache_key(con, processed_fpaths):
+    """Test cache key changes with the definition of the views read from."""
+    views = {"trips": processed_fpaths[2022]}
+    query = "SELECT COUNT(*) FROM trips -- comment"
+    key = dbu.get_cache_key(con, query, views)
+    assert key is not None
+    assert dbu.get_cache_key(con, "SELECT COUNT(*)  FROM trips", views) == key
+    con.sql(
+        "CREATE OR REPLACE VIEW trips AS "
+        f"SELECT * FROM read_parquet({views['trips']}) "  # nosec
+        "WHERE start_station_id IS NOT NULL"
+    )
+    assert dbu.get_cache_key(con, query, views) != key
+    assert dbu.get_cache_key(con, "SELECT * FROM other", views) is None
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Test stages are only recorded within a collector."""
+
+# pylint: disable=invalid-name,redefined-outer-name
+
+import pandas as pd
+
+import instrumentation as instr
+
+
+@instr.instrument(rows_arg="df")
+def drop_first_row(df: pd.DataFrame) -> pd.DataFrame:
+    """Drop first row of DataFrame."""
+    return df.iloc[1:]
+
+
+def test_instrument_outside_collector():
+    """Test calls outside of a collector are not recorded."""
+    for _ in range(3):
+        df = drop_first_row(pd.DataFrame({"a": range(3)}))
+    assert len(df) == 2
+    assert not instr._STACK
+    with instr.collect() as records:
+        pass
+    assert not records
+
+
+def test_instrument_within_collector():
+    """Test calls within a collector are recorded, with their rows."""
+    with instr.collect() as records:
+        with instr.stage("outer"):
+            drop_first_row(pd.DataFrame({"a": range(3)}))
+    df = instr.get_run_log(records)
+    assert df["stage"].tolist() == ["outer", "drop_first_row"]
+    assert df["parent"].tolist()[1] == "outer"
+    assert df[["rows_in", "rows_out"]].iloc[1].tolist() == [3, 2]
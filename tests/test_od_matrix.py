@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Test OD matrices give the same flows as processed trips."""
+
+# pylint: disable=invalid-name,redefined-outer-name
+
+import os
+
+import duckdb
+import pyarrow.parquet as pq
+import pytest
+
+import od_matrix as odm
+
+
+def test_top_flows(processed_fpaths, tmp_path):
+    """Test busiest flows against processed trips."""
+    fpaths = processed_fpaths[2022]
+    assert odm.build_od_matrices(fpaths, tmp_path)
+    df = odm.get_top_flows(odm.aggregate_od_matrices(tmp_path), k=5)
+    expected = duckdb.sql(
+        f"""
+        SELECT start_station_id, end_station_id, COUNT(*) AS trips
+        FROM read_parquet({fpaths})
+        WHERE start_station_id IS NOT NULL
+        AND end_station_id IS NOT NULL
+        GROUP BY ALL
+        ORDER BY trips DESC
+        LIMIT 5
+        """  # nosec
+    ).df()
+    assert df["trips"].tolist() == expected["trips"].tolist()
+
+
+def test_empty_trips(processed_fpaths, tmp_path):
+    """Test no OD matrices are built from processed trips without trips."""
+    fpath = processed_fpaths[2022][0]
+    fpath_empty = os.path.join(tmp_path, os.path.basename(fpath))
+    pq.write_table(pq.read_table(fpath).slice(0, 0), fpath_empty)
+    assert not odm.build_od_matrices([fpath_empty], tmp_path)
+    with pytest.raises(ValueError, match="Found no OD matrices"):
+        odm.aggregate_od_matrices(tmp_path)
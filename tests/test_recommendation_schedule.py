@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Test rules of recommended hours given as SQL filters."""
+
+# pylint: disable=invalid-name,redefined-outer-name
+
+import pandas as pd
+import pytest
+
+import recommendation_schedule as rs
+
+START_DATE = "2023-04-24 00:00:00"
+END_DATE = "2023-10-15 23:00:00"
+PRIME_MONTHS = "('May', 'June', 'July', 'August', 'September')"
+WEEKEND = "('Saturday', 'Sunday')"
+
+
+@pytest.fixture
+def rules():
+    """Rules of recommended hours, by season, type of day and hours."""
+    return {
+        "weekday_prime": dict(
+            season="Prime Bike Share Season",
+            type_of_day="Weekday",
+            hours=[(7, 11), (16, 20)],
+        ),
+        "weekend_prime": dict(
+            season="Prime Bike Share Season",
+            type_of_day="Weekend",
+            hours=[(12, 14)],
+            user_types=["Casual"],
+        ),
+    }
+
+
+@pytest.fixture
+def sql_rules():
+    """Same rules of recommended hours, as SQL filters."""
+    return {
+        "weekday_prime": dict(
+            sql=(
+                f"month IN {PRIME_MONTHS} "
+                f"AND day_of_week NOT IN {WEEKEND} "
+                "AND ((hour >= 7 AND hour < 11) OR (hour >= 16 AND hour < 20))"
+            )
+        ),
+        "weekend_prime": dict(
+            sql=(
+                f"month IN {PRIME_MONTHS} "
+                f"AND day_of_week IN {WEEKEND} "
+                "AND hour >= 12 AND hour < 14"
+            ),
+            user_types=["Casual"],
+        ),
+    }
+
+
+def test_sql_rules(rules, sql_rules):
+    """Test SQL filters recommend the same hours as equivalent rules."""
+    df_sql = rs.get_recommended_schedule(sql_rules, START_DATE, END_DATE)
+    expected = rs.get_recommended_schedule(rules, START_DATE, END_DATE)
+    assert df_sql["is_recommended"].any()
+    pd.testing.assert_frame_equal(df_sql, expected)
+
+
+def test_sql_rules_duckdb(rules, sql_rules):
+    """Test SQL filters select the same hours in the DuckDB schedule."""
+    df_sql = rs.get_recommended_schedule_sql(sql_rules, START_DATE, END_DATE)
+    expected = rs.get_recommended_schedule_sql(rules, START_DATE, END_DATE)
+    pd.testing.assert_series_equal(
+        df_sql["is_recommended"], expected["is_recommended"]
+    )
+
+
+def test_read_rules(sql_rules, tmp_path):
+    """Test reading stored temporal filters as rules."""
+    fpath = tmp_path / "recommendations_temporal__test.parquet.gzip"
+    pd.DataFrame({k: [v["sql"]] for k, v in sql_rules.items()}).to_parquet(
+        fpath, compression="gzip"
+    )
+    assert rs.read_recommended_hour_rules(fpath) == {
+        k: {"sql": v["sql"]} for k, v in sql_rules.items()
+    }
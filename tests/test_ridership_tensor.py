@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Test the ridership tensor gives the same totals as processed trips."""
+
+# pylint: disable=invalid-name,redefined-outer-name
+
+import os
+
+import duckdb
+import pyarrow.parquet as pq
+import pytest
+
+import ridership_tensor as rtu
+
+
+def test_station_trips(processed_fpaths, tmp_path):
+    """Test station departures and arrivals against processed trips."""
+    fpaths = processed_fpaths[2022]
+    rtu.build_ridership_tensor(fpaths, tmp_path)
+    df = rtu.get_station_trips(rtu.load_ridership_tensor(tmp_path))
+    for direction, col in [
+        ("departures", "start_station_id"),
+        ("arrivals", "end_station_id"),
+    ]:
+        expected = dict(
+            duckdb.sql(
+                f"""
+                SELECT {col}, COUNT(DISTINCT(trip_id))
+                FROM read_parquet({fpaths})
+                WHERE {col} IS NOT NULL
+                GROUP BY ALL
+                """  # nosec
+            ).fetchall()
+        )
+        totals = df.set_index("station_id")[direction]
+        assert totals[totals > 0].to_dict() == expected
+
+
+def test_empty_trips(processed_fpaths, tmp_path):
+    """Test processed trips without trips give an empty tensor."""
+    fpath = processed_fpaths[2022][0]
+    fpath_empty = os.path.join(tmp_path, os.path.basename(fpath))
+    pq.write_table(pq.read_table(fpath).slice(0, 0), fpath_empty)
+    rtu.build_ridership_tensor([fpath_empty], tmp_path)
+    rt = rtu.load_ridership_tensor(tmp_path)
+    assert rt["tensor"].size == 0
+    assert rtu.get_station_trips(rt).empty
+
+
+def test_no_files(tmp_path):
+    """Test an error is raised without processed trips files."""
+    with pytest.raises(ValueError, match="No processed trips"):
+        rtu.build_ridership_tensor([], tmp_path)
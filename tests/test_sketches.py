@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Test distinct counts from sketches of processed trips."""
+
+# pylint: disable=invalid-name,redefined-outer-name
+
+import os
+import shutil
+from typing import Dict
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import sketches as sk
+
+
+def get_hll_estimates(fpath: str) -> Dict[str, float]:
+    """Get estimated distinct values of every column of sketches file."""
+    with np.load(fpath) as sketch:
+        return {
+            c: sk.get_hll_estimate(sketch[f"hll__{c}"])
+            for c in sk.SKETCH_DISTINCT_COLUMNS
+        }
+
+
+@pytest.fixture(scope="module")
+def fpath_proc(processed_fpaths, tmp_path_factory) -> str:
+    """Get copy of processed trips file, in a directory of its own."""
+    fpath = processed_fpaths[2022][0]
+    fpath_copy = os.path.join(
+        tmp_path_factory.mktemp("sketches"), os.path.basename(fpath)
+    )
+    shutil.copyfile(fpath, fpath_copy)
+    return fpath_copy
+
+
+def test_hll_estimate_with_nulls(fpath_proc, tmp_path):
+    """Test IDs are counted alike in files with and without missing IDs."""
+    table = pq.read_table(fpath_proc)
+    # append trips whose IDs are all missing
+    nulls = table.slice(0, 10)
+    for c in sk.SKETCH_DISTINCT_COLUMNS:
+        idx = nulls.schema.get_field_index(c)
+        nulls = nulls.set_column(
+            idx, c, pa.nulls(nulls.num_rows, nulls.schema.field(c).type)
+        )
+    fpath_nulls = os.path.join(tmp_path, os.path.basename(fpath_proc))
+    pq.write_table(pa.concat_tables([table, nulls]), fpath_nulls)
+    assert get_hll_estimates(sk.build_trip_sketches(fpath_nulls)) == (
+        get_hll_estimates(sk.build_trip_sketches(fpath_proc))
+    )
+
+
+def test_hll_estimate_within_bounds(fpath_proc):
+    """Test estimated distinct IDs are near the exact number of IDs."""
+    estimates = get_hll_estimates(sk.build_trip_sketches(fpath_proc))
+    table = pq.read_table(fpath_proc, columns=sk.SKETCH_DISTINCT_COLUMNS)
+    rse = sk.get_hll_relative_error()
+    for c in sk.SKETCH_DISTINCT_COLUMNS:
+        exact = len(table.column(c).drop_null().unique())
+        assert abs(estimates[c] - exact) <= 3 * rse * exact, c
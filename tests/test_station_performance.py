@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Test station scores against the SQL of 04_get_top_stations."""
+
+# pylint: disable=invalid-name,redefined-outer-name
+
+from typing import List, Optional
+
+import duckdb
+import pandas as pd
+import pytest
+
+import station_performance as spu
+
+# day-of-week variants of station scores, as (suffix of columns, days of
+# week (Monday=0) or None for all trips)
+DAYS_OF_WEEK = {"": None, "_weekday": [0, 1, 2, 3, 4], "_weekend": [5, 6]}
+
+
+def get_station_scores_sql(
+    fpaths_last_year: List[str],
+    fpaths_last_n_years: List[str],
+    df_info: pd.DataFrame,
+    num_top_stations: int,
+    variant: str,
+    days_of_week: Optional[List[int]] = None,
+) -> pd.DataFrame:
+    """Get station scores as in (one ranking query of) 04_get_top_stations.
+
+    Departures (arrivals) of the last N years are left joined to departures
+    (arrivals) of the last year, pivoted, and ranked after an inner join
+    with station attributes, as in the notebook.
+    """
+    where = (
+        f"WHERE ISODOW(started_at)-1 IN ({', '.join(map(str, days_of_week))})"
+        if days_of_week
+        else ""
+    )
+    periods = ["last_year", "last_n_years"]
+    # pivoted columns are named {direction}_{alias}
+    aliases = [f"{variant}_{period}".lstrip("_") for period in periods]
+    counts = [
+        f"""
+        SELECT {col}_station_id AS station_id,
+               COUNT(DISTINCT(trip_id)) AS trips_{suffix},
+               '{direction}' AS type
+        FROM read_parquet({fpaths})
+        {where}
+        GROUP BY ALL
+        """  # nosec
+        for fpaths, suffix in zip(
+            [fpaths_last_year, fpaths_last_n_years], periods
+        )
+        for col, direction in zip(["start", "end"], ["departures", "arrivals"])
+    ]
+    columns = [
+        f"{direction}{variant}_{period}"
+        for direction in ["departures", "arrivals"]
+        for period in periods
+    ]
+    ranks = ", ".join(
+        f"RANK() OVER(ORDER BY {column} DESC) AS rank{variant}_{metric}"
+        for metric, column in zip(
+            spu.RANK_METRICS,
+            [c.format(variant=variant) for c in spu.RANK_METRICS.values()],
+        )
+    )
+    is_top = " AND ".join(
+        f"rank{variant}_{metric} <= {num_top_stations}"
+        for metric in spu.RANK_METRICS
+    )
+    query = f"""
+            WITH t6 AS (
+                SELECT * EXCLUDE (type), t1.type
+                FROM ({counts[0]}) AS t1
+                LEFT JOIN ({counts[2]}) USING (station_id)
+                UNION ALL
+                SELECT * EXCLUDE (type), t2.type
+                FROM ({counts[1]}) AS t2
+                LEFT JOIN ({counts[3]}) USING (station_id)
+            ),
+            t7 AS (
+                PIVOT t6
+                ON type
+                USING MAX(trips_last_year) AS {aliases[0]},
+                      MAX(trips_last_n_years) AS {aliases[1]}
+            ),
+            t8 AS (
+                SELECT station_id,
+                       {', '.join(
+                           f"COALESCE({c}, 0) AS {c}" for c in columns
+                       )}
+                FROM t7
+                INNER JOIN df_info USING (station_id)
+            ),
+            t9 AS (
+                SELECT *, {ranks}
+                FROM t8
+            )
+            SELECT *, {is_top} AS is_top_perform_station{variant}
+            FROM t9
+            ORDER BY station_id
+            """  # nosec
+    with duckdb.connect() as con:
+        con.register("df_info", df_info)
+        df = con.sql(query).df()
+    return df
+
+
+@pytest.fixture
+def df_info(processed_fpaths):
+    """Attributes of stations found in processed trips."""
+    fpaths = [f for v in processed_fpaths.values() for f in v]
+    query = f"""
+            SELECT DISTINCT CAST(start_station_id AS INTEGER) AS station_id,
+                   True AS is_active
+            FROM read_parquet({fpaths})
+            WHERE start_station_id IS NOT NULL
+            ORDER BY station_id
+            """  # nosec
+    return duckdb.sql(query).df()
+
+
+@pytest.mark.parametrize("variant", list(DAYS_OF_WEEK))
+def test_station_scores(processed_fpaths, df_info, tmp_path, variant):
+    """Station scores are those of the SQL of 04_get_top_stations."""
+    years = sorted(processed_fpaths)
+    fpaths = [f for y in years for f in processed_fpaths[y]]
+    num_top_stations = len(df_info) // 10
+    df, _ = spu.update_station_scores(
+        fpaths,
+        df_info,
+        tmp_path / "cube",
+        tmp_path / "state",
+        years[-1],
+        years,
+        spu.get_rank_thresholds(num_top_stations),
+    )
+    expected = get_station_scores_sql(
+        processed_fpaths[years[-1]],
+        fpaths,
+        df_info,
+        num_top_stations,
+        variant,
+        DAYS_OF_WEEK[variant],
+    )
+    assert df["is_active"].all()
+    pd.testing.assert_frame_equal(
+        df[expected.columns]
+        .dropna()
+        .sort_values(by="station_id", ignore_index=True)
+        .astype(expected.dtypes.to_dict()),
+        expected,
+    )
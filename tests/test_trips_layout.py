@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+"""Test processed trips are written by versions without bloom filters."""
+
+# pylint: disable=invalid-name,redefined-outer-name
+
+import os
+
+import pyarrow.parquet as pq
+import pytest
+
+import trips_layout as tl
+
+
+@pytest.fixture
+def old_versions(monkeypatch):
+    """Mimic versions of pyarrow and DuckDB without bloom filters."""
+    write_table = pq.write_table
+
+    def write_table_without_bloom_filters(table, where, **kwargs):
+        """Write table, rejecting bloom filters as pyarrow 15.0 does."""
+        if "bloom_filter_options" in kwargs:
+            raise TypeError("unexpected keyword argument")
+        return write_table(table, where, **kwargs)
+
+    monkeypatch.setattr(
+        tl.pq, "write_table", write_table_without_bloom_filters
+    )
+    monkeypatch.setattr(tl, "PYARROW_BLOOM_FILTERS", False)
+    monkeypatch.setattr(tl, "get_duckdb_version", lambda: (0, 10))
+
+
+def test_write_trips_table(processed_fpaths, tmp_path, old_versions):
+    """Test trips are written, skipping bloom filters if requested."""
+    table = pq.read_table(processed_fpaths[2022][0])
+    fpath = tl.write_trips_table(table, os.path.join(tmp_path, "a.parquet"))
+    assert pq.read_table(fpath).equals(table)
+    with pytest.warns(UserWarning, match="cannot write bloom filters"):
+        tl.write_trips_table(
+            table, os.path.join(tmp_path, "b.parquet"), bloom_filters=True
+        )
+
+
+def test_copy_options(old_versions):
+    """Test bloom filter options of COPY are skipped by older DuckDB."""
+    assert "BLOOM" not in tl.get_copy_options_sql()
+    with pytest.warns(UserWarning, match="cannot write bloom filters"):
+        assert "BLOOM" not in tl.get_copy_options_sql(bloom_filters=True)
+
+
+def test_benchmark_trips_layout(processed_fpaths, old_versions):
+    """Test layouts without bloom filters are compared."""
+    df = tl.benchmark_trips_layout(
+        processed_fpaths[2022][:1],
+        {"trips": "SELECT COUNT(*) FROM trips"},
+        repeats=1,
+    )
+    assert set(df["layout"]) == {"raw_order", "sorted"}